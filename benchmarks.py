@@ -0,0 +1,603 @@
+# Location: /nuvodata/User_data/shiva/Market_carousal/benchmarks.py
+# Micro-benchmarks for the factory. Run: python benchmarks.py <name> --help
+import os
+import time
+import json
+import shutil
+import hashlib
+import argparse
+import tempfile
+
+BASE_PATH = os.path.dirname(os.path.abspath(__file__))
+SAMPLE_JSON = os.path.join(BASE_PATH, "output_slides", "Monday", "carousal.json")
+
+
+# =======================
+# BATCHED DIFFUSION
+# =======================
+def bench_batching(args):
+    """images/sec of backend.generate_batch for several micro-batch sizes (no disk writes)."""
+    from image_creator import GEN_PARAMS, StubBackend, build_prompt, get_backend, prompt_seed
+
+    if args.backend == "stub":
+        # Fixed per-call cost (scheduler, text encode, VAE setup) + per-image denoise cost
+        backend = StubBackend(call_overhead=args.call_overhead, per_image=args.per_image)
+    else:
+        backend = get_backend(args.backend)
+    backend.load()
+
+    prompts = [build_prompt(f"premium cinematic tech background, variation {i}") for i in range(args.prompts)]
+    seeds = [prompt_seed(p) for p in prompts]
+    params = dict(GEN_PARAMS, num_inference_steps=args.steps or GEN_PARAMS["num_inference_steps"])
+
+    print(f"📊 Batching benchmark: backend={args.backend}, {len(prompts)} prompts, repeats={args.repeats}")
+    results = {}
+    for bs in args.sizes:
+        start = time.perf_counter()
+        for _ in range(args.repeats):
+            for i in range(0, len(prompts), bs):
+                backend.generate_batch(prompts[i:i + bs], seeds[i:i + bs], **params)
+        elapsed = time.perf_counter() - start
+        results[bs] = len(prompts) * args.repeats / elapsed
+    backend.release()
+
+    base = results[args.sizes[0]]
+    print(f"{'batch':>6} {'img/s':>8} {'gain':>7}")
+    for bs, rate in results.items():
+        print(f"{bs:>6} {rate:>8.2f} {rate / base:>6.2f}x")
+    return results
+
+
+# =======================
+# SLIDE RENDER
+# =======================
+def make_backgrounds(slides, folder, size=1024):
+    """Noise backgrounds standing in for FLUX output (same size, similar PNG entropy)."""
+    from PIL import Image
+    for s in slides:
+        Image.effect_noise((size, size), 64).convert("RGB").save(os.path.join(folder, f"slide_{s['slide_number']}.png"))
+
+
+def legacy_renderer():
+    """Renderer with the old background path: blur -> temp PNG -> create_from_png -> ctx.scale paint."""
+    import cairo
+    from PIL import Image, ImageFilter
+    from slides_creator import Renderer
+
+    class TempPngRenderer(Renderer):
+        def load_background(self, bg_path):
+            surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, self.w, self.h)
+            ctx = cairo.Context(surface)
+            pil_img = Image.open(bg_path).convert("RGB").filter(ImageFilter.GaussianBlur(radius=2))
+            temp_bg = bg_path + ".temp_bg.png"
+            pil_img.save(temp_bg)
+            img = cairo.ImageSurface.create_from_png(temp_bg)
+            scale = max(self.w / img.get_width(), self.h / img.get_height())
+            ctx.save()
+            ctx.scale(scale, scale)
+            ctx.set_source_surface(img, 0, 0)
+            ctx.paint()
+            ctx.restore()
+            os.remove(temp_bg)
+            return surface
+
+    return TempPngRenderer()
+
+
+def time_slides(renderer, slides, folder, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for s in slides:
+            num = s["slide_number"]
+            renderer.create_slide(s, os.path.join(folder, f"final_slide_{num:02d}.png"), os.path.join(folder, f"slide_{num}.png"))
+    return (time.perf_counter() - start) / (repeats * len(slides))
+
+
+def bench_render(args):
+    """Per-slide Renderer.create_slide time: old temp-PNG background vs in-memory buffer."""
+    from slides_creator import Renderer
+
+    with open(args.json, "r") as f:
+        slides = json.load(f)
+
+    with tempfile.TemporaryDirectory() as folder:
+        make_backgrounds(slides, folder)
+        timings = {
+            "temp PNG (before)": time_slides(legacy_renderer(), slides, folder, args.repeats),
+            "in-memory (after)": time_slides(Renderer(), slides, folder, args.repeats),
+        }
+
+    before, after = timings.values()
+    print(f"📊 Render benchmark: {len(slides)} slides x {args.repeats} repeats")
+    for name, per_slide in timings.items():
+        print(f"{name:>20}: {per_slide * 1000:8.1f} ms/slide")
+    print(f"{'speedup':>20}: {before / after:8.2f}x")
+    return timings
+
+
+def folder_digest(folder):
+    """sha256 over every final_slide_XX.png, to check parallel output matches serial."""
+    digest = hashlib.sha256()
+    for name in sorted(os.listdir(folder)):
+        if name.startswith("final_slide_"):
+            with open(os.path.join(folder, name), "rb") as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+def bench_render_pool(args):
+    """Wall time to render a week of day folders with 1..N pool workers."""
+    from slides_creator import render_days
+
+    with open(args.json, "r") as f:
+        slides = json.load(f)
+
+    worker_counts = args.workers or sorted({1, 2, 4, os.cpu_count() or 1})
+    with tempfile.TemporaryDirectory() as root:
+        days = []
+        for d in range(args.days):
+            folder = os.path.join(root, f"day_{d + 1}")
+            os.makedirs(folder)
+            shutil.copy(args.json, os.path.join(folder, "carousal.json"))
+            make_backgrounds(slides, folder)
+            days.append(folder)
+
+        print(f"📊 Render pool benchmark: {args.days} days x {len(slides)} slides")
+        print(f"{'workers':>8} {'seconds':>9} {'speedup':>8} {'identical':>10}")
+        baseline, reference = None, None
+        for n in worker_counts:
+            start = time.perf_counter()
+            render_days(days, workers=n)
+            elapsed = time.perf_counter() - start
+            digests = [folder_digest(d) for d in days]
+            baseline = baseline or elapsed
+            reference = reference or digests
+            print(f"{n:>8} {elapsed:>9.2f} {baseline / elapsed:>7.2f}x {str(digests == reference):>10}")
+
+
+# =======================
+# RAG SERVICE
+# =======================
+def bench_rag(args):
+    """Cold index load + first query vs warm (cached) queries through the RAG service."""
+    from langchain_huggingface import HuggingFaceEmbeddings
+    from rag_service import RagService
+
+    embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+    service = RagService(args.index, embeddings)
+
+    start = time.perf_counter()
+    service.context(args.query)
+    cold = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(args.repeats):
+        service.context(args.query)
+    warm = (time.perf_counter() - start) / args.repeats
+
+    print(f"📊 RAG benchmark: {args.index}")
+    print(f"{'cold (load + query)':>22}: {cold * 1000:10.2f} ms")
+    print(f"{'warm (cached query)':>22}: {warm * 1000:10.4f} ms")
+    service.report()
+
+
+# =======================
+# WEB SEARCH
+# =======================
+def bench_search(args):
+    """Scout fan-out over a fake provider: serial vs concurrent cold searches, then warm cache."""
+    from search_service import FakeSearchProvider, SearchCache, SearchService
+
+    queries = [f"AI agentic workflow trend {i} 2026" for i in range(args.queries)]
+    print(f"📊 Search benchmark: {len(queries)} queries, fake provider latency {args.delay * 1000:.0f} ms")
+    with tempfile.TemporaryDirectory() as root:
+        timings = {}
+        for name, workers in (("serial (cold)", 1), ("fan-out (cold)", len(queries))):
+            provider = FakeSearchProvider(delay=args.delay)
+            service = SearchService(provider, SearchCache(os.path.join(root, str(workers))), workers=workers)
+            start = time.perf_counter()
+            service.search_many(queries)
+            timings[name] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        service.search_many([q.upper() + "?" for q in queries])  # normalized to the same keys
+        timings["cached (warm)"] = time.perf_counter() - start
+        assert len(provider.calls) == len(queries), "warm pass should not reach the provider"
+
+    for name, elapsed in timings.items():
+        print(f"{name:>16}: {elapsed * 1000:10.2f} ms")
+    service.report()
+
+
+# =======================
+# COMPETITOR CRAWLER
+# =======================
+def stand_in_server(pages, latency):
+    """Local HTTP server standing in for competitor sites. pages: {path: html}.
+    Sends ETag + Last-Modified on every other page and honours conditional requests."""
+    import threading
+    from email.utils import formatdate
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    modified = formatdate(time.time() - 3600, usegmt=True)
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency)
+            html = pages.get(self.path)
+            if html is None:
+                self.send_error(404)
+                return
+            body = html.encode("utf-8")
+            validators = int(self.path.rsplit("_", 1)[-1]) % 2 == 0
+            etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+            if validators and (self.headers.get("If-None-Match") == etag or self.headers.get("If-Modified-Since") == modified):
+                self.send_response(304)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.send_header("Content-Length", str(len(body)))
+            if validators:
+                self.send_header("ETag", etag)
+                self.send_header("Last-Modified", modified)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def bench_crawl(args):
+    """Cold crawl vs re-crawl (conditional GETs + content hashes) against a local stand-in server."""
+    from intel_crawler import IntelCrawler
+    import asyncio
+
+    filler = " ".join(f"agentic workflow insight {i}" for i in range(args.words))
+    pages = {f"/news/page_{i}": f"<html><body><nav>menu</nav><article><h1>Post {i}</h1><p>{filler}</p></article></body></html>"
+             for i in range(args.pages)}
+    pages["/mirror/page_1"] = pages["/news/page_0"]  # same article under a second URL
+    server = stand_in_server(pages, args.latency)
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    urls = [base + path for path in pages]
+
+    print(f"📊 Crawl benchmark: {len(urls)} pages, {args.latency * 1000:.0f} ms server latency, per-host {args.per_host}")
+    try:
+        with tempfile.TemporaryDirectory() as intel_dir:
+            for label in ("cold", "re-crawl"):
+                crawler = IntelCrawler(intel_dir, per_host=args.per_host, rate=0)
+                statuses = asyncio.run(crawler.crawl(urls))
+                print(f"--- {label}: " + ", ".join(f"{s}={list(statuses.values()).count(s)}" for s in sorted(set(statuses.values()))))
+                crawler.report()
+            files = [f for f in os.listdir(intel_dir) if f.endswith(".txt")]
+            print(f"📁 {len(files)} intelligence files for {len(urls)} URLs")
+    finally:
+        server.shutdown()
+
+
+# =======================
+# STREAMED AGENT -> VISION
+# =======================
+class CannedStreamLLM:
+    """Replays a fixed response as a token stream at tokens_per_s (~4 chars per token)."""
+
+    def __init__(self, text, tokens_per_s=250.0, chunk_chars=4):
+        self.text = text
+        self.chunk_chars = chunk_chars
+        self.delay = 1.0 / tokens_per_s
+
+    def _chunk(self, content):
+        from types import SimpleNamespace
+        return SimpleNamespace(content=content, usage_metadata=None)
+
+    def stream(self, messages, **kwargs):
+        for i in range(0, len(self.text), self.chunk_chars):
+            time.sleep(self.delay)
+            yield self._chunk(self.text[i:i + self.chunk_chars])
+
+    def invoke(self, messages, **kwargs):
+        time.sleep(self.delay * -(-len(self.text) // self.chunk_chars))
+        return self._chunk(self.text)
+
+
+def canned_carousel(slides=6):
+    package = {
+        "linkedin_post": "Local-first agents keep <b>patient data</b> on site.\n" * 8,
+        "instagram_caption": "Edge inference, zero cloud hops. #AI #LocalFirst " * 4,
+        "slides": [{
+            "slide_number": n,
+            "title": f"Step {n}: <b>Local RAG</b>",
+            "content": f"We use <b>Agentic workflows</b> with an on-prem vector DB to cut latency, part {n}. " * 3,
+            "image_prompt": f"Create Realistic cinematic visualization, flowing glass data nodes, variation {n}. NO TEXT.",
+        } for n in range(1, slides + 1)],
+    }
+    return "```json\n" + json.dumps(package, indent=2) + "\n```"
+
+
+def bench_stream(args):
+    """Time to first background and agent+vision wall time, blocking vs streamed LLM output."""
+    import content_for_slides
+    from factory_worker import FactoryWorker
+    from image_creator import StubBackend
+    from json_stream import SlideStream
+
+    text = canned_carousel(args.slides)
+    stream = SlideStream()
+    for i in range(0, len(text), 7):
+        stream.feed(text[i:i + 7])
+    assert stream.slides == content_for_slides.parse_carousel_json(text)["slides"], "streamed slides differ from full parse"
+
+    llm = CannedStreamLLM(text, tokens_per_s=args.tokens_per_s)
+    print(f"📊 Stream benchmark: {args.slides} slides, {len(text)} chars at {args.tokens_per_s:.0f} tok/s, "
+          f"stub image {args.per_image:.2f}s")
+    with tempfile.TemporaryDirectory() as root:
+        content_for_slides.CSV_PATH = os.path.join(root, "marketing_plan.csv")
+        with open(content_for_slides.CSV_PATH, "w") as f:
+            f.write('"Day","Framework","Topic","Strategic Angle","Slide1","Slide2"\n'
+                    '"Monday","PAS","Local RAG Security","Privacy","Is your data safe?","Our local RAG."\n')
+
+        for label, streamed in (("blocking", False), ("streamed", True)):
+            backend = StubBackend(call_overhead=args.call_overhead, per_image=args.per_image)
+            first = []
+            with FactoryWorker(backend, llm=llm, cache=False, stream_agent=streamed) as worker:
+                start = time.perf_counter()
+                future = worker.submit("Monday", os.path.join(root, label), stages=("agent", "vision"),
+                                       on_event=lambda e: e["event"] == "image_ready" and first.append(time.perf_counter()))
+                future.result()
+                total = time.perf_counter() - start
+            print(f"--- {label:>8}: first background {first[0] - start:6.2f}s | agent+vision {total:6.2f}s")
+
+
+# =======================
+# CAROUSEL JSON REPAIR
+# =======================
+class RepairingLLM:
+    """First call returns a corrupted carousel; later calls answer repair prompts with just the
+    slides they ask for. Reports usage like Groq (total_tokens ~ chars / 4)."""
+
+    def __init__(self, corrupted):
+        self.corrupted = corrupted
+        self.calls = 0
+
+    def invoke(self, messages, **kwargs):
+        import re
+        from types import SimpleNamespace
+        prompt = messages[-1] if isinstance(messages[-1], str) else messages[-1].content
+        self.calls += 1
+        if self.calls == 1:
+            text = self.corrupted
+        else:
+            wanted = [int(n) for n in re.findall(r"- Slide (\d+):", prompt.split("Write ONLY these slides:")[1])]
+            slides = json.loads(canned_carousel().strip("`json\n"))["slides"]
+            text = json.dumps({"slides": [s for s in slides if s["slide_number"] in wanted]})
+        return SimpleNamespace(content=text, usage_metadata={"total_tokens": (len(prompt) + len(text)) // 4})
+
+
+def corruptions(text):
+    """Typical ways an LLM breaks the carousel JSON."""
+    slide3, slide4 = text.index('"slide_number": 3'), text.index('"slide_number": 4')
+    yield "truncated", text[:int(len(text) * 0.7)]
+    yield "no <b> on slide 3", text[:slide3] + text[slide3:slide4].replace("<b>", "").replace("</b>", "") + text[slide4:]
+    yield "bad comma after slide 2", text[:slide3].rstrip().rstrip("{").rstrip() + ",, {" + text[slide3:]
+    yield "chatter + dropped brace", "Sure! Here it is:\n" + text.replace("}\n  ]", "\n  ]", 1)
+
+
+def bench_repair(args):
+    """Targeted re-prompting for malformed carousel responses vs regenerating the whole package."""
+    import content_for_slides
+    from carousel_schema import RepairStats
+
+    text = canned_carousel()
+    full_tokens = len(content_for_slides.build_carousel_prompt("Local RAG Security", "x", "y") + text) // 4
+    content_for_slides.repair_stats = stats = RepairStats()
+    print(f"📊 Repair benchmark: full regeneration ~{full_tokens} tokens per day")
+    for label, corrupted in [("valid", text)] + list(corruptions(text)):
+        llm = RepairingLLM(corrupted)
+        try:
+            package = content_for_slides.generate_carousel_json("Local RAG Security", "x", "y", llm=llm)
+            outcome = f"{len(package['slides'])} slides"
+        except ValueError as e:
+            outcome = f"failed ({e})"
+        print(f"--- {label:<24} {llm.calls} LLM call(s), {outcome}")
+    stats.report()
+
+
+# =======================
+# TOPIC MEMORY
+# =======================
+def bench_topics(args):
+    """Index build, incremental sync and near-duplicate lookups over a synthetic topic history."""
+    import random
+    from topic_memory import TopicMemory
+
+    rng = random.Random(7)
+    words = ["agentic", "rag", "edge", "vision", "llm", "security", "workflow", "inference", "retail",
+             "clinics", "finance", "compliance", "latency", "privacy", "automation", "forecasting"]
+    topics = [" ".join(rng.sample(words, 4)) + f" case {i}" for i in range(args.history)]
+    with tempfile.TemporaryDirectory() as root:
+        history = os.path.join(root, "topic_history.log")
+        index = os.path.join(root, "topic_index.npz")
+        with open(history, "w") as f:
+            f.write("\n".join(topics) + "\n")
+
+        start = time.perf_counter()
+        memory = TopicMemory(history, index)
+        build = time.perf_counter() - start
+        with open(history, "a") as f:
+            f.write("fresh topic on quantized models\n")
+        start = time.perf_counter()
+        TopicMemory(history, index)
+        reload = time.perf_counter() - start
+
+        probes = [rng.choice(topics).replace("case", "study") for _ in range(args.queries)]
+        start = time.perf_counter()
+        hits = sum(memory.nearest(p)[0] >= memory.threshold for p in probes)
+        lookup = (time.perf_counter() - start) / len(probes)
+
+    print(f"📊 Topic memory over {len(topics)} past topics")
+    print(f"{'cold build':>16}: {build * 1000:10.2f} ms")
+    print(f"{'reload + 1 new':>16}: {reload * 1000:10.2f} ms")
+    print(f"{'lookup (mean)':>16}: {lookup * 1000:10.3f} ms  ({hits}/{len(probes)} reworded probes flagged)")
+
+
+# =======================
+# STARTUP
+# =======================
+# Entry point -> what its first real response needs (built through lazy_resources)
+STARTUP_ENTRIES = {
+    "bot_brain": "groq_llm",
+    "orchestrator": "marketing_graph",
+    "content_for_slides": "carousel_llm",
+    "factory_worker": None,
+    "image_creator": None,
+    "run_pipeline": None,
+}
+
+STARTUP_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+imported = time.perf_counter() - start
+first, error = None, None
+if {resource!r}:
+    import lazy_resources
+    try:
+        lazy_resources.get({resource!r})
+        first = time.perf_counter() - start
+    except Exception as e:
+        error = f"{{type(e).__name__}}: {{e}}"
+print(json.dumps({{"import_s": imported, "first_s": first, "error": error}}))
+"""
+
+
+def parse_importtime(stderr, module):
+    """{direct import of module: cumulative seconds} from `python -X importtime` output."""
+    children, pending = {}, {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or line.count("|") != 2:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        # Children are printed before their parent, indented two spaces per level
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:
+            pending[name.strip()] = int(cumulative) / 1e6
+        elif depth == 0:
+            if name.strip() == module:
+                children = pending
+            pending = {}
+    return children
+
+
+def bench_startup(args):
+    """Cold import cost and time-to-first-response per entry point, each in a fresh interpreter."""
+    import subprocess
+    import sys
+    import tracing
+
+    entries = args.entries or list(STARTUP_ENTRIES)
+    for module in entries:
+        resource = STARTUP_ENTRIES.get(module)
+        runs = []
+        for _ in range(args.repeats):
+            proc = subprocess.run(
+                [sys.executable, "-X", "importtime", "-c", STARTUP_PROBE.format(module=module, resource=resource)],
+                cwd=BASE_PATH, capture_output=True, text=True, env=dict(os.environ, TRACE="0"),
+            )
+            if proc.returncode != 0:
+                error = (proc.stderr.strip().splitlines() or ["no output"])[-1]
+                runs = None
+                break
+            runs.append((json.loads(proc.stdout.strip().splitlines()[-1]), parse_importtime(proc.stderr, module)))
+        if runs is None:
+            print(f"❌ {module}: import failed ({error})")
+            continue
+
+        result, tops = min(runs, key=lambda run: run[0]["import_s"])
+        tracing.record("startup.import", result["import_s"], entry=module)
+        line = f"📊 {module:<20} import {result['import_s'] * 1000:8.1f} ms"
+        if result["first_s"] is not None:
+            tracing.record("startup.first_response", result["first_s"], entry=module, resource=resource)
+            line += f" | first response ({resource}) {result['first_s'] * 1000:8.1f} ms"
+        elif result["error"]:
+            line += f" | {resource} unavailable here ({result['error'][:60]})"
+        print(line)
+        heavy = sorted(tops.items(), key=lambda kv: kv[1], reverse=True)[:args.top]
+        print("   " + ", ".join(f"{name} {sec * 1000:.0f} ms" for name, sec in heavy))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Nueralogic factory benchmarks")
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    p = sub.add_parser("batching", help="Batched vs single-prompt diffusion throughput")
+    p.add_argument("--backend", default="stub", choices=["stub", "flux"])
+    p.add_argument("--sizes", type=int, nargs="+", default=[1, 2, 4, 6])
+    p.add_argument("--prompts", type=int, default=12, help="Prompts per pass (a multiple of every size is fairest)")
+    p.add_argument("--repeats", type=int, default=1)
+    p.add_argument("--steps", type=int, default=None, help="Override num_inference_steps")
+    p.add_argument("--call-overhead", type=float, default=0.12, help="Stub: seconds per pipe() call")
+    p.add_argument("--per-image", type=float, default=0.05, help="Stub: seconds per image in the batch")
+    p.set_defaults(func=bench_batching)
+
+    p = sub.add_parser("render", help="Per-slide render time, temp-PNG vs in-memory background")
+    p.add_argument("--json", default=SAMPLE_JSON, help="carousal.json to render")
+    p.add_argument("--repeats", type=int, default=3)
+    p.set_defaults(func=bench_render)
+
+    p = sub.add_parser("render-pool", help="Parallel render scaling over a week of slides")
+    p.add_argument("--json", default=SAMPLE_JSON, help="carousal.json used for every day")
+    p.add_argument("--days", type=int, default=5)
+    p.add_argument("--workers", type=int, nargs="+", default=None, help="Worker counts (default 1 2 4 ncpu)")
+    p.set_defaults(func=bench_render_pool)
+
+    p = sub.add_parser("rag", help="RAG cold load vs warm query latency")
+    p.add_argument("--index", default=os.path.join(BASE_PATH, "faiss_index"))
+    p.add_argument("--query", default="Nueralogic core services and case studies")
+    p.add_argument("--repeats", type=int, default=100)
+    p.set_defaults(func=bench_rag)
+
+    p = sub.add_parser("search", help="Web search fan-out and cache (offline fake provider)")
+    p.add_argument("--queries", type=int, default=3)
+    p.add_argument("--delay", type=float, default=0.5, help="Fake provider seconds per query")
+    p.set_defaults(func=bench_search)
+
+    p = sub.add_parser("crawl", help="Competitor crawler against a local stand-in server")
+    p.add_argument("--pages", type=int, default=20)
+    p.add_argument("--words", type=int, default=300, help="Filler words per page")
+    p.add_argument("--latency", type=float, default=0.05, help="Server seconds per request")
+    p.add_argument("--per-host", type=int, default=8)
+    p.set_defaults(func=bench_crawl)
+
+    p = sub.add_parser("stream", help="Streamed carousel JSON: backgrounds start before the LLM finishes")
+    p.add_argument("--slides", type=int, default=6)
+    p.add_argument("--tokens-per-s", type=float, default=250.0, help="Canned LLM stream speed")
+    p.add_argument("--call-overhead", type=float, default=0.12, help="Stub: seconds per pipe() call")
+    p.add_argument("--per-image", type=float, default=0.5, help="Stub: seconds per image in the batch")
+    p.set_defaults(func=bench_stream)
+
+    p = sub.add_parser("repair", help="Targeted repair of malformed carousel JSON (offline)")
+    p.set_defaults(func=bench_repair)
+
+    p = sub.add_parser("topics", help="Near-duplicate topic lookups over a large history")
+    p.add_argument("--history", type=int, default=5000, help="Synthetic past topics")
+    p.add_argument("--queries", type=int, default=500)
+    p.set_defaults(func=bench_topics)
+
+    p = sub.add_parser("startup", help="Import cost and time-to-first-response per entry point")
+    p.add_argument("--entries", nargs="+", default=None, help=f"Modules (default: {' '.join(STARTUP_ENTRIES)})")
+    p.add_argument("--repeats", type=int, default=3, help="Fresh interpreters per entry; the fastest is kept")
+    p.add_argument("--top", type=int, default=5, help="Slowest top-level imports to list")
+    p.set_defaults(func=bench_startup)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,15 @@
-import os, io, asyncio, pandas as pd, traceback
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+import os, io, time, asyncio, functools, traceback
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, InputMediaPhoto
 from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, filters, ContextTypes
-from orchestrator import orchestrator 
-from vram_manager import purge as purge_vram 
+from orchestrator import orchestrator, topic_column
+from topic_memory import get_topic_memory
+from vram_manager import get_manager
+from factory_worker import get_factory, day_folder
+from index_builder import start_index_watcher
+import tracing
+import lazy_resources
 from dotenv import load_dotenv
 
 # --- CONFIG ---
@@ -12,6 +19,36 @@ BASE_PATH = "/nuvodata/User_data/shiva/Market_carousal"
 CSV_PATH = os.path.join(BASE_PATH, "marketing_plan.csv")
 HISTORY_PATH = os.path.join(BASE_PATH, "topic_history.log")
 OUTPUT_DIR = os.path.join(BASE_PATH, "output_slides")
+FACTORY_BACKEND = os.getenv("FACTORY_BACKEND", "flux")
+
+# --- CONCURRENCY ---
+# Blocking work (RAG, DuckDuckGo, sync graph nodes) runs here so the polling loop never stalls
+BOT_EXECUTOR = ThreadPoolExecutor(max_workers=int(os.getenv("BOT_WORKERS", "4")), thread_name_prefix="bot-work")
+USER_CONCURRENCY = int(os.getenv("BOT_USER_CONCURRENCY", "2"))
+_user_slots = defaultdict(lambda: asyncio.Semaphore(USER_CONCURRENCY))
+NODE_LABELS = {"scout": "🌐 Scout done", "strategist": "🧠 Strategist done"}
+
+# --- STREAMING DELIVERY ---
+STATUS_EVERY = float(os.getenv("BOT_STATUS_EVERY", "2.0"))  # min seconds between status edits (Telegram flood limits)
+ALBUM_CHUNK = int(os.getenv("BOT_ALBUM_CHUNK", "3"))  # finished slides per album message
+
+async def run_blocking(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(BOT_EXECUTOR, functools.partial(func, *args))
+
+def per_user_limit(handler):
+    """Caps in-flight requests per user; extra requests get a 'busy' reply instead of queueing up."""
+    @functools.wraps(handler)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE, *args):
+        slot = _user_slots[update.effective_user.id]
+        if slot.locked():
+            if update.callback_query:
+                await update.callback_query.answer("⏳ Still working on your previous request...")
+            else:
+                await update.message.reply_text("⏳ Still working on your previous request...")
+            return
+        async with slot:
+            return await handler(update, context, *args)
+    return wrapper
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.effective_user.id != MY_ID: return
@@ -31,8 +68,8 @@ async def handle_chat(update: Update, context: ContextTypes.DEFAULT_TYPE):
     is_planning_request = any(k in user_msg.lower() for k in planning_keywords)
 
     if is_planning_request:
-        await update.message.reply_text("🕵️‍♂️ **Understood. Activating Strategist Node...**")
-        await run_planning_flow(update, context, user_msg)
+        status = await update.message.reply_text("🕵️‍♂️ **Understood. Activating Strategist Node...**")
+        await run_planning_flow(update, context, user_msg, status=status)
     else:
         # 2. Conversational Mode
         await update.message.reply_text("🤔 **Analyzing...**")
@@ -42,13 +79,12 @@ async def handle_chat(update: Update, context: ContextTypes.DEFAULT_TYPE):
             # Re-use the LLM defined in orchestrator (import it or redefine)
             from orchestrator import llm, web_scout, get_rag_context
             
-            # 1. Get Company Context (RAG)
-            company_context = get_rag_context("Nueralogic capabilities case studies")
-            
-            # 2. Get External Context (Web)
-            research_context = ""
+            # 1 + 2. Company Context (RAG) and External Context (Web), off the event loop and in parallel
+            rag_task = run_blocking(get_rag_context, "Nueralogic capabilities case studies")
             if "?" in user_msg:
-                 research_context = web_scout(user_msg)
+                company_context, research_context = await asyncio.gather(rag_task, run_blocking(web_scout, user_msg))
+            else:
+                company_context, research_context = await rag_task, ""
             
             # 3. Consultant Prompt
             system_prompt = f"""You are the Head of Strategy at Nueralogic.
@@ -63,14 +99,18 @@ async def handle_chat(update: Update, context: ContextTypes.DEFAULT_TYPE):
             Keep it brief and conversational.
             """
             
-            response = llm.invoke(f"System: {system_prompt}\n\nUser Question: {user_msg}")
+            # The client is built on first use; do that on the pool, not on the event loop
+            chat_llm = await run_blocking(lazy_resources.resolve, llm)
+            with tracing.span("llm.chat", model=chat_llm.model_name) as sp:
+                response = await chat_llm.ainvoke(f"System: {system_prompt}\n\nUser Question: {user_msg}", site="chat")
+                sp.update(tracing.llm_usage(response))
             
             await update.message.reply_text(response.content)
             
         except Exception as e:
             await update.message.reply_text(f"⚠️ Chat Error: {e}")
 
-async def run_planning_flow(update: Update, context: ContextTypes.DEFAULT_TYPE, user_feedback=""):
+async def run_planning_flow(update: Update, context: ContextTypes.DEFAULT_TYPE, user_feedback="", status=None):
     """The original planning logic, now refactored into a specific function."""
     # Determine if this is a button click or a text message
     is_callback = update.callback_query is not None
@@ -79,9 +119,19 @@ async def run_planning_flow(update: Update, context: ContextTypes.DEFAULT_TYPE,
         query = update.callback_query
         await query.answer()
         try:
-            await query.edit_message_text("🕵️‍♂️ **Agent is working...**")
+            status = await query.edit_message_text("🕵️‍♂️ **Agent is working...**")
         except:
             pass
+    elif status is None:
+        status = await update.message.reply_text("🕵️‍♂️ **Agent is working...**")
+
+    async def show_progress(done):
+        if status is None or not hasattr(status, "edit_text"):
+            return
+        try:
+            await status.edit_text("🕵️‍♂️ **Agent is working...**\n" + "\n".join(done))
+        except Exception:
+            pass
     
     try:
         past_topics = []
@@ -89,16 +139,28 @@ async def run_planning_flow(update: Update, context: ContextTypes.DEFAULT_TYPE,
             with open(HISTORY_PATH, 'r') as f:
                 past_topics = f.read().splitlines()[-15:]
 
-        # Run the Orchestrator
-        result = orchestrator.invoke({
+        # Feedback refines the current plan (only the rows it names are rewritten)
+        previous_plan = ""
+        if user_feedback and os.path.exists(CSV_PATH):
+            with open(CSV_PATH, 'r') as f:
+                previous_plan = f.read()
+
+        # Run the Orchestrator, streaming node-by-node progress into the status message
+        result = {
             "past_topics": past_topics,
             "scout_report": "",
             "kb_context": "",
-            "proposed_calendar": "",
+            "proposed_calendar": previous_plan,
             "user_approval": False,
             "errors": [],
             "user_feedback": user_feedback 
-        })
+        }
+        done = []
+        async for chunk in orchestrator.astream(result, stream_mode="updates"):
+            for node, update_ in chunk.items():
+                result.update(update_ or {})
+                done.append(NODE_LABELS.get(node, f"✅ {node} done"))
+            await show_progress(done)
         
         csv_data = result.get("proposed_calendar", "")
         if not csv_data:
@@ -108,6 +170,7 @@ async def run_planning_flow(update: Update, context: ContextTypes.DEFAULT_TYPE,
             f.write(csv_data)
 
         # --- HARDENED PARSING ---
+        import pandas as pd
         try:
             # First try: Standard Parse
             df = pd.read_csv(io.StringIO(csv_data), quotechar='"', skipinitialspace=True, sep=None, engine='python')
@@ -124,6 +187,10 @@ async def run_planning_flow(update: Update, context: ContextTypes.DEFAULT_TYPE,
             framework = row.iloc[1] if len(row) > 1 else "AIDA"
             angle = row.iloc[3] if len(row) > 3 else "Technical Deep Dive"
             summary += f"🔹 **{day} ({framework})**: {angle}\n"
+        for notice in result.get("notices") or []:
+            summary += f"\n⚠️ {notice}\n"
+        if result.get("topic_flags"):
+            summary += "\n⚠️ Possible repeats: " + "; ".join(result["topic_flags"]) + "\n"
 
         # Generate Dynamic Buttons: Full Week + Individual Days
         keyboard = []
@@ -163,9 +230,103 @@ async def run_planning_flow(update: Update, context: ContextTypes.DEFAULT_TYPE,
         else:
             await update.message.reply_text(error_msg)
 
+def factory_events():
+    """asyncio.Queue fed from the factory thread, plus the on_event callback that feeds it."""
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+    return events, lambda event: loop.call_soon_threadsafe(events.put_nowait, event)
+
+class GenerationStatus:
+    """Per-day progress, rendered into one status message that is edited in place."""
+
+    def __init__(self, message, days):
+        self.message = message
+        self.days = {d: {"images": 0, "rendered": 0, "state": "⏳ queued"} for d in days}
+        self.last_edit = 0.0
+        self.last_text = None
+
+    def apply(self, event):
+        day = self.days[event["day"]]
+        if event["event"] == "image_ready":
+            day["images"] += 1
+            day["state"] = "🎨 backgrounds"
+        elif event["event"] == "slide_rendered":
+            day["rendered"] += 1
+            day["state"] = "🖼️ rendering"
+        elif event["event"] == "stage_done" and event["stage"] == "agent":
+            day["state"] = "✍️ copy written"
+        elif event["event"] == "job_done":
+            day["state"] = "✅ done" if event["error"] is None else "❌ failed"
+
+    async def show(self, force=False):
+        text = "⚙️ **Factory Online.**\n" + "\n".join(
+            f"{d}: {p['state']} · {p['images']} bg · {p['rendered']} slides" for d, p in self.days.items()
+        )
+        if text == self.last_text or (not force and time.time() - self.last_edit < STATUS_EVERY):
+            return
+        try:
+            await self.message.edit_text(text, parse_mode='Markdown')
+            self.last_text, self.last_edit = text, time.time()
+        except Exception as e:
+            print(f"⚠️ Status edit skipped: {e}")
+
+async def send_album(context, day_str, paths):
+    """Sends finished slides as one album (or a single photo)."""
+    if not paths:
+        return
+    caption = f"🖼️ {day_str}: slides {', '.join(str(n) for n, _ in paths)}"
+    try:
+        with tracing.span("telegram.album", day=day_str, photos=len(paths)):
+            if len(paths) == 1:
+                with open(paths[0][1], 'rb') as f:
+                    await context.bot.send_photo(chat_id=MY_ID, photo=f, caption=caption, read_timeout=60, write_timeout=60)
+            else:
+                media = []
+                for i, (_, path) in enumerate(paths):
+                    with open(path, 'rb') as f:
+                        media.append(InputMediaPhoto(f.read(), caption=caption if i == 0 else None))
+                await context.bot.send_media_group(chat_id=MY_ID, media=media, read_timeout=60, write_timeout=60)
+    except Exception as e:
+        print(f"⚠️ Album Delivery Failed for {day_str}: {e}")
+
+async def deliver_day(context, day_str, day_dir):
+    pdf_path = os.path.join(day_dir, "Nueralogic_Carousel.pdf")
+    
+    if os.path.exists(pdf_path):
+        try:
+            with open(pdf_path, 'rb') as f, tracing.span("telegram.pdf", day=day_str, bytes=os.path.getsize(pdf_path)):
+                await context.bot.send_document(
+                    chat_id=MY_ID, 
+                    document=f, 
+                    caption=f"🚀 Day {day_str} Content is Ready.",
+                    read_timeout=60, 
+                    write_timeout=60, 
+                    connect_timeout=60
+                )
+        except Exception as e:
+            print(f"⚠️ PDF Delivery Failed for {day_str}: {e}")
+    
+    # Send Captions
+    caption_path = os.path.join(day_dir, "social_captions.txt")
+    if os.path.exists(caption_path):
+        try:
+            with open(caption_path, 'r') as f:
+                captions = f.read()
+                if len(captions) > 4000:
+                    captions = captions[:4000] + "... (truncated)"
+                
+                await context.bot.send_message(
+                    chat_id=MY_ID,
+                    text=f"📝 **Social Media Posts for {day_str}**\n\n{captions}",
+                    parse_mode='Markdown'
+                )
+        except Exception as e:
+             print(f"⚠️ Caption Delivery Failed for {day_str}: {e}")
+
 async def handle_generation(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
+    clicked_at = time.time()
     
     data = query.data # e.g. cmd_generate_all or cmd_generate_Monday
     target_day = None
@@ -177,9 +338,11 @@ async def handle_generation(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await query.edit_message_text("❌ No plan found. Run Scout & Plan first.")
         return
 
-    purge_vram()
+    # Models are resident in this process; the manager offloads/evicts under budget as they are used
+    get_manager().report()
     
     # Reload CSV to get the day list
+    import pandas as pd
     try:
         df = pd.read_csv(CSV_PATH, sep=None, engine='python')
     except:
@@ -194,72 +357,85 @@ async def handle_generation(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if not mask.any():
              await query.message.reply_text(f"❌ Day '{target_day}' not found in plan.")
              return
-        days = df[mask].iloc[:, 0].unique()
+        selected = df[mask]
+        days = selected.iloc[:, 0].unique()
         await query.edit_message_text(f"⚙️ **Factory Online.** Generating {target_day}...")
     else:
+        selected = df
         days = df.iloc[:, 0].unique()
         await query.edit_message_text(f"⚙️ **Factory Online.** Processing Full Week ({len(days)} days)...")
 
-    for day in days:
-        day_str = str(day).strip()
-        purge_vram()
-        
-        # Execute run_pipeline.py
-        process = await asyncio.create_subprocess_exec(
-            'python', os.path.join(BASE_PATH, 'run_pipeline.py'), '--day', day_str,
-            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    # Approved topics join the history that the strategist screens future plans against
+    topics = selected.iloc[:, topic_column([str(c) for c in df.columns])].dropna().astype(str).tolist()
+    added = await run_blocking(lambda: get_topic_memory().add(topics))
+    print(f"🧠 Topic memory: {added} new topic(s) recorded")
+
+    # Resident factory: the first click loads FLUX, later clicks reuse it
+    factory = await run_blocking(get_factory, FACTORY_BACKEND)
+
+    # Queue every day up front and stream progress back: slides are delivered as they render
+    events, on_event = factory_events()
+    day_dirs = {str(day).strip(): day_folder(str(day).strip(), OUTPUT_DIR) for day in days}
+    for day_str, day_dir in day_dirs.items():
+        future = factory.submit(day_str, day_dir, on_event=on_event)
+        future.add_done_callback(
+            lambda f, d=day_str: on_event({"event": "job_done", "day": d, "t": time.time(), "error": f.exception()})
         )
-        await process.communicate()
-        
-        clean_folder = day_str.replace(" ", "_")
-        pdf_path = os.path.join(OUTPUT_DIR, clean_folder, "Nueralogic_Carousel.pdf")
-        
-        if os.path.exists(pdf_path):
-            try:
-                with open(pdf_path, 'rb') as f:
-                    await context.bot.send_document(
-                        chat_id=MY_ID, 
-                        document=f, 
-                        caption=f"🚀 Day {day_str} Content is Ready.",
-                        read_timeout=60, 
-                        write_timeout=60, 
-                        connect_timeout=60
-                    )
-            except Exception as e:
-                print(f"⚠️ PDF Delivery Failed for {day_str}: {e}")
-        
-        # Send Captions
-        caption_path = os.path.join(OUTPUT_DIR, clean_folder, "social_captions.txt")
-        if os.path.exists(caption_path):
-            try:
-                with open(caption_path, 'r') as f:
-                    captions = f.read()
-                    if len(captions) > 4000:
-                        captions = captions[:4000] + "... (truncated)"
-                    
-                    await context.bot.send_message(
-                        chat_id=MY_ID,
-                        text=f"📝 **Social Media Posts for {day_str}**\n\n{captions}",
-                        parse_mode='Markdown'
-                    )
-            except Exception as e:
-                 print(f"⚠️ Caption Delivery Failed for {day_str}: {e}")
-        
-    await query.message.reply_text("💎 **Generation Complete.**")
+
+    status = GenerationStatus(query.message, day_dirs)
+    albums = {day_str: [] for day_str in day_dirs}
+    first_output = None
+    remaining = len(day_dirs)
+    while remaining:
+        event = await events.get()
+        day_str = event["day"]
+        status.apply(event)
+
+        if event["event"] == "slide_rendered":
+            albums[day_str].append((event["slide"], event["path"]))
+        if len(albums[day_str]) >= ALBUM_CHUNK or (event["event"] == "job_done" and albums[day_str]):
+            await send_album(context, day_str, albums[day_str])
+            albums[day_str] = []
+            if first_output is None:
+                first_output = time.time() - clicked_at
+                print(f"⏱️ Time to first output: {first_output:.1f}s")
+
+        if event["event"] == "job_done":
+            remaining -= 1
+            if event["error"] is not None:
+                print(f"⚠️ Factory failed for {day_str}: {event['error']}")
+            await deliver_day(context, day_str, day_dirs[day_str])
+        await status.show(force=event["event"] == "job_done")
+
+    total = time.time() - clicked_at
+    first = f"{first_output:.1f}s" if first_output is not None else "n/a"
+    print(f"⏱️ Generation finished in {total:.1f}s (first output after {first})")
+    await query.message.reply_text(f"💎 **Generation Complete.**\n⏱️ First slide after {first} · total {total:.1f}s")
 
 def main():
-    app = Application.builder().token(TOKEN).read_timeout(60).write_timeout(60).connect_timeout(60).build()
+    # concurrent_updates: a long plan or factory run must not block other updates
+    app = (Application.builder().token(TOKEN).read_timeout(60).write_timeout(60).connect_timeout(60)
+           .concurrent_updates(True).build())
     
     # Handlers
     app.add_handler(CommandHandler("start", start))
     
     # Button Handlers
-    app.add_handler(CallbackQueryHandler(run_planning_flow, pattern='^cmd_plan$'))
-    app.add_handler(CallbackQueryHandler(handle_generation, pattern='^cmd_generate'))
+    app.add_handler(CallbackQueryHandler(per_user_limit(run_planning_flow), pattern='^cmd_plan$'))
+    app.add_handler(CallbackQueryHandler(per_user_limit(handle_generation), pattern='^cmd_generate'))
     
     # Message handler for typed feedback or chat
-    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_chat))
+    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, per_user_limit(handle_chat)))
     
+    # New intelligence/ or knowledge.md edits are embedded in the background; RagService hot-reloads them
+    from orchestrator import embeddings
+    start_index_watcher(embeddings)
+
+    # Startup only registers the LLM client, MiniLM and the graph; build them behind the poller
+    # so the first /start answers at once and the first plan rarely waits on them
+    if os.getenv("BOT_WARM", "1") == "1":
+        lazy_resources.warm("groq_llm", "marketing_graph", "minilm")
+
     print("🚀 Bot is polling...")
     app.run_polling()
 
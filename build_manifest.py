@@ -0,0 +1,105 @@
+# Location: /nuvodata/User_data/shiva/Market_carousal/build_manifest.py
+# Per-day build manifest: records the input hash each artifact in output_slides/<Day>
+# was built from, so re-runs skip fresh artifacts and resume after a crash.
+import os
+import json
+import hashlib
+import threading
+
+MANIFEST_NAME = "build_manifest.json"
+
+
+def hash_text(*parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        if not isinstance(part, str):
+            part = json.dumps(part, sort_keys=True, ensure_ascii=False)
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BuildManifest:
+    """{artifact file name: input hash}, saved atomically after every recorded artifact.
+    Re-read whenever the file changed on disk (another process, e.g. a CLI run_pipeline.py or
+    --force run next to the bot), so a stale copy is never written back over newer entries."""
+
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, outdir):
+        self.outdir = outdir
+        self.path = os.path.join(outdir, MANIFEST_NAME)
+        self._lock = threading.Lock()
+        self.entries = {}
+        self._stamp = None
+        self._refresh()
+
+    def _file_stamp(self):
+        try:
+            st = os.stat(self.path)
+            return st.st_mtime_ns, st.st_size
+        except FileNotFoundError:
+            return None
+
+    def _refresh(self):
+        """Reloads entries if the file differs from what this object last read or wrote."""
+        stamp = self._file_stamp()
+        if stamp == self._stamp:
+            return
+        self._stamp = stamp
+        self.entries = {}
+        if stamp is None:
+            return
+        try:
+            with open(self.path, "r") as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            print(f"⚠️ Unreadable {self.path}, rebuilding everything for this day")
+
+    @classmethod
+    def for_dir(cls, outdir):
+        """One shared manifest object per day folder, so concurrent stages don't clobber each other."""
+        key = os.path.abspath(outdir)
+        with cls._instances_lock:
+            if key not in cls._instances:
+                cls._instances[key] = cls(outdir)
+            return cls._instances[key]
+
+    def fresh(self, artifact, input_hash):
+        """True if artifact exists and was built from exactly this input."""
+        with self._lock:
+            self._refresh()
+            return (
+                self.entries.get(artifact) == input_hash
+                and os.path.exists(os.path.join(self.outdir, artifact))
+            )
+
+    def record(self, artifact, input_hash):
+        with self._lock:
+            self._refresh()
+            self.entries[artifact] = input_hash
+            self._save()
+
+    def reset(self):
+        with self._lock:
+            self.entries = {}
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            self._stamp = None
+
+    def _save(self):
+        os.makedirs(self.outdir, exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.entries, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.path)
+        self._stamp = self._file_stamp()
@@ -0,0 +1,220 @@
+# Location: /nuvodata/User_data/shiva/Market_carousal/carousel_schema.py
+# Tolerant parsing of the carousel JSON: salvages every well-formed slide from a broken
+# response, validates each against the slide schema and lists exactly what is still missing,
+# so content_for_slides re-prompts for those slides instead of failing the whole day.
+import re
+import json
+import threading
+
+from json_stream import SlideStream
+
+SLIDE_COUNT = 6
+CAPTION_KEYS = ("linkedin_post", "instagram_caption")
+CAPTIONS = "captions"  # problem key when a caption is missing
+
+
+def parse_carousel_json(content):
+    # Cleanup markdown
+    if "```json" in content:
+        content = content.split("```json")[1].split("```")[0].strip()
+    elif "```" in content:
+        content = content.split("```")[1].split("```")[0].strip()
+
+    try:
+        return json.loads(content, strict=False)
+    except json.JSONDecodeError as e:
+        print(f"⚠️ JSON Decode Error: {e}")
+        print("Attempting to repair...")
+        # Fallback: Sometimes LLMs output Python dicts
+        try:
+            import ast
+            return ast.literal_eval(content)
+        except:
+            # Last resort: Try to escape newlines manually if that's the issue
+            try:
+                fixed_content = content.replace("\n      ", "").replace("\n", "\\n")
+                return json.loads(fixed_content, strict=False)
+            except:
+                raise e
+
+
+def slide_errors(slide):
+    """Schema problems of one slide: [] when it can be rendered."""
+    if not isinstance(slide, dict):
+        return ["not an object"]
+    errors = []
+    if not isinstance(slide.get("slide_number"), int) or not 1 <= slide["slide_number"] <= SLIDE_COUNT:
+        errors.append(f"slide_number must be an integer from 1 to {SLIDE_COUNT}")
+    for field in ("title", "content", "image_prompt"):
+        if not isinstance(slide.get(field), str) or not slide[field].strip():
+            errors.append(f"{field} is missing or empty")
+    return errors
+
+
+def slide_warnings(slide):
+    """Style problems of a renderable slide: worth re-prompting for, not worth losing it over."""
+    content = slide.get("content") if isinstance(slide, dict) else None
+    if isinstance(content, str) and content.strip() and not ("<b>" in content and "</b>" in content):
+        return ["content has no <b> highlighted terms"]
+    return []
+
+
+def _caption(text, key):
+    match = re.search(rf'"{key}"\s*:\s*"((?:[^"\\]|\\.)*)"', text, re.DOTALL)
+    if not match:
+        return None
+    try:
+        return json.loads(f'"{match.group(1)}"', strict=False)
+    except json.JSONDecodeError:
+        return None
+
+
+def salvage(content):
+    """(captions, slide candidates, parsed whole) from a response, even when it is not valid JSON
+    as a whole; the last item says whether the regular parse succeeded."""
+    try:
+        data = parse_carousel_json(content)
+        if isinstance(data, list):
+            data = {"slides": data}
+        if isinstance(data, dict) and isinstance(data.get("slides"), list):
+            return {k: data.get(k) for k in CAPTION_KEYS}, data["slides"], True
+    except Exception:
+        pass
+    # Broken somewhere: keep each slide object that parses on its own, and any caption string
+    stream = SlideStream()
+    stream.feed(content)
+    return {k: _caption(content, k) for k in CAPTION_KEYS}, stream.slides, False
+
+
+def normalize_slide(slide):
+    if isinstance(slide, dict) and isinstance(slide.get("slide_number"), str) and slide["slide_number"].strip().isdigit():
+        slide = dict(slide, slide_number=int(slide["slide_number"]))
+    return slide
+
+
+def merge(package, salvaged, wanted=None):
+    """Adds the valid slides/captions of salvage() output to package (only the wanted slide
+    numbers, when given). A slide with only warnings is kept until a clean one replaces it.
+    Returns how many slides were taken."""
+    captions, candidates = salvaged[:2]
+    for key, value in captions.items():
+        if isinstance(value, str) and value.strip() and not package.get(key):
+            package[key] = value
+    slides = {s["slide_number"]: s for s in package.setdefault("slides", [])}
+    taken = 0
+    for slide in map(normalize_slide, candidates):
+        if slide_errors(slide):
+            continue
+        n = slide["slide_number"]
+        if wanted is not None and n not in wanted:
+            continue
+        if n in slides and (slide_warnings(slide) or not slide_warnings(slides[n])):
+            continue
+        slides[n] = slide
+        taken += 1
+    package["slides"] = [slides[n] for n in sorted(slides)]
+    return taken
+
+
+def problems(package, candidates=()):
+    """{slide number or "captions": reason} for everything the package still lacks or has only
+    with warnings (those slides are in package["slides"] already)."""
+    have = {s["slide_number"] for s in package.get("slides", [])}
+    found = {}
+    for slide in map(normalize_slide, candidates):
+        n = slide.get("slide_number") if isinstance(slide, dict) else None
+        if isinstance(n, int) and 1 <= n <= SLIDE_COUNT and n not in have and slide_errors(slide):
+            found[n] = "; ".join(slide_errors(slide))
+    for slide in package.get("slides", []):
+        if slide_warnings(slide):
+            found[slide["slide_number"]] = "; ".join(slide_warnings(slide))
+    for n in range(1, SLIDE_COUNT + 1):
+        if n not in have:
+            found.setdefault(n, "missing")
+    if any(not package.get(k) for k in CAPTION_KEYS):
+        found[CAPTIONS] = "missing"
+    return found
+
+
+def extract_carousel(content):
+    """(package, problems, parsed whole): every valid part of the response, plus what still
+    needs asking for."""
+    package, salvaged = {}, salvage(content)
+    merge(package, salvaged)
+    return package, problems(package, salvaged[1]), salvaged[2]
+
+
+def build_repair_prompt(topic, talking_points, goal, package, issues):
+    slide_list = "\n".join(f"- Slide {n}: {why}" for n, why in sorted((k, v) for k, v in issues.items() if k != CAPTIONS))
+    kept = "\n".join(f"- Slide {s['slide_number']}: {s['title']}" for s in package.get("slides", [])
+                     if s["slide_number"] not in issues)
+    captions = ""
+    if CAPTIONS in issues:
+        captions = '\nAlso include "linkedin_post" and "instagram_caption" (use \\n for line breaks).'
+    return f"""
+    You are an expert LinkedIn Strategist for Nueralogic (AI Agency).
+    We are finishing a 6-slide carousel about: {topic}
+    - Details: {talking_points}
+    - Goal: {goal}
+
+    These slides are already done (do not repeat them):
+    {kept or "- none"}
+
+    Write ONLY these slides:
+    {slide_list or "- none"}{captions}
+
+    RETURN JSON OBJECT ONLY (Strict JSON standard), every slide with "slide_number", "title",
+    "content" (key terms wrapped in <b> tags) and "image_prompt" (photorealistic, NO TEXT):
+    {{ "slides": [ {{ "slide_number": N, "title": "...", "content": "...", "image_prompt": "..." }} ] }}
+    """
+
+
+def estimate_tokens(*texts):
+    """Rough token count (~4 chars/token) when the provider reports no usage."""
+    return sum(len(t) for t in texts) // 4
+
+
+class RepairStats:
+    """Counts across the process: how often responses were malformed, how often targeted repair
+    fixed them, and the tokens a full regeneration would have cost on top."""
+
+    def __init__(self):
+        self.responses = 0
+        self.malformed = 0
+        self.repaired = 0
+        self.failed = 0
+        self.slides_salvaged = 0
+        self.slides_reprompted = 0
+        self.tokens_repair = 0
+        self.tokens_saved = 0
+        self._lock = threading.Lock()
+
+    def record(self, malformed, slides_salvaged=0, slides_reprompted=0, ok=True, tokens_full=0, tokens_repair=0):
+        """malformed: the response was not usable as-is (broken JSON or schema problems)."""
+        with self._lock:
+            self.responses += 1
+            if not malformed:
+                return
+            self.malformed += 1
+            self.repaired += ok
+            self.failed += not ok
+            self.slides_salvaged += slides_salvaged
+            self.slides_reprompted += slides_reprompted
+            self.tokens_repair += tokens_repair
+            if ok:
+                self.tokens_saved += max(0, tokens_full - tokens_repair)
+
+    def report(self):
+        if not self.responses:
+            return
+        failure = self.malformed / self.responses * 100
+        repair = (self.repaired / self.malformed * 100) if self.malformed else 100.0
+        print(
+            f"🩹 Carousel JSON: {self.malformed}/{self.responses} malformed ({failure:.0f}%), "
+            f"{self.repaired} repaired ({repair:.0f}%), {self.failed} failed | "
+            f"{self.slides_salvaged} slides salvaged, {self.slides_reprompted} re-prompted | "
+            f"~{self.tokens_repair} repair tokens, ~{self.tokens_saved} tokens saved vs full regeneration"
+        )
+
+
+repair_stats = RepairStats()
@@ -1,13 +1,21 @@
 import os
 import sys
 import json
-import pandas as pd
+import time
+import random
+import asyncio
 import datetime
 import logging
 from io import StringIO
-from langchain.chat_models import init_chat_model
 from langchain_core.messages import HumanMessage
 from dotenv import load_dotenv
+from build_manifest import BuildManifest, hash_text
+from llm_cache import CachedChatModel, get_llm_cache
+from json_stream import SlideStream
+from carousel_schema import (CAPTION_KEYS, build_repair_prompt, estimate_tokens, extract_carousel, merge,
+                             parse_carousel_json, problems, repair_stats, salvage)
+import tracing
+import lazy_resources
 
 load_dotenv()
 
@@ -16,8 +24,26 @@ BASE_PATH = "/nuvodata/User_data/shiva/Market_carousal"
 CSV_PATH = os.path.join(BASE_PATH, "marketing_plan.csv")
 OUTPUT_JSON = os.path.join(BASE_PATH, "carousal.json")
 
+# Batch mode: parallel Groq calls, with exponential backoff when rate-limited
+BATCH_CONCURRENCY = int(os.getenv("AGENT_CONCURRENCY", "3"))
+MAX_RETRIES = 4
+BACKOFF_BASE = 2.0
+
+# Malformed responses: re-prompt only for the missing/invalid slides, at most this many times
+REPAIR_ROUNDS = int(os.getenv("CAROUSEL_REPAIR_ROUNDS", "2"))
+
 # Initialize Model
-model = init_chat_model("llama-3.3-70b-versatile", model_provider="groq", max_tokens=4000)
+MODEL_NAME = "llama-3.3-70b-versatile"
+# Through the shared response cache: re-running a day replays its recorded responses
+# Built on first call, so importing this module (the bot, the factory) does not pay for the client
+@lazy_resources.register("carousel_llm")
+def build_model():
+    from langchain.chat_models import init_chat_model
+    return CachedChatModel(init_chat_model(MODEL_NAME, model_provider="groq", max_tokens=4000), "carousel")
+
+lazy_resources.register("carousel_repair_llm", lambda: CachedChatModel(lazy_resources.get("carousel_llm").llm, "carousel_repair"))
+model = lazy_resources.Lazy("carousel_llm")
+repair_model = lazy_resources.Lazy("carousel_repair_llm")
 
 def find_column(df, target_names):
     """Fuzzy match column names to handle Llama's formatting variations."""
@@ -28,8 +54,8 @@ def find_column(df, target_names):
             return cols[clean_name]
     return None
 
-def generate_carousel_json(topic, talking_points, goal):
-    prompt = f"""
+def build_carousel_prompt(topic, talking_points, goal):
+    return f"""
     You are an expert LinkedIn Strategist for Nueralogic (AI Agency).
     Create a content package: 6-slide carousel + Social Media Captions.
     
@@ -53,127 +79,317 @@ def generate_carousel_json(topic, talking_points, goal):
         ]
     }}
     """
-    
+
+def generate_carousel_json(topic, talking_points, goal, llm=None, on_slide=None):
+    """Full content package for one day. With on_slide, the response is streamed and
+    on_slide(slide) is called as soon as each slide object is complete."""
+    prompt = build_carousel_prompt(topic, talking_points, goal)
     print(f"🧠 Llama is creating content for: {topic}")
-    response = model.invoke([HumanMessage(content=prompt)], temperature=0.7)
-    
-    content = response.content
-    # Cleanup markdown
-    if "```json" in content:
-        content = content.split("```json")[1].split("```")[0].strip()
-    elif "```" in content:
-        content = content.split("```")[1].split("```")[0].strip()
-        
+    if on_slide is not None:
+        content, usage = stream_carousel_json(prompt, topic, llm, on_slide)
+    else:
+        with tracing.span("llm.carousel", topic=topic) as sp:
+            response = (llm or model).invoke([HumanMessage(content=prompt)], temperature=0.7)
+            usage = tracing.llm_usage(response)
+            sp.update(usage)
+        content = response.content
+
+    brief = (topic, talking_points, goal)
+    package, issues, parsed = extract_carousel(content)
+    repair = RepairRun(brief, package, issues, parsed, usage.get("total_tokens") or estimate_tokens(prompt, content))
+    while repair.next_prompt():
+        with tracing.span("llm.carousel_repair", topic=topic, attempt=repair.rounds) as sp:
+            response = (llm or repair_model).invoke([HumanMessage(content=repair.prompt)], temperature=0.7)
+            sp.update(tracing.llm_usage(response), slides=len(repair.wanted))
+        repair.apply(response)
+    return finish_repair(repair, llm, prompt)
+
+class RepairRun:
+    """Targeted repair of one carousel response: re-prompts only for what extract_carousel
+    could not salvage, then records the outcome in repair_stats."""
+
+    def __init__(self, brief, package, issues, parsed, tokens_full):
+        self.brief = brief
+        self.package = package
+        self.issues = issues
+        self.initial = dict(issues)
+        self.malformed = bool(issues) or not parsed
+        self.salvaged = len(package["slides"])
+        self.tokens_full = tokens_full
+        self.tokens_repair = 0
+        self.rounds = 0
+        self.prompt = None
+        self.prompts = []
+        self.wanted = set()
+
+    def next_prompt(self):
+        """True (with .prompt set) while something is missing and rounds are left."""
+        if not self.issues or self.rounds >= REPAIR_ROUNDS:
+            return False
+        if self.rounds == 0:
+            print(f"🩹 {self.brief[0]}: salvaged {len(self.package['slides'])} slide(s), re-prompting for "
+                  + ", ".join(f"slide {k}" if isinstance(k, int) else k for k in self.issues))
+        self.rounds += 1
+        self.wanted = {k for k in self.issues if isinstance(k, int)}
+        self.prompt = build_repair_prompt(*self.brief, self.package, self.issues)
+        self.prompts.append(self.prompt)
+        return True
+
+    def apply(self, response):
+        usage = tracing.llm_usage(response)
+        self.tokens_repair += usage.get("total_tokens") or estimate_tokens(self.prompt, response.content)
+        salvaged = salvage(response.content)
+        merge(self.package, salvaged, self.wanted)
+        self.issues = problems(self.package, salvaged[1])
+
+    def finish(self):
+        """The package, keeping slides that only have warnings; raises if a slide is missing or invalid."""
+        have = {s["slide_number"] for s in self.package["slides"]}
+        slide_issues = [k for k in self.issues if isinstance(k, int) and k not in have]
+        ok = not slide_issues
+        reprompted = sum(isinstance(k, int) for k in self.initial)
+        repair_stats.record(self.malformed, slides_salvaged=self.salvaged, slides_reprompted=reprompted, ok=ok, tokens_full=self.tokens_full, tokens_repair=self.tokens_repair)
+        if not ok:
+            raise ValueError(f"Carousel for '{self.brief[0]}' still invalid after {self.rounds} repair round(s): "
+                             + "; ".join(f"slide {k}: {self.issues[k]}" for k in slide_issues))
+        for n in sorted(k for k in self.issues if isinstance(k, int)):
+            print(f"⚠️ {self.brief[0]}: keeping slide {n} as is ({self.issues[n]})")
+        for key in CAPTION_KEYS:
+            if not self.package.get(key):
+                print(f"⚠️ {self.brief[0]}: no {key} after repair, leaving it empty")
+                self.package[key] = ""
+        return self.package
+
+def finish_repair(repair, llm, prompt):
+    """repair.finish(); when the carousel is unusable, its recorded responses are dropped from
+    the LLM cache so re-running the day asks the model again instead of replaying them."""
     try:
-        return json.loads(content, strict=False)
-    except json.JSONDecodeError as e:
-        print(f"⚠️ JSON Decode Error: {e}")
-        print("Attempting to repair...")
-        # Fallback: Sometimes LLMs output Python dicts
+        return repair.finish()
+    except ValueError:
+        if llm is None:
+            for text in [prompt] + repair.prompts:
+                model.forget([HumanMessage(content=text)], temperature=0.7)
+        raise
+
+def stream_carousel_json(prompt, topic, llm, on_slide):
+    """(full response text, token usage) while on_slide receives slides as they complete."""
+    stream = SlideStream()
+    usage = None
+    with tracing.span("llm.carousel", topic=topic, streamed=True) as sp:
+        start = time.perf_counter()
+        for chunk in (llm or model).stream([HumanMessage(content=prompt)], temperature=0.7):
+            if getattr(chunk, "usage_metadata", None):
+                usage = chunk  # Groq reports token counts on the last chunk
+            for slide in stream.feed(chunk.content):
+                if "first_slide_s" not in sp:
+                    sp["first_slide_s"] = round(time.perf_counter() - start, 3)
+                on_slide(slide)
+        usage = tracing.llm_usage(usage)
+        sp.update(usage, slides_streamed=len(stream.slides))
+    return stream.text, usage
+
+def is_rate_limited(error):
+    text = f"{type(error).__name__} {error}".lower()
+    return "ratelimit" in text or "rate limit" in text or "429" in text
+
+async def ainvoke_with_backoff(llm, prompt, span_name, topic, retries=MAX_RETRIES):
+    """One async LLM call; rate-limit errors are retried with exponential backoff + jitter."""
+    for attempt in range(retries + 1):
         try:
-            import ast
-            return ast.literal_eval(content)
-        except:
-            # Last resort: Try to escape newlines manually if that's the issue
-            try:
-                fixed_content = content.replace("\n      ", "").replace("\n", "\\n")
-                return json.loads(fixed_content, strict=False)
-            except:
-                raise e
-def main():
-    # --- ARGUMENT PARSING ---
-    import argparse
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--day", type=str, help="Target day")
-    parser.add_argument("--outdir", type=str, help="Output directory for JSON and text")
-    args = parser.parse_args()
+            with tracing.span(span_name, topic=topic, attempt=attempt) as sp:
+                response = await (llm or model).ainvoke([HumanMessage(content=prompt)], temperature=0.7)
+                sp.update(tracing.llm_usage(response))
+            return response
+        except Exception as e:
+            if attempt == retries or not is_rate_limited(e):
+                raise
+            delay = BACKOFF_BASE ** attempt + random.uniform(0, 1)
+            print(f"⏳ Rate limited on '{topic}', retrying in {delay:.1f}s ({attempt + 1}/{retries})")
+            await asyncio.sleep(delay)
 
+async def agenerate_carousel_json(topic, talking_points, goal, llm=None, retries=MAX_RETRIES):
+    """Async generate_carousel_json; retries rate-limit errors with exponential backoff + jitter."""
+    prompt = build_carousel_prompt(topic, talking_points, goal)
+    print(f"🧠 Llama is creating content for: {topic}")
+    response = await ainvoke_with_backoff(llm, prompt, "llm.carousel", topic, retries)
+    package, issues, parsed = extract_carousel(response.content)
+    tokens_full = tracing.llm_usage(response).get("total_tokens") or estimate_tokens(prompt, response.content)
+    repair = RepairRun((topic, talking_points, goal), package, issues, parsed, tokens_full)
+    while repair.next_prompt():
+        repair.apply(await ainvoke_with_backoff(llm or repair_model, repair.prompt, "llm.carousel_repair", topic, retries))
+    return finish_repair(repair, llm, prompt)
+
+# --- PLAN ---
+def load_plan():
+    if not os.path.exists(CSV_PATH):
+        raise FileNotFoundError(f"CSV not found at {CSV_PATH}")
+
+    import pandas as pd
+    df = pd.read_csv(CSV_PATH)
+    df.columns = df.columns.str.strip()
+
+    day_col = find_column(df, ['Day', 'Date'])
+    if day_col:
+        df[day_col] = df[day_col].astype(str).str.strip()
+    return df
+
+def plan_days(df):
+    day_col = find_column(df, ['Day', 'Date']) or df.columns[0]
+    return [str(d).strip() for d in df[day_col].unique()]
+
+def day_brief(df, day=None):
+    """(topic, talking_points, goal) for one day's row of the plan."""
+    import pandas as pd
+    day_col = find_column(df, ['Day', 'Date'])
+    topic_col = find_column(df, ['Topic / Subject', 'Topic', 'Subject'])
+    
+    # Strategies to find content
+    points_col = find_column(df, ['Key Talking Points', 'Talking Points', 'Points'])
+    goal_col = find_column(df, ['Goal / CTA', 'Goal', 'CTA'])
+    
+    # Check for Slide columns (Slide1, Slide2...)
+    slide_cols = [c for c in df.columns if c.lower().startswith('slide') and c[-1].isdigit()]
+
+    # --- SELECT ROW ---
+    if day:
+        print(f"🎯 Pipeline requested Day: {day}")
+        row = df[df[day_col].astype(str).str.lower().str.strip() == str(day).lower().strip()]
+    else:
+        today = datetime.datetime.now().strftime("%a") 
+        print(f"📅 No argument provided. Defaulting to Today: {today}")
+        row = df[df[day_col].str.contains(today, case=False, na=False)]
+    
+    target_row = row.iloc[0] if not row.empty else df.iloc[0]
+
+    # --- EXTRACT CONTENT ---
+    talking_points = ""
+    goal = "General Brand Awareness" 
+
+    if points_col and goal_col:
+        talking_points = str(target_row[points_col])
+        goal = str(target_row[goal_col])
+    elif slide_cols:
+        slide_cols.sort()
+        points_list = [f"{c}: {target_row[c]}" for c in slide_cols if pd.notna(target_row[c])]
+        talking_points = "; ".join(points_list)
+        if goal_col and pd.notna(target_row[goal_col]):
+            goal = str(target_row[goal_col])
+    else:
+         raise KeyError(f"Missing required columns. Found: {list(df.columns)}")
+
+    return str(target_row[topic_col]), talking_points, goal
+
+def write_outputs(full_data, outdir=None):
+    """Saves carousal.json (slides only) + social_captions.txt. Returns the slides."""
     # Determine Output Path
-    if args.outdir:
-        if not os.path.exists(args.outdir):
-            os.makedirs(args.outdir)
-        output_json_path = os.path.join(args.outdir, "carousal.json")
-        captions_path = os.path.join(args.outdir, "social_captions.txt")
+    if outdir:
+        os.makedirs(outdir, exist_ok=True)
+        output_json_path = os.path.join(outdir, "carousal.json")
+        captions_path = os.path.join(outdir, "social_captions.txt")
     else:
         output_json_path = OUTPUT_JSON
         captions_path = os.path.join(BASE_PATH, "social_captions.txt")
 
-    try:
-        if not os.path.exists(CSV_PATH):
-            raise FileNotFoundError(f"CSV not found at {CSV_PATH}")
+    # Extract parts
+    slides = full_data.get("slides", [])
+    linkedin = full_data.get("linkedin_post", "")
+    instagram = full_data.get("instagram_caption", "")
+    
+    # Save Slides JSON
+    with open(output_json_path, 'w') as f:
+        json.dump(slides, f, indent=4) # Save ONLY the list for compatibility
+        
+    # Save Captions
+    with open(captions_path, 'w') as f:
+        f.write(f"--- LINKEDIN POST ---\n{linkedin}\n\n")
+        f.write(f"--- INSTAGRAM CAPTION ---\n{instagram}\n")
 
-        df = pd.read_csv(CSV_PATH)
-        df.columns = df.columns.str.strip()
+    print(f"✅ Success: Data generated in {output_json_path}")
+    return slides
 
-        day_col = find_column(df, ['Day', 'Date'])
-        if day_col:
-            df[day_col] = df[day_col].astype(str).str.strip()
+def fresh_slides(outdir, brief):
+    """(slides or None, input hash): slides are returned when carousal.json was built from this exact plan row."""
+    input_hash = hash_text(MODEL_NAME, build_carousel_prompt(*brief))
+    if outdir and BuildManifest.for_dir(outdir).fresh("carousal.json", input_hash):
+        print(f"⏭️  Plan row for '{brief[0]}' unchanged, keeping {os.path.join(outdir, 'carousal.json')}")
+        with open(os.path.join(outdir, "carousal.json"), "r") as f:
+            return json.load(f), input_hash
+    return None, input_hash
 
-        topic_col = find_column(df, ['Topic / Subject', 'Topic', 'Subject'])
-        
-        # Strategies to find content
-        points_col = find_column(df, ['Key Talking Points', 'Talking Points', 'Points'])
-        goal_col = find_column(df, ['Goal / CTA', 'Goal', 'CTA'])
-        
-        # Check for Slide columns (Slide1, Slide2...)
-        slide_cols = [c for c in df.columns if c.lower().startswith('slide') and c[-1].isdigit()]
-
-        # --- SELECT ROW ---
-        if args.day:
-            target_day = args.day
-            print(f"🎯 Pipeline requested Day: {target_day}")
-            df[day_col] = df[day_col].astype(str)
-            row = df[df[day_col].str.lower().str.strip() == str(target_day).lower().strip()]
-        else:
-            today = datetime.datetime.now().strftime("%a") 
-            print(f"📅 No argument provided. Defaulting to Today: {today}")
-            row = df[df[day_col].str.contains(today, case=False, na=False)]
-        
-        target_row = row.iloc[0] if not row.empty else df.iloc[0]
+def run_agent(day=None, outdir=None, llm=None, df=None, on_slide=None):
+    """Generates carousal.json + social_captions.txt for one day of the plan. Returns the slides.
+    on_slide(slide) receives each slide while the LLM is still streaming the rest."""
+    df = load_plan() if df is None else df
+    brief = day_brief(df, day)
+    slides, input_hash = fresh_slides(outdir, brief)
+    if slides is not None:
+        for slide in slides if on_slide else ():
+            on_slide(slide)
+        return slides
 
-        # --- EXTRACT CONTENT ---
-        talking_points = ""
-        goal = "General Brand Awareness" 
+    full_data = generate_carousel_json(*brief, llm=llm, on_slide=on_slide)
+    slides = write_outputs(full_data, outdir)
+    if outdir:
+        BuildManifest.for_dir(outdir).record("carousal.json", input_hash)
+    return slides
 
-        if points_col and goal_col:
-            talking_points = str(target_row[points_col])
-            goal = str(target_row[goal_col])
-        elif slide_cols:
-            slide_cols.sort()
-            points_list = [f"{c}: {target_row[c]}" for c in slide_cols if pd.notna(target_row[c])]
-            talking_points = "; ".join(points_list)
-            if goal_col and pd.notna(target_row[goal_col]):
-                goal = str(target_row[goal_col])
-        else:
-             raise KeyError(f"Missing required columns. Found: {list(df.columns)}")
-
-        # --- GENERATE ---
-        full_data = generate_carousel_json(
-            str(target_row[topic_col]), 
-            talking_points, 
-            goal
-        )
-        
-        # Extract parts
-        slides = full_data.get("slides", [])
-        linkedin = full_data.get("linkedin_post", "")
-        instagram = full_data.get("instagram_caption", "")
-        
-        # Save Slides JSON
-        with open(output_json_path, 'w') as f:
-            json.dump(slides, f, indent=4) # Save ONLY the list for compatibility
-            
-        # Save Captions
-        with open(captions_path, 'w') as f:
-            f.write(f"--- LINKEDIN POST ---\n{linkedin}\n\n")
-            f.write(f"--- INSTAGRAM CAPTION ---\n{instagram}\n")
+async def arun_batch(jobs, llm=None, concurrency=BATCH_CONCURRENCY, df=None):
+    """jobs: list of (day, outdir). Reads the plan once and runs every day's prompt concurrently.
+    Returns {day: slides or the exception that day failed with}."""
+    df = load_plan() if df is None else df
+    gate = asyncio.Semaphore(concurrency)
 
-        print(f"✅ Success: Data generated in {output_json_path}")
+    async def one(day, outdir):
+        brief = day_brief(df, day)
+        slides, input_hash = fresh_slides(outdir, brief)
+        if slides is not None:
+            return slides
+        async with gate:
+            full_data = await agenerate_carousel_json(*brief, llm=llm)
+        slides = write_outputs(full_data, outdir)
+        BuildManifest.for_dir(outdir).record("carousal.json", input_hash)
+        return slides
+
+    results = await asyncio.gather(*(one(day, outdir) for day, outdir in jobs), return_exceptions=True)
+    for (day, _), result in zip(jobs, results):
+        if isinstance(result, Exception):
+            print(f"❌ Agent failed for {day}: {result}")
+    return {day: result for (day, _), result in zip(jobs, results)}
+
+def run_batch(jobs, llm=None, concurrency=BATCH_CONCURRENCY, df=None):
+    start = time.time()
+    results = asyncio.run(arun_batch(jobs, llm=llm, concurrency=concurrency, df=df))
+    ok = sum(not isinstance(r, Exception) for r in results.values())
+    print(f"✅ Batch agent: {ok}/{len(jobs)} days in {time.time() - start:.2f}s (concurrency {concurrency})")
+    repair_stats.report()
+    get_llm_cache().report()
+    return results
+
+def main():
+    # --- ARGUMENT PARSING ---
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--day", type=str, help="Target day")
+    parser.add_argument("--outdir", type=str, help="Output directory for JSON and text")
+    parser.add_argument("--all", action="store_true", help="Batch mode: every day of the plan, concurrently, into output_slides/<Day>")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help="Max parallel LLM calls in batch mode")
+    args = parser.parse_args()
 
+    try:
+        if args.all:
+            from factory_worker import day_folder
+            df = load_plan()
+            results = run_batch([(day, day_folder(day)) for day in plan_days(df)], concurrency=args.concurrency, df=df)
+            if any(isinstance(r, Exception) for r in results.values()):
+                exit(1)
+        else:
+            run_agent(args.day, args.outdir)
+            repair_stats.report()
+            get_llm_cache().report()
     except Exception as e:
         print(f"❌ CRITICAL ERROR: {str(e)}")
         import traceback
         traceback.print_exc()
         exit(1)
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,64 @@
+# Location: /nuvodata/User_data/shiva/Market_carousal/embed_cache.py
+# On-disk cache of FLUX text-encoder outputs (T5 prompt_embeds + CLIP pooled_prompt_embeds),
+# keyed by the final prompt, so each unique prompt goes through the text encoders once.
+import os
+import json
+import hashlib
+import threading
+
+from image_cache import CACHE_DIR, DiskLRU
+
+EMBED_DIR = os.path.join(CACHE_DIR, "embeds")
+MAX_EMBED_BYTES = int(os.getenv("EMBED_CACHE_MAX_MB", "1024")) * 1024 * 1024
+
+
+def embed_key(final_prompt, model_id, max_sequence_length, lora_id=None):
+    """lora_id: the LoRA whose text-encoder weights were applied (None for base encoders)."""
+    payload = json.dumps([final_prompt, model_id, max_sequence_length] + ([lora_id] if lora_id else []), ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class EmbedCache(DiskLRU):
+    """fp16 safetensors files, one per prompt (~4 MB at 512 T5 tokens), LRU-bounded on its own
+    budget (ImageCache only counts PNGs)."""
+    suffix = ".safetensors"
+
+    def __init__(self, root=EMBED_DIR, max_bytes=MAX_EMBED_BYTES):
+        super().__init__(root, max_bytes)
+
+    def path_for(self, key):
+        return os.path.join(self.root, key[:2], f"{key}.safetensors")
+
+    def load(self, key, device=None):
+        """(prompt_embeds, pooled_prompt_embeds) with a batch dim of 1, or None on a miss."""
+        from safetensors.torch import load_file
+        path = self.path_for(key)
+        with self._lock:
+            if not os.path.exists(path):
+                self.misses += 1
+                return None
+            os.utime(path)  # refresh LRU position
+            self.hits += 1
+        try:
+            tensors = load_file(path, device=str(device or "cpu"))
+        except FileNotFoundError:
+            return None  # evicted between the check and the read
+        return tensors["prompt_embeds"], tensors["pooled_prompt_embeds"]
+
+    def store(self, key, prompt_embeds, pooled_prompt_embeds):
+        import torch
+        from safetensors.torch import save_file
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        save_file({
+            "prompt_embeds": prompt_embeds.detach().to("cpu", torch.float16).contiguous(),
+            "pooled_prompt_embeds": pooled_prompt_embeds.detach().to("cpu", torch.float16).contiguous(),
+        }, tmp)
+        with self._lock:
+            self._replace(tmp, path)
+
+    def report(self):
+        lookups = self.hits + self.misses
+        rate = (self.hits / lookups * 100) if lookups else 0.0
+        print(f"🔤 Prompt embeds: {self.hits} cached / {self.misses} encoded ({rate:.0f}% hit rate)")
@@ -0,0 +1,236 @@
+# Location: /nuvodata/User_data/shiva/Market_carousal/factory_worker.py
+# Long-lived factory: loads the image backend (FLUX + LoRA) once and keeps it
+# resident, then runs per-day jobs (agent -> vision -> render) off a local queue.
+import os
+import json
+import queue
+import threading
+import time
+import traceback
+from concurrent.futures import Future
+
+from image_creator import get_backend, generate_images
+from image_cache import ImageCache
+import tracing
+
+BASE_PATH = "/nuvodata/User_data/shiva/Market_carousal"
+OUTPUT_DIR = os.path.join(BASE_PATH, "output_slides")
+STAGES = ("agent", "vision", "render")
+STREAM_AGENT = os.getenv("STREAM_AGENT", "1") != "0"  # start backgrounds while the LLM still writes slides
+
+
+def day_folder(day, output_dir=OUTPUT_DIR):
+    clean_name = str(day).replace(" ", "_").strip()
+    return os.path.join(output_dir, clean_name)
+
+
+class DayJob:
+    def __init__(self, day, outdir, stages=STAGES, on_event=None):
+        self.day = str(day).strip()
+        self.outdir = outdir
+        self.stages = tuple(stages)
+        self.on_event = on_event
+        self.future = Future()
+
+    def emit(self, event, **data):
+        """Progress event for on_event (called on the worker thread): image_ready, slide_rendered, stage_done, pdf_ready."""
+        if self.on_event is None:
+            return
+        try:
+            self.on_event(dict(event=event, day=self.day, t=time.time(), **data))
+        except Exception as e:
+            print(f"⚠️ Progress listener failed for {self.day}: {e}")
+
+
+class FactoryWorker:
+    """Single worker thread that owns the image backend. Jobs are served FIFO."""
+
+    def __init__(self, backend="flux", llm=None, output_dir=OUTPUT_DIR, cache=True, batch_size=None, render_workers=1,
+                 stream_agent=STREAM_AGENT):
+        self.backend = get_backend(backend) if isinstance(backend, str) else backend
+        self.llm = llm  # None -> content_for_slides' default Groq model
+        self.cache = ImageCache() if cache is True else (cache or None)
+        self.batch_size = batch_size  # None -> sized to free VRAM by the backend
+        self.render_workers = render_workers
+        self.stream_agent = stream_agent
+        self.output_dir = output_dir
+        self.jobs = queue.Queue()
+        self._thread = None
+
+    # --- lifecycle ---
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return self
+        # The backend loads on the worker thread, so callers can queue (and run LLM work) meanwhile
+        self._thread = threading.Thread(target=self._loop, name="factory-worker", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self.jobs.put(None)
+        self._thread.join()
+        self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # --- job API ---
+    def submit(self, day, outdir=None, stages=STAGES, on_event=None):
+        """Queues one day. The returned Future resolves to the job result dict.
+        on_event, if given, receives progress dicts while the job runs (see DayJob.emit)."""
+        job = DayJob(day, outdir or day_folder(day, self.output_dir), stages, on_event)
+        self.jobs.put(job)
+        return job.future
+
+    def _loop(self):
+        load_error = None
+        try:
+            start = time.time()
+            self.backend.load()
+            print(f"🏭 Factory online ({self.backend.name}) — backend loaded in {time.time() - start:.2f}s")
+        except Exception as e:
+            print(f"❌ Factory backend failed to load: {e}")
+            load_error = e
+
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            if not job.future.set_running_or_notify_cancel():
+                continue
+            if load_error is not None:
+                job.future.set_exception(load_error)
+                continue
+            try:
+                job.future.set_result(self.run_job(job))
+            except Exception as e:
+                print(f"❌ Factory job for {job.day} failed: {e}")
+                traceback.print_exc()
+                job.future.set_exception(e)
+
+    # --- stages ---
+    def run_job(self, job):
+        print(f"\n🌟 --- PROCESSING BATCH FOR: {job.day} ---")
+        os.makedirs(job.outdir, exist_ok=True)
+        print(f"📂 Output Directory: {job.outdir}")
+
+        timings, spans = {}, {}
+        pdf_path = None
+        stages = job.stages
+        if self.stream_agent and stages[:2] == ("agent", "vision"):
+            spans.update(self.run_streamed(job))
+            for stage in ("agent", "vision"):
+                timings[stage] = spans[stage][1] - spans[stage][0]
+                print(f"✅ {stage.upper()} COMPLETED in {timings[stage]:.2f}s")
+                job.emit("stage_done", stage=stage, seconds=timings[stage])
+            stages = stages[2:]
+
+        for stage in stages:
+            start = time.time()
+            print(f"▶️  STARTING STEP: {stage.upper()} ({job.day})")
+            with tracing.span(f"stage.{stage}", day=job.day):
+                result = self.run_stage(job, stage)
+            if stage == "render":
+                pdf_path = result
+            spans[stage] = (start, time.time())
+            timings[stage] = spans[stage][1] - start
+            print(f"✅ {stage.upper()} COMPLETED in {timings[stage]:.2f}s")
+            job.emit("stage_done", stage=stage, seconds=timings[stage])
+
+        if pdf_path:
+            job.emit("pdf_ready", path=pdf_path)
+
+        return {"day": job.day, "outdir": job.outdir, "pdf": pdf_path, "timings": timings, "spans": spans}
+
+    def run_stage(self, job, stage):
+        if stage == "agent":
+            return self.run_agent(job)
+        if stage == "vision":
+            return self.run_vision(job)
+        if stage == "render":
+            return self.run_render(job)
+        raise ValueError(f"Unknown stage '{stage}'")
+
+    def run_agent(self, job):
+        from content_for_slides import run_agent
+        run_agent(job.day, job.outdir, llm=self.llm)
+
+    def run_streamed(self, job):
+        """agent + vision overlapped: the LLM streams on a helper thread and this (GPU) thread
+        generates each background as soon as its slide object is complete. Slides that arrive
+        while a batch is running are batched together. Returns the two stages' (start, end)."""
+        from content_for_slides import run_agent
+
+        slides = queue.Queue()
+        agent_span = Future()
+        start = time.time()
+        print(f"▶️  STARTING STEP: AGENT + VISION, streamed ({job.day})")
+
+        def agent():
+            try:
+                with tracing.span("stage.agent", day=job.day, streamed=True):
+                    run_agent(job.day, job.outdir, llm=self.llm, on_slide=slides.put)
+                agent_span.set_result((start, time.time()))
+            except Exception as e:
+                agent_span.set_exception(e)
+            finally:
+                slides.put(None)
+
+        threading.Thread(target=agent, name=f"agent-{job.day}", daemon=True).start()
+        emitted = set()
+
+        def on_image(n, path):
+            if n not in emitted:
+                emitted.add(n)
+                job.emit("image_ready", slide=n, path=path)
+
+        # One pass per streamed batch: the text encoders stay loaded until the stream is done
+        with tracing.span("stage.vision", day=job.day, streamed=True), self.backend.hold_encoders():
+            finished = False
+            while not finished:
+                batch = [slides.get()]
+                while not slides.empty():
+                    batch.append(slides.get_nowait())
+                finished = None in batch
+                batch = [s for s in batch if s is not None and "image_prompt" in s and "slide_number" in s]
+                if batch:
+                    generate_images(self.backend, batch, job.outdir, cache=self.cache,
+                                    batch_size=self.batch_size, on_image=on_image)
+            agent_start, agent_end = agent_span.result()  # re-raises an agent failure
+            # carousal.json is the source of truth: anything the stream missed or got wrong
+            # is generated now, and slides already done are skipped by the build manifest
+            self.run_vision(job, on_image=on_image)
+        return {"agent": (agent_start, agent_end), "vision": (start, time.time())}
+
+    def run_vision(self, job, on_image=None):
+        with open(os.path.join(job.outdir, "carousal.json"), "r") as f:
+            slides_data = json.load(f)
+        generate_images(
+            self.backend, slides_data, job.outdir, cache=self.cache, batch_size=self.batch_size,
+            on_image=on_image or (lambda n, path: job.emit("image_ready", slide=n, path=path))
+        )
+
+    def run_render(self, job):
+        from slides_creator import render_day
+        return render_day(
+            job.outdir, workers=self.render_workers,
+            on_slide=lambda n, path: job.emit("slide_rendered", slide=n, path=path)
+        )
+
+
+# Process-wide worker so repeated clicks in the bot reuse the resident pipeline
+_factory = None
+_factory_lock = threading.Lock()
+
+
+def get_factory(backend="flux", llm=None):
+    global _factory
+    with _factory_lock:
+        if _factory is None:
+            _factory = FactoryWorker(backend=backend, llm=llm).start()
+        return _factory
@@ -0,0 +1,143 @@
+# Location: /nuvodata/User_data/shiva/Market_carousal/image_cache.py
+# Content-addressed store for generated backgrounds. Key = sha256 of everything
+# that changes the pixels, so a byte-identical request never hits the GPU twice.
+import os
+import json
+import shutil
+import hashlib
+import threading
+
+BASE_PATH = "/nuvodata/User_data/shiva/Market_carousal"
+CACHE_DIR = os.path.join(BASE_PATH, "flux_cache")
+MAX_CACHE_BYTES = int(os.getenv("FLUX_CACHE_MAX_MB", "2048")) * 1024 * 1024
+LOW_WATER = 0.9  # eviction trims to this fraction of the budget
+
+
+def cache_key(final_prompt, height, width, guidance_scale, num_inference_steps, seed, lora_id):
+    payload = json.dumps(
+        [final_prompt, height, width, guidance_scale, num_inference_steps, seed, lora_id],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def link_or_copy(src, dest):
+    """Hard-link src to dest (copy across filesystems). dest is unlinked first so we never write through a shared inode."""
+    if os.path.lexists(dest):
+        os.remove(dest)
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copyfile(src, dest)
+
+
+class DiskLRU:
+    """Files under root, bounded to max_bytes with LRU eviction (mtime = last use).
+
+    The byte total is kept up to date as files are stored, so the tree is only walked at startup
+    and when the cache goes over budget; eviction then trims to LOW_WATER of the budget so the
+    next few stores don't walk it again.
+    """
+    suffix = ""
+
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self.total = sum(size for _, size, _ in self.entries())
+
+    def entries(self):
+        for dirpath, _, files in os.walk(self.root):
+            for name in files:
+                if name.endswith(self.suffix):
+                    full = os.path.join(dirpath, name)
+                    try:
+                        st = os.stat(full)
+                    except FileNotFoundError:
+                        continue  # evicted by another process meanwhile
+                    yield st.st_mtime, st.st_size, full
+
+    def size(self):
+        return self.total
+
+    def _replace(self, tmp, path):
+        """os.replace(tmp, path) that keeps the running total. Call with the lock held."""
+        old = os.path.getsize(path) if os.path.exists(path) else 0
+        os.replace(tmp, path)
+        self.total += os.path.getsize(path) - old
+        if self.total > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        """Drops least-recently-used entries until the cache fits in max_bytes."""
+        items = sorted(self.entries())
+        self.total = sum(size for _, size, _ in items)  # resync: other processes share the directory
+        goal = self.max_bytes * LOW_WATER if self.total > self.max_bytes else self.total
+        removed = 0
+        for _, size, full in items:
+            if self.total <= goal:
+                break
+            try:
+                os.remove(full)
+            except FileNotFoundError:
+                pass
+            self.total -= size
+            removed += 1
+        return removed
+
+
+class ImageCache(DiskLRU):
+    """On-disk PNG cache with size-bounded LRU eviction."""
+    suffix = ".png"
+
+    def __init__(self, root=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+        super().__init__(root, max_bytes)
+
+    def path_for(self, key):
+        return os.path.join(self.root, key[:2], f"{key}.png")
+
+    def fetch(self, key, dest):
+        """Places the cached image at dest. Returns True on a hit."""
+        path = self.path_for(key)
+        with self._lock:
+            if not os.path.exists(path):
+                self.misses += 1
+                return False
+            os.utime(path)  # refresh LRU position
+            link_or_copy(path, dest)
+            self.hits += 1
+            return True
+
+    def store(self, key, image, dest):
+        """Saves a freshly generated PIL image into the cache and places it at dest."""
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        image.save(tmp, format="PNG")
+        with self._lock:
+            self._replace(tmp, path)
+            link_or_copy(path, dest)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        rate = (self.hits / lookups * 100) if lookups else 0.0
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": rate}
+
+    def report(self):
+        s = self.stats()
+        print(f"🗃️  Image cache: {s['hits']} hits / {s['misses']} misses ({s['hit_rate']:.0f}% hit rate)")
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--evict", action="store_true", help="Trim the cache to FLUX_CACHE_MAX_MB now")
+    args = parser.parse_args()
+
+    cache = ImageCache()
+    if args.evict:
+        print(f"🧹 Evicted {cache.evict()} entries")
+    print(f"🗃️  {cache.root}: {cache.size() / 1024 / 1024:.1f} MB / {cache.max_bytes / 1024 / 1024:.0f} MB")
@@ -1,70 +1,454 @@
-import torch
-from diffusers import FluxPipeline
 import os
 import json
+import time
+import hashlib
 
 import argparse
+from contextlib import contextmanager, nullcontext
 
-# 1. SETUP PIPELINE
-parser = argparse.ArgumentParser()
-parser.add_argument("--outdir", type=str, help="Directory for JSON and output images")
-args = parser.parse_args()
-
-# Determine paths
-if args.outdir:
-    json_path = os.path.join(args.outdir, "carousal.json")
-    output_dir = args.outdir
-else:
-    json_path = "/nuvodata/User_data/shiva/Market_carousal/carousal.json"
-    output_dir = "/nuvodata/User_data/shiva/Market_carousal/flux_assets"
-
-# Initialize Flux
-pipe = FluxPipeline.from_pretrained(
-    "black-forest-labs/FLUX.1-dev",
-    torch_dtype=torch.float16
-).to("cuda:0") # Using GPU 0 since GPU 5 might be unavailable or as per request
-
-pipe.load_lora_weights(
-    "pictgencustomer/Carousel_127",
-    weight_name="lora.safetensors"
-)
-
-if not os.path.exists(output_dir):
-    os.makedirs(output_dir)
-
-with open(json_path, 'r') as f:
-    slides_data = json.load(f)
-
-print(f"🚀 Starting dynamic generation for {len(slides_data)} slides...")
-
-# 3. GENERATION LOOP
-for slide in slides_data:
-    slide_num = slide['slide_number']
-    prompt_text = slide['image_prompt']
-    
-    # We save as slide_1.png, slide_2.png, etc.
-    file_name = f"slide_{slide_num}.png"
-    save_path = os.path.join(output_dir, file_name)
-    
-    print(f"🎨 Generating image for Slide {slide_num}...")
-    
-    # Enrich prompt to force clean backgrounds
-    # Flux is instruction-following, so we add explicit constraints
-    final_prompt = f"{prompt_text} --no text --no letters --no words --no logo --no watermark. minimalist, abstract, high quality, 8k."
-    
-    # Using your specific parameters
-    image = pipe(
-        prompt=final_prompt,
-        height=1024,
-        width=1024,
-        guidance_scale=3.5,
-        num_inference_steps=18 
-    ).images[0]
-    
-    image.save(save_path)
-    print(f"✅ Saved to {save_path}")
-
-    # Optional: Clear VRAM cache between generations to prevent OOM
-    torch.cuda.empty_cache()
-
-print("\n✨ All assets generated from carousal.json are ready.")
\ No newline at end of file
+from image_cache import ImageCache, cache_key, link_or_copy
+from embed_cache import EmbedCache, embed_key
+from build_manifest import BuildManifest
+from vram_manager import get_manager
+import tracing
+
+# --- CONFIG ---
+BASE_PATH = "/nuvodata/User_data/shiva/Market_carousal"
+MODEL_ID = "black-forest-labs/FLUX.1-dev"
+LORA_ID = "pictgencustomer/Carousel_127"
+LORA_WEIGHTS = "lora.safetensors"
+
+# Using your specific parameters
+GEN_PARAMS = {
+    "height": 1024,
+    "width": 1024,
+    "guidance_scale": 3.5,
+    "num_inference_steps": 18,
+}
+
+# Flux is instruction-following, so we add explicit constraints
+PROMPT_SUFFIX = " --no text --no letters --no words --no logo --no watermark. minimalist, abstract, high quality, 8k."
+BASE_SEED = 127
+# Opt-in: seed per (day, slide) so repeated prompts differ; by default a prompt is one cached image
+VARY_SEEDS = os.getenv("FLUX_VARY_SEEDS", "0") == "1"
+
+# Micro-batching: a day is 6 slides, so never batch beyond that by default.
+# Activation memory per 1024x1024 image in the batch (fp16), used to size batches to free VRAM.
+MAX_BATCH = int(os.getenv("FLUX_MAX_BATCH", "6"))
+MB_PER_IMAGE = int(os.getenv("FLUX_MB_PER_IMAGE", "3072"))
+VRAM_HEADROOM_MB = 1024
+# Denoiser parts kept resident; the text encoders (CLIP = text_encoder, T5 = text_encoder_2)
+# are loaded only to fill the embedding cache and dropped once a pass is encoded.
+FLUX_PARTS = ("transformer", "vae")
+ENCODER_PARTS = ("text_encoder", "text_encoder_2")
+MAX_SEQUENCE_LENGTH = 512
+
+
+def build_prompt(prompt_text):
+    """Enrich prompt to force clean backgrounds."""
+    return f"{prompt_text}{PROMPT_SUFFIX}"
+
+
+def prompt_seed(final_prompt, slide_number=None, day=None, base=BASE_SEED):
+    """Deterministic seed per prompt, so the same prompt always yields (and caches to) the same image.
+    With slide_number (and day) the seed differs per slide instead: repeated prompts then get
+    different backgrounds, at the cost of never sharing a cache entry."""
+    text = final_prompt if slide_number is None else f"{day or ''}|{slide_number}|{final_prompt}"
+    digest = hashlib.sha256(text.encode("utf-8")).digest()
+    return (int.from_bytes(digest[:4], "big") + base) % (2 ** 32)
+
+
+# =======================
+# IMAGE BACKENDS
+# =======================
+class FluxBackend:
+    """FLUX.1-dev + Carousel_127 LoRA. Loaded once and kept resident."""
+    name = "flux"
+
+    def __init__(self, model_id=MODEL_ID, lora_id=LORA_ID, device="cuda:0", embed_cache=True):
+        self.model_id = model_id
+        self.lora_id = lora_id
+        self.device = device  # Using GPU 0 since GPU 5 might be unavailable
+        self.pipe = None
+        self.encoder = None
+        self.embed_cache = EmbedCache() if embed_cache is True else (embed_cache or None)
+        self._embeds = {}  # final prompt -> (prompt_embeds, pooled), for prompts without a disk cache
+        self._hold = 0  # > 0 while hold_encoders() is active
+        self._lora_te = None  # see lora_text_encoder_state()
+
+    def load(self):
+        if self.pipe is not None:
+            return self.pipe
+        import torch
+        from diffusers import FluxPipeline
+
+        # Denoiser only: prompts arrive as cached embeddings, so CLIP/T5 never sit next to it
+        print(f"🧠 Loading {self.model_id} + {self.lora_id} on {self.device}...")
+        pipe = FluxPipeline.from_pretrained(
+            self.model_id, text_encoder=None, text_encoder_2=None, tokenizer=None, tokenizer_2=None,
+            torch_dtype=torch.float16
+        ).to(self.device)
+        pipe.load_lora_weights(self.lora_id, weight_name=LORA_WEIGHTS)
+        self.pipe = pipe
+
+        manager = get_manager()
+        for part in FLUX_PARTS:
+            manager.register(f"flux.{part}", getattr(pipe, part), device=self.device, group="flux", on_evict=self.unload)
+        return pipe
+
+    def unload(self):
+        """Residency manager evicted the pipeline; the next load() rebuilds it."""
+        self.pipe = None
+
+    # --- text encoding ---
+    def load_encoders(self):
+        if self.encoder is not None:
+            return self.encoder
+        import torch
+        from diffusers import FluxPipeline
+
+        print(f"🔤 Loading CLIP + T5 text encoders on {self.device}...")
+        encoder = FluxPipeline.from_pretrained(
+            self.model_id, transformer=None, vae=None, torch_dtype=torch.float16
+        ).to(self.device)
+        # The denoiser pipeline has no text encoders, so its load_lora_weights skips any text-encoder
+        # part of the LoRA: apply that part here, or the embeddings differ from a full pipeline's
+        state, alphas = self.lora_text_encoder_state()
+        if state:
+            print(f"🔤 Applying {len(state)} text-encoder LoRA tensors from {self.lora_id}")
+            FluxPipeline.load_lora_into_text_encoder(
+                state, network_alphas=alphas, text_encoder=encoder.text_encoder, prefix="text_encoder", _pipeline=encoder
+            )
+        self.encoder = encoder
+
+        manager = get_manager()
+        for part in ENCODER_PARTS:
+            manager.register(f"flux.{part}", getattr(encoder, part), device=self.device, group="flux_text", on_evict=self.drop_encoders)
+        return encoder
+
+    def lora_text_encoder_state(self):
+        """(text-encoder tensors of the LoRA, network alphas); ({}, None) when it only targets the
+        transformer, as Carousel_127 does. Read once per backend."""
+        if self._lora_te is None:
+            from diffusers import FluxPipeline
+            state, alphas = FluxPipeline.lora_state_dict(self.lora_id, weight_name=LORA_WEIGHTS, return_alphas=True)
+            state = {k: v for k, v in state.items() if k.startswith("text_encoder.")}
+            self._lora_te = (state, alphas if state else None)
+        return self._lora_te
+
+    def embed_key(self, prompt):
+        # Embeddings only depend on the LoRA when it has text-encoder weights
+        lora_id = self.lora_id if self.lora_text_encoder_state()[0] else None
+        return embed_key(prompt, self.model_id, MAX_SEQUENCE_LENGTH, lora_id)
+
+    def drop_encoders(self):
+        """Frees CLIP + T5 (several GB). Safe to call any time; they reload on the next cache miss."""
+        if self.encoder is None:
+            return
+        self.encoder = None
+        get_manager().evict(f"flux.{ENCODER_PARTS[0]}")
+        print("🔤 Text encoders unloaded, memory handed to the denoiser.")
+
+    def prompt_embeds(self, prompts):
+        """Stacked (prompt_embeds, pooled_prompt_embeds) for prompts, encoding only cache misses."""
+        import torch
+        keys = [self.embed_key(p) for p in prompts]
+        found = {}
+        for prompt, key in zip(prompts, keys):
+            hit = self._embeds.get(key)
+            if hit is None and self.embed_cache is not None:
+                hit = self.embed_cache.load(key, self.device)
+            if hit is not None:
+                found[key] = hit
+
+        missing = list(dict.fromkeys(p for p, k in zip(prompts, keys) if k not in found))
+        if missing:
+            encoder = self.load_encoders()
+            get_manager().use(f"flux.{ENCODER_PARTS[1]}")
+            get_manager().use(f"flux.{ENCODER_PARTS[0]}")
+            with torch.no_grad(), tracing.span("flux.encode", prompts=len(missing)):
+                embeds, pooled, _ = encoder.encode_prompt(
+                    prompt=missing, prompt_2=missing, device=self.device,
+                    num_images_per_prompt=1, max_sequence_length=MAX_SEQUENCE_LENGTH
+                )
+            for i, prompt in enumerate(missing):
+                key = self.embed_key(prompt)
+                found[key] = (embeds[i:i + 1], pooled[i:i + 1])
+                if self.embed_cache is not None:
+                    self.embed_cache.store(key, *found[key])
+                else:
+                    self._embeds[key] = tuple(t.to("cpu") for t in found[key])
+
+        dtype = torch.float16
+        return (
+            torch.cat([found[k][0] for k in keys]).to(self.device, dtype),
+            torch.cat([found[k][1] for k in keys]).to(self.device, dtype),
+        )
+
+    @contextmanager
+    def hold_encoders(self):
+        """Keeps CLIP + T5 loaded across several passes (a streamed job runs one small pass per
+        slide or two) and drops them once at the end instead of after every pass."""
+        self._hold += 1
+        try:
+            yield
+        finally:
+            self._hold -= 1
+            if not self._hold:
+                self.drop_encoders()
+
+    def prepare(self, prompts):
+        """Encoding phase of a pass: fill the embedding cache for every prompt, then drop the
+        encoders (unless hold_encoders() is active)."""
+        self.prompt_embeds(prompts)
+        if not self._hold:
+            self.drop_encoders()
+        if self.embed_cache is not None:
+            self.embed_cache.report()
+
+    def ensure_resident(self):
+        """Pipeline with every part back on the GPU (parts may have been offloaded to CPU meanwhile)."""
+        pipe = self.load()
+        manager = get_manager()
+        if any(manager.use(f"flux.{part}") is None for part in FLUX_PARTS):
+            self.unload()
+            pipe = self.load()
+        return pipe
+
+    def generate(self, prompt, height, width, guidance_scale, num_inference_steps, seed=None):
+        return self.generate_batch([prompt], [seed], height, width, guidance_scale, num_inference_steps)[0]
+
+    def generate_batch(self, prompts, seeds, height, width, guidance_scale, num_inference_steps):
+        """One pipe() call for the whole micro-batch. One generator per prompt keeps every slide's
+        latents identical to what it would get at batch size 1."""
+        import torch
+        pipe = self.ensure_resident()
+        prompt_embeds, pooled_prompt_embeds = self.prompt_embeds(list(prompts))
+        generators = [torch.Generator(self.device).manual_seed(s) for s in seeds] if None not in seeds else None
+        last = [time.perf_counter()]
+
+        def trace_step(pipe, step, timestep, callback_kwargs):
+            now = time.perf_counter()
+            tracing.record("flux.step", now - last[0], step=step, images=len(prompts))
+            last[0] = now
+            return callback_kwargs
+
+        return pipe(
+            prompt_embeds=prompt_embeds,
+            pooled_prompt_embeds=pooled_prompt_embeds,
+            height=height,
+            width=width,
+            guidance_scale=guidance_scale,
+            num_inference_steps=num_inference_steps,
+            generator=generators,
+            callback_on_step_end=trace_step
+        ).images
+
+    def max_batch_size(self, height, width):
+        """Largest micro-batch that fits in the VRAM left over after the weights are resident."""
+        import torch
+        if not torch.cuda.is_available():
+            return 1
+        self.load()
+        free_bytes, _ = torch.cuda.mem_get_info(torch.device(self.device))
+        per_image = MB_PER_IMAGE * (height * width) / (1024 * 1024)
+        fits = int((free_bytes / 1024 / 1024 - VRAM_HEADROOM_MB) // per_image)
+        return max(1, min(MAX_BATCH, fits))
+
+    def release(self):
+        """Clear VRAM cache once a generation pass is done (not per image: that throws away allocator warmth)."""
+        import torch
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+
+class StubBackend:
+    """CPU stand-in for FLUX: a flat colour derived from the prompt. For dry runs and tests.
+
+    call_overhead / per_image (seconds) optionally simulate pipeline latency for benchmarks.
+    """
+    name = "stub"
+    lora_id = "stub"
+
+    def __init__(self, call_overhead=0.0, per_image=0.0):
+        self.call_overhead = call_overhead
+        self.per_image = per_image
+
+    def load(self):
+        return self
+
+    def generate(self, prompt, height, width, guidance_scale, num_inference_steps, seed=None):
+        return self.generate_batch([prompt], [seed], height, width, guidance_scale, num_inference_steps)[0]
+
+    def prepare(self, prompts):
+        pass
+
+    def hold_encoders(self):
+        return nullcontext()
+
+    def generate_batch(self, prompts, seeds, height, width, guidance_scale, num_inference_steps):
+        from PIL import Image
+        if self.call_overhead or self.per_image:
+            time.sleep(self.call_overhead + self.per_image * len(prompts))
+        images = []
+        for prompt in prompts:
+            digest = hashlib.sha256(prompt.encode("utf-8")).digest()
+            images.append(Image.new("RGB", (width, height), tuple(digest[:3])))
+        return images
+
+    def max_batch_size(self, height, width):
+        return MAX_BATCH
+
+    def release(self):
+        pass
+
+
+BACKENDS = {"flux": FluxBackend, "stub": StubBackend}
+
+
+def get_backend(name="flux"):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown image backend '{name}'. Choose from {list(BACKENDS)}")
+    return BACKENDS[name]()
+
+
+# =======================
+# GENERATION LOOP
+# =======================
+def plan_slide(backend, slide, output_dir, vary_seeds=False):
+    final_prompt = build_prompt(slide['image_prompt'])
+    if vary_seeds:
+        seed = prompt_seed(final_prompt, slide['slide_number'], os.path.basename(os.path.normpath(output_dir)))
+    else:
+        seed = prompt_seed(final_prompt)
+    return {
+        "slide_number": slide['slide_number'],
+        # We save as slide_1.png, slide_2.png, etc.
+        "path": os.path.join(output_dir, f"slide_{slide['slide_number']}.png"),
+        "prompt": final_prompt,
+        "seed": seed,
+        "key": cache_key(final_prompt, seed=seed, lora_id=backend.lora_id, **GEN_PARAMS),
+    }
+
+
+def generate_days(backend, day_jobs, cache=None, batch_size=None, on_image=None, vary_seeds=None):
+    """Generates backgrounds for several days at once.
+
+    day_jobs is a list of (slides_data, output_dir). Prompts from every day are pooled,
+    identical (prompt, seed) pairs are generated once, and the rest go through the
+    backend in micro-batches sized to free memory. Slides whose build manifest entry
+    already matches their key are left untouched. on_image(slide_number, path) is called
+    as soon as each background is on disk. vary_seeds (default FLUX_VARY_SEEDS) seeds each
+    slide separately instead of per prompt. Returns the saved paths per day.
+    """
+    vary_seeds = VARY_SEEDS if vary_seeds is None else vary_seeds
+    saved, pending = [], {}
+    fresh = 0
+
+    def done(item, record=True):
+        if record:
+            item["manifest"].record(os.path.basename(item["path"]), item["key"])
+        if on_image:
+            on_image(item["slide_number"], item["path"])
+
+    for slides_data, output_dir in day_jobs:
+        os.makedirs(output_dir, exist_ok=True)
+        manifest = BuildManifest.for_dir(output_dir)
+        items = [plan_slide(backend, slide, output_dir, vary_seeds) for slide in slides_data]
+        saved.append([it["path"] for it in items])
+
+        for it in items:
+            it["manifest"] = manifest
+            if manifest.fresh(os.path.basename(it["path"]), it["key"]):
+                fresh += 1
+                done(it, record=False)
+            elif it["key"] in pending:
+                pending[it["key"]].append(it)
+            elif cache is not None and cache.fetch(it["key"], it["path"]):
+                print(f"♻️  Slide {it['slide_number']}: cache hit -> {it['path']}")
+                done(it)
+            else:
+                pending[it["key"]] = [it]
+
+    groups = list(pending.values())
+    total_slides = sum(len(paths) for paths in saved)
+    if fresh:
+        print(f"⏭️  {fresh}/{total_slides} backgrounds already up to date, skipping them.")
+    if not groups:
+        print(f"✨ Nothing to generate: all {total_slides} slides are up to date or cached.")
+    else:
+        batch_size = batch_size or backend.max_batch_size(GEN_PARAMS["height"], GEN_PARAMS["width"])
+        print(f"🚀 Starting dynamic generation for {len(groups)} unique prompts "
+              f"({total_slides} slides) in micro-batches of {batch_size}...")
+
+        start = time.time()
+        backend.prepare([g[0]["prompt"] for g in groups])
+        for i in range(0, len(groups), batch_size):
+            chunk = groups[i:i + batch_size]
+            print(f"🎨 Generating slides {[g[0]['slide_number'] for g in chunk]}...")
+            with tracing.span("flux.batch", backend=backend.name, images=len(chunk)):
+                images = backend.generate_batch(
+                    [g[0]["prompt"] for g in chunk], [g[0]["seed"] for g in chunk], **GEN_PARAMS
+                )
+            for group, image in zip(chunk, images):
+                first = group[0]
+                if cache is not None:
+                    cache.store(first["key"], image, first["path"])
+                else:
+                    if os.path.lexists(first["path"]):
+                        os.remove(first["path"])  # may be a hard link into the cache
+                    image.save(first["path"])
+                for dup in group[1:]:
+                    if dup["path"] != first["path"]:
+                        link_or_copy(first["path"], dup["path"])
+                for it in group:
+                    done(it)
+                print(f"✅ Saved to {', '.join(it['path'] for it in group)}")
+
+        elapsed = time.time() - start
+        print(f"⚡ {len(groups)} images in {elapsed:.2f}s ({len(groups) / max(elapsed, 1e-9):.2f} img/s)")
+        backend.release()
+
+    if cache is not None:
+        cache.report()
+    return saved
+
+
+def generate_images(backend, slides_data, output_dir, cache=None, batch_size=None, on_image=None, vary_seeds=None):
+    """Writes slide_{n}.png for every slide into output_dir. Returns the saved paths.
+
+    With a cache, slides whose (prompt, params, seed, LoRA) were generated before are
+    linked from disk and skip the diffusion call entirely.
+    """
+    return generate_days(backend, [(slides_data, output_dir)], cache=cache, batch_size=batch_size,
+                         on_image=on_image, vary_seeds=vary_seeds)[0]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--outdir", type=str, action="append", help="Directory for JSON and output images (repeat to batch several days)")
+    parser.add_argument("--backend", type=str, default="flux", choices=list(BACKENDS), help="Image generator")
+    parser.add_argument("--no-cache", action="store_true", help="Always run diffusion, bypassing flux_cache")
+    parser.add_argument("--batch-size", type=int, default=None, help="Prompts per pipe() call (default: sized to free VRAM)")
+    parser.add_argument("--vary-seeds", action="store_true", help="Different background per slide even when prompts repeat (no cache reuse between them)")
+    args = parser.parse_args()
+
+    # Determine paths
+    if args.outdir:
+        targets = [(os.path.join(d, "carousal.json"), d) for d in args.outdir]
+    else:
+        targets = [(os.path.join(BASE_PATH, "carousal.json"), os.path.join(BASE_PATH, "flux_assets"))]
+
+    day_jobs = []
+    for json_path, output_dir in targets:
+        with open(json_path, 'r') as f:
+            day_jobs.append((json.load(f), output_dir))
+
+    cache = None if args.no_cache else ImageCache()
+    generate_days(get_backend(args.backend), day_jobs, cache=cache, batch_size=args.batch_size,
+                  vary_seeds=args.vary_seeds or None)
+    print("\n✨ All assets generated from carousal.json are ready.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+# Location: /nuvodata/User_data/shiva/Market_carousal/index_builder.py
+# Incremental FAISS knowledge index over knowledge.md + intelligence/*.txt (replaces the
+# test.ipynb cell that re-embedded everything). Chunks are content-hashed: only new chunks
+# are embedded and vectors of chunks that disappeared are removed in place.
+# Run: python index_builder.py [--rebuild] [--watch]
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+
+import tracing
+from lazy_resources import resolve
+
+BASE_PATH = "/nuvodata/User_data/shiva/Market_carousal"
+KNOWLEDGE_FILE = os.path.join(BASE_PATH, "knowledge.md")
+INTEL_DIR = os.path.join(BASE_PATH, "intelligence")
+FAISS_PATH = os.path.join(BASE_PATH, "faiss_index")
+MANIFEST_NAME = "chunks.json"
+
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 100
+EMBED_BATCH = int(os.getenv("INDEX_EMBED_BATCH", "64"))
+WATCH_INTERVAL_S = float(os.getenv("INDEX_WATCH_INTERVAL_S", "30"))
+HEADERS_TO_SPLIT_ON = [("#", "Header 1"), ("##", "Header 2"), ("###", "Header 3")]
+
+
+def file_hash(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def chunk_id(source, text):
+    return hashlib.sha256(f"{source}\0{text}".encode("utf-8")).hexdigest()
+
+
+def list_sources(knowledge_file=KNOWLEDGE_FILE, intel_dir=INTEL_DIR):
+    """{source name: path} for knowledge.md and every intelligence/*.txt."""
+    sources = {}
+    if os.path.exists(knowledge_file):
+        sources[os.path.basename(knowledge_file)] = knowledge_file
+    if os.path.isdir(intel_dir):
+        for name in sorted(os.listdir(intel_dir)):
+            if name.endswith(".txt"):
+                sources[f"intelligence/{name}"] = os.path.join(intel_dir, name)
+    return sources
+
+
+def split_source(name, path):
+    """[(chunk id, text, metadata)] for one file. Markdown is split on headers first, as before."""
+    from langchain_text_splitters import MarkdownHeaderTextSplitter, RecursiveCharacterTextSplitter
+
+    with open(path, "r", encoding="utf-8") as f:
+        content = f.read()
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    if path.endswith(".md"):
+        docs = splitter.split_documents(MarkdownHeaderTextSplitter(headers_to_split_on=HEADERS_TO_SPLIT_ON).split_text(content))
+        pieces = [(d.page_content, d.metadata) for d in docs]
+    else:
+        pieces = [(text, {}) for text in splitter.split_text(content)]
+
+    chunks = {}
+    for text, metadata in pieces:
+        # Identical chunks within a file are stored once
+        chunks.setdefault(chunk_id(name, text), (text, dict(metadata, source=name)))
+    return [(cid, text, metadata) for cid, (text, metadata) in chunks.items()]
+
+
+class IndexBuilder:
+    """Keeps faiss_index in sync with the source files. faiss_index/chunks.json records, per
+    source, the file hash and chunk ids already embedded."""
+
+    def __init__(self, embeddings, index_dir=FAISS_PATH, knowledge_file=KNOWLEDGE_FILE, intel_dir=INTEL_DIR):
+        self.embeddings = embeddings
+        self.index_dir = index_dir
+        self.knowledge_file = knowledge_file
+        self.intel_dir = intel_dir
+        self.manifest_path = os.path.join(index_dir, MANIFEST_NAME)
+        self._lock = threading.Lock()
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _load_db(self):
+        from langchain_community.vectorstores import FAISS
+        if not os.path.exists(os.path.join(self.index_dir, "index.faiss")):
+            return None
+        return FAISS.load_local(self.index_dir, resolve(self.embeddings), allow_dangerous_deserialization=True)
+
+    def _write_manifest(self, folder, manifest):
+        tmp = os.path.join(folder, f"{MANIFEST_NAME}.tmp")
+        with open(tmp, "w") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp, os.path.join(folder, MANIFEST_NAME))
+
+    def _save(self, db, manifest):
+        """Writes a new faiss_index.v<ns> folder, then repoints the faiss_index symlink at it with
+        one rename, so RagService sees the old index or the new one, never a mix of the two."""
+        parent, base = os.path.split(os.path.abspath(self.index_dir))
+        version = os.path.join(parent, f"{base}.v{time.time_ns()}")
+        db.save_local(version)
+        self._write_manifest(version, manifest)
+
+        previous = os.path.realpath(self.index_dir)
+        if os.path.isdir(self.index_dir) and not os.path.islink(self.index_dir):
+            # A plain folder (built by the notebook) is moved aside once so the name can become a link
+            previous = os.path.join(parent, f"{base}.v0")
+            os.rename(self.index_dir, previous)
+        link = f"{self.index_dir}.link.tmp"
+        if os.path.lexists(link):
+            os.remove(link)
+        os.symlink(os.path.basename(version), link)
+        os.replace(link, self.index_dir)
+
+        # Keep the previous version for readers that resolved the link just before the swap
+        for name in os.listdir(parent):
+            path = os.path.join(parent, name)
+            if name.startswith(f"{base}.v") and path not in (version, previous) and os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+
+    def stale_sources(self):
+        """True when a source file was added, changed or removed since the last update."""
+        manifest = self._load_manifest()
+        sources = list_sources(self.knowledge_file, self.intel_dir)
+        if set(sources) != set(manifest):
+            return True
+        return any(manifest[name]["hash"] != file_hash(path) for name, path in sources.items())
+
+    def update(self, rebuild=False):
+        """Embeds new chunks and drops removed ones. Returns {"added", "removed", "sources", "seconds"}."""
+        with self._lock, tracing.span("rag.index_update", rebuild=rebuild) as sp:
+            start = time.perf_counter()
+            manifest = {} if rebuild else self._load_manifest()
+            if not rebuild and not manifest and os.path.exists(os.path.join(self.index_dir, "index.faiss")):
+                # Built outside this module: its chunk ids are unknown, so adding on top would duplicate them
+                print("⚠️ faiss_index has no chunks.json, rebuilding it from the sources once")
+                rebuild = sp["rebuild"] = True
+            db = None if rebuild else self._load_db()
+            if db is None:
+                manifest = {}
+
+            sources = list_sources(self.knowledge_file, self.intel_dir)
+            to_add, to_remove, new_manifest = [], [], {}
+            for name, path in sources.items():
+                digest = file_hash(path)
+                old = manifest.get(name)
+                if old and old["hash"] == digest:
+                    new_manifest[name] = old
+                    continue
+                chunks = split_source(name, path)
+                old_ids = set(old["chunks"]) if old else set()
+                new_ids = [cid for cid, _, _ in chunks]
+                to_add += [c for c in chunks if c[0] not in old_ids]
+                to_remove += sorted(old_ids - set(new_ids))
+                new_manifest[name] = {"hash": digest, "chunks": new_ids}
+            for name in set(manifest) - set(sources):
+                to_remove += manifest[name]["chunks"]  # file deleted
+
+            if to_add or to_remove:
+                db = self._apply(db, to_add, to_remove)
+                self._save(db, new_manifest)
+            elif db is not None and new_manifest != manifest:
+                # Files touched but their chunks are identical: only the hashes move
+                self._write_manifest(os.path.realpath(self.index_dir), new_manifest)
+
+            elapsed = time.perf_counter() - start
+            sp.update(added=len(to_add), removed=len(to_remove))
+            print(f"📚 Index update: +{len(to_add)} / -{len(to_remove)} chunks from {len(sources)} sources in {elapsed:.2f}s")
+            return {"added": len(to_add), "removed": len(to_remove), "sources": len(sources), "seconds": elapsed}
+
+    def _apply(self, db, to_add, to_remove):
+        from langchain_community.vectorstores import FAISS
+
+        embeddings = resolve(self.embeddings)  # the MiniLM model loads here, not at bot startup
+        if db is not None and to_remove:
+            present = [cid for cid in to_remove if cid in db.index_to_docstore_id.values()]
+            if present:
+                db.delete(ids=present)
+
+        for i in range(0, len(to_add), EMBED_BATCH):
+            batch = to_add[i:i + EMBED_BATCH]
+            texts = [text for _, text, _ in batch]
+            with tracing.span("rag.embed_batch", chunks=len(batch)):
+                vectors = embeddings.embed_documents(texts)
+            pairs = list(zip(texts, vectors))
+            metadatas = [metadata for _, _, metadata in batch]
+            ids = [cid for cid, _, _ in batch]
+            if db is None:
+                db = FAISS.from_embeddings(pairs, embeddings, metadatas=metadatas, ids=ids)
+            else:
+                db.add_embeddings(pairs, metadatas=metadatas, ids=ids)
+        return db
+
+
+class IndexWatcher:
+    """Background thread: polls source mtimes and runs an incremental update when they change."""
+
+    def __init__(self, builder, interval=WATCH_INTERVAL_S):
+        self.builder = builder
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._signature = None
+
+    def signature(self):
+        sources = list_sources(self.builder.knowledge_file, self.builder.intel_dir)
+        return tuple((name, os.stat(path).st_mtime_ns, os.stat(path).st_size) for name, path in sources.items())
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return self
+        self._thread = threading.Thread(target=self._loop, name="index-watcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                signature = self.signature()
+                if signature != self._signature:
+                    if self._signature is not None or self.builder.stale_sources():
+                        print("🔄 Knowledge sources changed, updating FAISS index...")
+                        self.builder.update()
+                    self._signature = signature
+            except Exception as e:
+                print(f"⚠️ Index watcher error: {e}")
+            self._stop.wait(self.interval)
+
+
+def start_index_watcher(embeddings, interval=WATCH_INTERVAL_S):
+    return IndexWatcher(IndexBuilder(embeddings), interval).start()
+
+
+if __name__ == "__main__":
+    import argparse
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rebuild", action="store_true", help="Re-embed everything from scratch")
+    parser.add_argument("--watch", action="store_true", help="Keep running and update when sources change")
+    args = parser.parse_args()
+
+    embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+    builder = IndexBuilder(embeddings)
+    builder.update(rebuild=args.rebuild)
+    if args.watch:
+        watcher = IndexWatcher(builder).start()
+        print(f"👀 Watching knowledge.md and intelligence/ every {watcher.interval:.0f}s (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            watcher.stop()
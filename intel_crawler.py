@@ -0,0 +1,239 @@
+# Location: /nuvodata/User_data/shiva/Market_carousal/intel_crawler.py
+# Competitor crawler (promoted from test.ipynb batch_scout): asyncio + aiohttp with pooled
+# connections, per-host concurrency/rate limits and conditional GETs (ETag / Last-Modified).
+# Only pages whose extracted text actually changed are rewritten in intelligence/.
+# Run: python intel_crawler.py https://openai.com/news https://www.anthropic.com/news
+import os
+import re
+import json
+import time
+import asyncio
+import hashlib
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+
+import tracing
+
+BASE_PATH = "/nuvodata/User_data/shiva/Market_carousal"
+INTEL_DIR = os.path.join(BASE_PATH, "intelligence")
+STATE_NAME = ".crawl_state.json"
+MAX_CHARS = 4000  # Keep each page small for Llama
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) Chrome/120.0.0.0 Safari/537.36"
+
+PER_HOST = int(os.getenv("CRAWL_PER_HOST", "2"))        # open connections per host
+RATE_PER_HOST = float(os.getenv("CRAWL_RATE", "2.0"))   # requests/sec per host (0 = unlimited)
+TOTAL_CONNECTIONS = int(os.getenv("CRAWL_CONNECTIONS", "16"))
+TIMEOUT_S = float(os.getenv("CRAWL_TIMEOUT_S", "15"))
+
+DEFAULT_TARGETS = ["https://openai.com/news", "https://www.anthropic.com/news"]
+
+
+def extract_text(html):
+    """Core page text: article/main/section if present, else body, minus scripts and chrome."""
+    from bs4 import BeautifulSoup
+    try:
+        soup = BeautifulSoup(html, "lxml")
+    except Exception:
+        soup = BeautifulSoup(html, "html.parser")  # lxml not installed
+
+    main_content = soup.find(["article", "main", "section"]) or soup.body or soup
+    for tag in main_content(["script", "style", "nav", "footer", "header"]):
+        tag.decompose()
+    return main_content.get_text(separator=" ", strip=True)[:MAX_CHARS]
+
+
+def page_filename(url):
+    """Stable file name per URL, e.g. openai.com_news.txt."""
+    parts = urlsplit(url)
+    slug = re.sub(r"[^A-Za-z0-9._-]+", "_", f"{parts.netloc}{parts.path}".rstrip("/")).strip("_")
+    return f"{slug or 'index'}.txt"
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class HostGate:
+    """Per-host concurrency cap plus a minimum spacing between request starts."""
+
+    def __init__(self, per_host=PER_HOST, rate=RATE_PER_HOST):
+        self.rate = rate
+        self._slots = defaultdict(lambda: asyncio.Semaphore(per_host))
+        self._next = defaultdict(float)
+
+    @asynccontextmanager
+    async def slot(self, host):
+        async with self._slots[host]:
+            if self.rate:
+                now = asyncio.get_running_loop().time()
+                start = max(now, self._next[host])
+                self._next[host] = start + 1 / self.rate
+                if start > now:
+                    await asyncio.sleep(start - now)
+            yield
+
+
+class IntelCrawler:
+    """Crawls URLs into intel_dir/<page>.txt. State (validators, content hashes) persists in
+    intel_dir/.crawl_state.json so re-runs send conditional requests and skip unchanged text."""
+
+    def __init__(self, intel_dir=INTEL_DIR, per_host=PER_HOST, rate=RATE_PER_HOST,
+                 connections=TOTAL_CONNECTIONS, timeout=TIMEOUT_S):
+        self.intel_dir = intel_dir
+        self.per_host = per_host
+        self.rate = rate
+        self.connections = connections
+        self.timeout = timeout
+        self.state_path = os.path.join(intel_dir, STATE_NAME)
+        self.state = self._load_state()
+        self.metrics = {}
+
+    def _load_state(self):
+        try:
+            with open(self.state_path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state(self):
+        os.makedirs(self.intel_dir, exist_ok=True)
+        tmp = f"{self.state_path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.state, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.state_path)
+
+    def _write(self, filename, text):
+        path = os.path.join(self.intel_dir, filename)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            f.write(text)
+        os.replace(tmp, path)
+        return path
+
+    def _count(self, key, n=1):
+        self.metrics[key] = self.metrics.get(key, 0) + n
+
+    # --- crawl ---
+    async def fetch(self, session, gate, url, seen_hashes, force=False):
+        """Returns (url, status) where status is written / not_modified / unchanged / duplicate / error."""
+        import aiohttp
+
+        prev = {} if force else self.state.get(url, {})
+        if "duplicate_of" in prev:
+            prev = {}  # it has no file of its own, so a 304 would leave it with nothing
+        headers = {}
+        if prev.get("etag"):
+            headers["If-None-Match"] = prev["etag"]
+        if prev.get("last_modified"):
+            headers["If-Modified-Since"] = prev["last_modified"]
+
+        try:
+            async with gate.slot(urlsplit(url).netloc):
+                with tracing.span("crawl.fetch", url=url, conditional=bool(headers)) as sp:
+                    async with session.get(url, headers=headers) as response:
+                        sp["status"] = response.status
+                        if response.status == 304:
+                            self._count("not_modified")
+                            self._count("bytes_saved", prev.get("bytes", 0))
+                            return url, "not_modified"
+                        response.raise_for_status()
+                        body = await response.read()
+                        validators = {
+                            "etag": response.headers.get("ETag"),
+                            "last_modified": response.headers.get("Last-Modified"),
+                        }
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self._count("errors")
+            print(f"❌ Crawl failed: {url} ({e})")
+            return url, "error"
+
+        self._count("fetched")
+        self._count("bytes_downloaded", len(body))
+        text = extract_text(body)
+        digest = content_hash(text)
+        entry = dict(prev, **validators, bytes=len(body), content_hash=digest, fetched_at=time.time())
+        entry.setdefault("file", page_filename(url))
+        self.state[url] = entry
+
+        # Same text as last time (e.g. server without validators): nothing to rewrite
+        if digest == prev.get("content_hash") and os.path.exists(os.path.join(self.intel_dir, entry["file"])):
+            self._count("unchanged")
+            return url, "unchanged"
+        # Same text as another page in this crawl (mirrors, redirects to one article)
+        if digest in seen_hashes:
+            original = seen_hashes[digest]
+            entry["duplicate_of"] = original
+            self._count("duplicates")
+            print(f"♻️  {url}: same content as {original}, not saved twice")
+            # Drop the text it saved before it became a mirror, or the stale copy keeps getting indexed
+            stale = os.path.join(self.intel_dir, entry["file"])
+            if entry["file"] != self.state.get(original, {}).get("file") and os.path.exists(stale):
+                os.remove(stale)
+                print(f"🗑️  Removed stale intelligence: {stale}")
+            return url, "duplicate"
+        seen_hashes[digest] = url
+        entry.pop("duplicate_of", None)
+
+        path = self._write(entry["file"], text)
+        self._count("written")
+        print(f"✅ Intelligence Saved: {path}")
+        return url, "written"
+
+    async def crawl(self, urls, force=False):
+        """Crawls every URL concurrently (bounded per host). Returns {url: status}."""
+        import aiohttp
+
+        os.makedirs(self.intel_dir, exist_ok=True)
+        self.metrics = {k: 0 for k in ("fetched", "not_modified", "unchanged", "duplicates", "written",
+                                        "errors", "bytes_downloaded", "bytes_saved")}
+        urls = list(dict.fromkeys(urls))
+        # Unchanged pages keep their hash in seen_hashes so a mirror of them is still caught
+        seen_hashes = {
+            self.state[u]["content_hash"]: u for u in urls
+            if not force and self.state.get(u, {}).get("content_hash") and "duplicate_of" not in self.state[u]
+        }
+        gate = HostGate(self.per_host, self.rate)
+        connector = aiohttp.TCPConnector(limit=self.connections, limit_per_host=self.per_host)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+
+        print(f"🚀 Starting Parallel Scout for {len(urls)} targets...")
+        start = time.perf_counter()
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout,
+                                         headers={"User-Agent": USER_AGENT}) as session:
+            results = await asyncio.gather(*(self.fetch(session, gate, u, seen_hashes, force) for u in urls))
+        elapsed = time.perf_counter() - start
+
+        self._save_state()
+        self.metrics.update(pages=len(urls), seconds=elapsed, pages_per_s=len(urls) / max(elapsed, 1e-9))
+        return dict(results)
+
+    def report(self):
+        m = self.metrics
+        print(
+            f"🕸️  Crawl: {m['pages']} pages in {m['seconds']:.2f}s ({m['pages_per_s']:.1f} pages/s) | "
+            f"{m['written']} written, {m['not_modified']} not modified, {m['unchanged']} unchanged, "
+            f"{m['duplicates']} duplicates, {m['errors']} errors | "
+            f"{m['bytes_downloaded'] / 1024:.1f} KB downloaded, {m['bytes_saved'] / 1024:.1f} KB saved by 304s"
+        )
+
+
+def run_crawl(urls, intel_dir=INTEL_DIR, force=False, **kwargs):
+    """Sync entry point for the pipeline / bot executor. Returns the crawler (metrics, state)."""
+    crawler = IntelCrawler(intel_dir, **kwargs)
+    asyncio.run(crawler.crawl(urls, force=force))
+    crawler.report()
+    return crawler
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("urls", nargs="*", default=DEFAULT_TARGETS)
+    parser.add_argument("--outdir", default=INTEL_DIR)
+    parser.add_argument("--per-host", type=int, default=PER_HOST, help="Concurrent connections per host")
+    parser.add_argument("--rate", type=float, default=RATE_PER_HOST, help="Requests/sec per host (0 = unlimited)")
+    parser.add_argument("--force", action="store_true", help="Ignore validators and stored hashes")
+    args = parser.parse_args()
+
+    run_crawl(args.urls, args.outdir, force=args.force, per_host=args.per_host, rate=args.rate)
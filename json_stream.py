@@ -0,0 +1,92 @@
+# Location: /nuvodata/User_data/shiva/Market_carousal/json_stream.py
+# Incremental scanner for the carousel JSON as it streams out of the LLM: every object in the
+# top-level "slides" array (or of a bare top-level list of slides) is parsed and handed out the
+# moment its closing brace arrives, so image generation can start on slide 1 while the rest of the
+# response is still being written.
+import json
+
+
+class SlideStream:
+    """Feed it text chunks; feed() returns the slide dicts completed by that chunk.
+
+    Only tracks string/escape state and bracket depth, so Markdown fences or chatter around the
+    JSON are ignored. A top-level "[" counts as a bare slides list until something other than an
+    object shows up in it (e.g. "[1]" in the chatter). The full text stays in .text for the
+    regular parse at the end.
+    """
+
+    def __init__(self, key="slides"):
+        self.key = key
+        self.text = ""
+        self.slides = []
+        self._pos = 0
+        self._stack = []        # open containers: "{" / "["
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._last_string = None
+        self._current_key = None
+        self._array_depth = None  # depth of the slides array once it opens
+        self._slide_start = None
+
+    def feed(self, chunk):
+        self.text += chunk
+        completed = []
+        text = self.text
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._last_string = text[self._string_start + 1:i]
+                continue
+
+            if self._array_depth == 1 and len(self._stack) == 1 and ch not in '{,] \t\r\n':
+                self._stack.clear()  # not a list of slide objects after all
+                self._array_depth = None
+                continue
+            if ch == '"':
+                if self._stack:
+                    self._in_string = True
+                    self._string_start = i
+            elif ch == ":" and len(self._stack) == 1:
+                self._current_key = self._last_string
+            elif ch in "{[":
+                if not self._stack and ch == "[":
+                    self._array_depth = 1  # bare list of slides, as salvage() also accepts
+                elif ch == "[" and len(self._stack) == 1 and self._current_key == self.key:
+                    self._array_depth = 2
+                if ch == "{" and self._array_depth and len(self._stack) == self._array_depth:
+                    self._slide_start = i
+                self._stack.append(ch)
+            elif ch in "}]" and self._stack:
+                self._stack.pop()
+                if ch == "}" and self._slide_start is not None and len(self._stack) == self._array_depth:
+                    slide = self._parse(text[self._slide_start:i + 1])
+                    self._slide_start = None
+                    if slide is not None:
+                        self.slides.append(slide)
+                        completed.append(slide)
+                elif ch == "]" and self._array_depth and len(self._stack) == self._array_depth - 1:
+                    self._array_depth = None  # slides array closed
+        self._pos = len(text)
+        return completed
+
+    @staticmethod
+    def _parse(fragment):
+        try:
+            slide = json.loads(fragment, strict=False)
+        except json.JSONDecodeError:
+            return None  # left to the full parse once the response is complete
+        return slide if isinstance(slide, dict) else None
+
+
+def iter_slides(chunks, key="slides"):
+    """Yields slides from an iterable of text chunks as soon as each one is complete."""
+    stream = SlideStream(key)
+    for chunk in chunks:
+        yield from stream.feed(chunk)
@@ -0,0 +1,82 @@
+# Location: /nuvodata/User_data/shiva/Market_carousal/lazy_resources.py
+# Registry of heavy process-wide resources (LLM clients, the MiniLM embedder, the LangGraph
+# graph). Modules register a factory at import time, which is free; the resource is built on
+# first use, once per process, and its build time is traced as "lazy.<name>".
+import time
+import threading
+
+import tracing
+
+_factories = {}
+_instances = {}
+_timings = {}
+_locks = {}
+_registry_lock = threading.Lock()
+
+
+def register(name, factory=None):
+    """register("minilm", build) or @register("minilm") on the factory function."""
+    if factory is None:
+        return lambda f: register(name, f)
+    with _registry_lock:
+        _factories[name] = factory
+        _locks.setdefault(name, threading.Lock())
+    return factory
+
+
+def get(name):
+    """The resource, built on first call (other threads asking meanwhile wait for it)."""
+    if name in _instances:
+        return _instances[name]
+    if name not in _factories:
+        raise KeyError(f"No lazy resource '{name}'. Registered: {sorted(_factories)}")
+    with _locks[name]:
+        if name not in _instances:
+            start = time.perf_counter()
+            with tracing.span(f"lazy.{name}"):
+                _instances[name] = _factories[name]()
+            _timings[name] = time.perf_counter() - start
+            print(f"💤 Lazy init: {name} ready in {_timings[name]:.2f}s")
+    return _instances[name]
+
+
+def is_loaded(name):
+    return name in _instances
+
+
+def warm(*names):
+    """Builds resources on a background thread (e.g. right after the bot starts polling)."""
+    def run():
+        for name in names:
+            try:
+                get(name)
+            except Exception as e:
+                print(f"⚠️ Lazy init of {name} failed: {e}")
+    thread = threading.Thread(target=run, name="lazy-warm", daemon=True)
+    thread.start()
+    return thread
+
+
+def report():
+    for name in sorted(_factories):
+        state = f"{_timings[name]:.2f}s" if name in _timings else "not loaded"
+        print(f"💤 {name}: {state}")
+
+
+class Lazy:
+    """Stand-in for a registered resource: any attribute access builds it, so module globals like
+    orchestrator.llm keep working while costing nothing at import."""
+
+    def __init__(self, name):
+        object.__setattr__(self, "_name", name)
+
+    def __getattr__(self, attr):
+        return getattr(get(self._name), attr)
+
+    def __repr__(self):
+        return f"<lazy {self._name}{'' if is_loaded(self._name) else ' (not loaded)'}>"
+
+
+def resolve(obj):
+    """The real object behind a Lazy (anything else unchanged), for APIs that type-check."""
+    return get(obj._name) if isinstance(obj, Lazy) else obj
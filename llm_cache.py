@@ -0,0 +1,296 @@
+# Location: /nuvodata/User_data/shiva/Market_carousal/llm_cache.py
+# Shared SQLite cache of Groq responses for orchestrator, content_for_slides, bot_brain and
+# scoutman. Keyed by (model, messages, temperature, max_tokens); entries expire after
+# LLM_CACHE_TTL_S and the oldest are dropped past LLM_CACHE_MAX_MB.
+# LLM_CACHE_MODE: "on" (default) | "off" | "replay" (cache only: misses raise, fully offline runs).
+# Stats per call site: python llm_cache.py --stats
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+BASE_PATH = "/nuvodata/User_data/shiva/Market_carousal"
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(BASE_PATH, "llm_cache.sqlite"))
+LLM_CACHE_TTL_S = int(os.getenv("LLM_CACHE_TTL_S", str(7 * 24 * 3600)))
+LLM_CACHE_MAX_MB = float(os.getenv("LLM_CACHE_MAX_MB", "200"))
+LLM_CACHE_MODE = os.getenv("LLM_CACHE_MODE", "on").lower()
+MODES = ("on", "off", "replay")
+
+
+class LLMCacheMiss(RuntimeError):
+    """Replay mode and the request was never recorded."""
+
+
+def message_list(messages):
+    """[[role, content]] for a prompt string, LangChain messages or (role, content) tuples."""
+    if isinstance(messages, str):
+        return [["human", messages]]
+    out = []
+    for m in messages:
+        if isinstance(m, (tuple, list)):
+            out.append([str(m[0]), m[1]])
+        else:
+            out.append([getattr(m, "type", type(m).__name__), getattr(m, "content", str(m))])
+    return out
+
+
+def model_id(llm):
+    return getattr(llm, "model_name", None) or getattr(llm, "model", None) or type(llm).__name__
+
+
+def request_key(model, messages, temperature=None, max_tokens=None, **kwargs):
+    payload = json.dumps({
+        "model": model, "messages": message_list(messages), "temperature": temperature,
+        "max_tokens": max_tokens, "kwargs": kwargs,
+    }, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """SQLite store: one row per request key, plus cumulative hit/miss counters per call site."""
+
+    def __init__(self, path=LLM_CACHE_PATH, ttl=LLM_CACHE_TTL_S, max_mb=LLM_CACHE_MAX_MB, mode=LLM_CACHE_MODE):
+        if mode not in MODES:
+            raise ValueError(f"LLM_CACHE_MODE must be one of {MODES}, got '{mode}'")
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.mode = mode
+        self.stats = {}  # this process: {site: {"hits", "misses", "saved_s"}}
+        self._lock = threading.Lock()
+        self._db = None
+
+    def _conn(self):
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")  # bot and pipeline processes share the file
+            db.execute("""CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY, site TEXT, model TEXT, content TEXT, usage TEXT,
+                latency_s REAL, created REAL, accessed REAL, size INTEGER)""")
+            db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+            db.execute("""CREATE TABLE IF NOT EXISTS site_stats (
+                site TEXT PRIMARY KEY, hits INTEGER, misses INTEGER, saved_s REAL)""")
+            self._db = db
+        return self._db
+
+    def _count(self, site, hit, saved_s=0.0):
+        with self._lock:
+            s = self.stats.setdefault(site, {"hits": 0, "misses": 0, "saved_s": 0.0})
+            s["hits" if hit else "misses"] += 1
+            s["saved_s"] += saved_s
+            if self.mode == "off":
+                return
+            self._conn().execute(
+                """INSERT INTO site_stats VALUES (?, ?, ?, ?) ON CONFLICT(site) DO UPDATE SET
+                   hits = hits + excluded.hits, misses = misses + excluded.misses, saved_s = saved_s + excluded.saved_s""",
+                (site, int(hit), int(not hit), saved_s)
+            )
+
+    def get(self, key, site):
+        """{"content", "usage", "latency_s"} or None. Replay mode ignores the TTL and raises on a miss."""
+        if self.mode == "off":
+            return None
+        with self._lock:
+            row = self._conn().execute(
+                "SELECT content, usage, latency_s, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row and (self.mode == "replay" or time.time() - row[3] <= self.ttl):
+                self._conn().execute("UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key))
+            else:
+                row = None
+        if row is None:
+            if self.mode == "replay":
+                raise LLMCacheMiss(f"[{site}] request not in {self.path} (LLM_CACHE_MODE=replay)")
+            return None
+        self._count(site, hit=True, saved_s=row[2])
+        print(f"💾 LLM cache hit [{site}]: saved {row[2]:.1f}s")
+        return {"content": row[0], "usage": json.loads(row[1] or "{}"), "latency_s": row[2]}
+
+    def put(self, key, site, model, content, usage, latency_s):
+        self._count(site, hit=False)
+        if self.mode != "on":
+            return
+        data = json.dumps(usage or {})
+        size = len(content.encode("utf-8")) + len(data)
+        now = time.time()
+        with self._lock:
+            db = self._conn()
+            db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                       (key, site, model, content, data, latency_s, now, now, size))
+            self._enforce_cap(db)
+
+    def _enforce_cap(self, db):
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        db.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,))
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        # Least recently used first, down to 90% of the cap so every insert doesn't trigger this
+        for key, size in db.execute("SELECT key, size FROM responses ORDER BY accessed").fetchall():
+            if total <= self.max_bytes * 0.9:
+                break
+            db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+
+    def delete(self, key):
+        with self._lock:
+            self._conn().execute("DELETE FROM responses WHERE key = ?", (key,))
+
+    def purge_expired(self):
+        with self._lock:
+            return self._conn().execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,)).rowcount
+
+    def clear(self):
+        with self._lock:
+            self._conn().execute("DELETE FROM responses")
+            self._conn().execute("DELETE FROM site_stats")
+
+    def site_stats(self):
+        """Cumulative {site: (hits, misses, saved_s)} across every process that used the file."""
+        with self._lock:
+            rows = self._conn().execute("SELECT site, hits, misses, saved_s FROM site_stats ORDER BY site").fetchall()
+        return {site: (hits, misses, saved) for site, hits, misses, saved in rows}
+
+    def report(self, stats=None):
+        stats = stats if stats is not None else {s: (v["hits"], v["misses"], v["saved_s"]) for s, v in self.stats.items()}
+        for site, (hits, misses, saved) in sorted(stats.items()):
+            calls = hits + misses
+            print(f"💾 LLM cache [{site}]: {hits}/{calls} hits ({hits / calls * 100 if calls else 0:.0f}%), {saved:.1f}s saved")
+
+
+class CachedChatModel:
+    """Wraps a LangChain chat model: invoke/ainvoke/stream go through the cache; anything else
+    (model_name, bind_tools, ...) is the wrapped model's. site names the call site in stats;
+    fresh=True skips the lookup (a new answer is wanted) but still records the response."""
+
+    def __init__(self, llm, site, cache=None):
+        self.llm = llm
+        self.site = site
+        self._cache = cache
+
+    @property
+    def cache(self):
+        return self._cache or get_llm_cache()
+
+    def __getattr__(self, name):
+        return getattr(self.llm, name)
+
+    def _key(self, messages, kwargs):
+        params = dict(kwargs)
+        temperature = params.pop("temperature", getattr(self.llm, "temperature", None))
+        max_tokens = params.pop("max_tokens", getattr(self.llm, "max_tokens", None))
+        return request_key(model_id(self.llm), messages, temperature, max_tokens, **params)
+
+    def _lookup(self, key, site, fresh):
+        if fresh and self.cache.mode != "replay":
+            return None
+        return self.cache.get(key, site)
+
+    @staticmethod
+    def _message(hit, chunk=False):
+        from langchain_core.messages import AIMessage, AIMessageChunk
+        cls = AIMessageChunk if chunk else AIMessage
+        # No usage_metadata: a hit spends no tokens
+        return cls(content=hit["content"], response_metadata={"cache": "hit", "saved_s": hit["latency_s"]})
+
+    def _store(self, key, site, content, response, latency):
+        usage = getattr(response, "usage_metadata", None) or {}
+        self.cache.put(key, site, model_id(self.llm), content, dict(usage), latency)
+
+    def forget(self, messages, **kwargs):
+        """Drops a recorded response (e.g. one that turned out unusable) so the next call asks again."""
+        self.cache.delete(self._key(messages, kwargs))
+
+    def invoke(self, messages, site=None, fresh=False, **kwargs):
+        site = site or self.site
+        key = self._key(messages, kwargs)
+        hit = self._lookup(key, site, fresh)
+        if hit is not None:
+            return self._message(hit)
+        start = time.perf_counter()
+        response = self.llm.invoke(messages, **kwargs)
+        self._store(key, site, response.content, response, time.perf_counter() - start)
+        return response
+
+    async def ainvoke(self, messages, site=None, fresh=False, **kwargs):
+        site = site or self.site
+        key = self._key(messages, kwargs)
+        hit = self._lookup(key, site, fresh)
+        if hit is not None:
+            return self._message(hit)
+        start = time.perf_counter()
+        response = await self.llm.ainvoke(messages, **kwargs)
+        self._store(key, site, response.content, response, time.perf_counter() - start)
+        return response
+
+    def stream(self, messages, site=None, fresh=False, **kwargs):
+        site = site or self.site
+        key = self._key(messages, kwargs)
+        hit = self._lookup(key, site, fresh)
+        if hit is not None:
+            yield self._message(hit, chunk=True)
+            return
+        start = time.perf_counter()
+        parts, last = [], None
+        for chunk in self.llm.stream(messages, **kwargs):
+            parts.append(chunk.content)
+            if getattr(chunk, "usage_metadata", None):
+                last = chunk
+            yield chunk
+        self._store(key, site, "".join(parts), last, time.perf_counter() - start)
+
+
+def langchain_cache(site, cache=None):
+    """The same store as a LangChain BaseCache, for models driven by agents (scoutman's react
+    agent calls the model itself): pass it as the model's cache= argument."""
+    from langchain_core.caches import BaseCache
+    from langchain_core.load import dumps, loads
+
+    class _SiteCache(BaseCache):
+        def lookup(self, prompt, llm_string):
+            store = cache or get_llm_cache()
+            hit = store.get(request_key(llm_string, prompt), site)
+            return loads(hit["content"]) if hit else None
+
+        def update(self, prompt, llm_string, return_val):
+            store = cache or get_llm_cache()
+            # LangChain doesn't time the call for us; agent steps are recorded without latency
+            store.put(request_key(llm_string, prompt), site, llm_string[:200], dumps(return_val), {}, 0.0)
+
+        def clear(self, **kwargs):
+            (cache or get_llm_cache()).clear()
+
+    return _SiteCache()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMCache()
+        return _cache
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--stats", action="store_true", help="Cumulative hit rate and time saved per call site")
+    parser.add_argument("--purge-expired", action="store_true")
+    parser.add_argument("--clear", action="store_true")
+    args = parser.parse_args()
+
+    store = get_llm_cache()
+    if args.clear:
+        store.clear()
+        print(f"🧹 Cleared {store.path}")
+    if args.purge_expired:
+        print(f"🧹 Removed {store.purge_expired()} expired responses")
+    if args.stats or not (args.clear or args.purge_expired):
+        store.report(store.site_stats())
@@ -1,12 +1,18 @@
 import os
+import io
+import re
+import csv
 from typing import TypedDict, List
-from langgraph.graph import StateGraph, START, END
-from langchain_groq import ChatGroq
 from langchain_core.messages import HumanMessage, SystemMessage
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.vectorstores import FAISS
-from langchain_community.tools import DuckDuckGoSearchResults
 from dotenv import load_dotenv
+from rag_service import get_rag_service
+from search_service import get_search_service, FALLBACK
+from vram_manager import get_manager
+from topic_memory import get_topic_memory
+from plan_critic import critique_rows
+from llm_cache import CachedChatModel
+import lazy_resources
+import tracing
 
 # --- 1. STATE DEFINITION ---
 class MarketingState(TypedDict):
@@ -17,37 +23,184 @@ class MarketingState(TypedDict):
     user_approval: bool
     user_feedback: str  
     errors: List[str]
+    topic_flags: List[str]
+    notices: List[str]
 
 load_dotenv()
 
 # --- 2. CONFIG & TOOLS ---
 GROQ_KEY = os.getenv("GROQ_API_KEY")
-# Using llama-3.3-70b is excellent for this task; it handles CSV structures well
-llm = ChatGroq(model="llama-3.3-70b-versatile", groq_api_key=GROQ_KEY)
-embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+
+# Heavy clients are built on first use (lazy_resources), so importing this module is cheap
+@lazy_resources.register("groq_llm")
+def build_llm():
+    from langchain_groq import ChatGroq
+    # Using llama-3.3-70b is excellent for this task; it handles CSV structures well
+    # Shared response cache (llm_cache.py); the site name is overridden per call below
+    return CachedChatModel(ChatGroq(model="llama-3.3-70b-versatile", groq_api_key=GROQ_KEY), "orchestrator")
+
+@lazy_resources.register("minilm")
+def build_embeddings():
+    from langchain_huggingface import HuggingFaceEmbeddings
+    embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+    # Small and needed by every RAG query: counted against the budget but never evicted
+    get_manager().register("minilm", embeddings, pinned=True)
+    return embeddings
+
+llm = lazy_resources.Lazy("groq_llm")
+embeddings = lazy_resources.Lazy("minilm")
+
+def get_embeddings():
+    return lazy_resources.get("minilm")
 
 def get_rag_context(query: str):
     """Fetches specialized context from your 27-competitor index"""
     try:
-        db = FAISS.load_local("/nuvodata/User_data/shiva/Market_carousal/faiss_index", 
-                             embeddings, allow_dangerous_deserialization=True)
-        docs = db.similarity_search(query, k=3)
-        return "\n".join([d.page_content for d in docs])
+        # Loaded once per process; reloads only when faiss_index changes on disk
+        return get_rag_service(get_embeddings()).context(query, k=3)
     except Exception as e:
         print(f"⚠️ RAG Load Error: {e}")
         return "Nueralogic: Expert AI Agency focusing on Logistics and Healthcare workflows."
 
 def web_scout(topic: str):
-    """Gathers real-time market trends"""
+    """Gathers real-time market trends (cached on disk for SEARCH_TTL_S)"""
     print(f"🌐 [Scout] Searching for {topic}...")
     try:
-        search = DuckDuckGoSearchResults()
-        return search.run(f"{topic} AI trends 2026")
+        return get_search_service().search(f"{topic} AI trends 2026")
     except Exception as e:
         print(f"⚠️ Search Timeout: {e}")
-        return "Network restricted. Rely on Knowledge Base."
+        return FALLBACK
+
+def web_scout_many(topics):
+    """Several scout topics at once: cache misses are searched concurrently under one deadline."""
+    print(f"🌐 [Scout] Searching {len(topics)} topics in parallel...")
+    queries = {topic: f"{topic} AI trends 2026" for topic in topics}
+    results = get_search_service().search_many(list(queries.values()))
+    return "\n\n".join(f"### {topic}\n{results[query]}" for topic, query in queries.items())
+
+TOPIC_RETRIES = int(os.getenv("TOPIC_RETRIES", "1"))
+
+# --- PLAN CSV HELPERS ---
+def plan_rows(csv_text):
+    """(header, rows) of the strategist's CSV; blank lines dropped."""
+    rows = parse_csv_rows(csv_text)
+    if not rows:
+        return [], []
+    return rows[0], rows[1:]
+
+def parse_csv_rows(text):
+    return [r for r in csv.reader(io.StringIO(text), skipinitialspace=True) if any(c.strip() for c in r)]
+
+def rows_to_csv(header, rows):
+    out = io.StringIO()
+    csv.writer(out, quoting=csv.QUOTE_ALL, lineterminator="\n").writerows([header] + rows)
+    return out.getvalue().strip()
+
+def csv_line(row):
+    return rows_to_csv(row, [])
+
+def topic_column(header):
+    names = [h.strip().lower() for h in header]
+    for target in ("topic", "topic / subject", "subject", "title"):
+        if target in names:
+            return names.index(target)
+    return 2 if len(header) > 2 else 0
+
+def rewrite_rows(header, rows, notes, instruction, span_name, system_msg=None):
+    """Asks the LLM for replacements of only rows[i] for i in notes ({row index: note}).
+    Returns {row index: new row}; rows come back matched by Day."""
+    col = topic_column(header)
+    targets = "\n".join(csv_line(rows[i]) + (f"   <- {note}" if note else "") for i, note in notes.items())
+    keep = ", ".join(r[col] for i, r in enumerate(rows) if i not in notes and len(r) > col)
+    prompt = (
+        f"{instruction} Keep the same Day and the same columns.\n"
+        f"Columns: {csv_line(header)}\n\nRows to rewrite:\n{targets}\n\n"
+        f"Other topics this week (unchanged, do not repeat them): {keep}\n"
+        f"Return ONLY the rewritten rows as CSV, one per line, all fields double-quoted, no header."
+    )
+    messages = ([SystemMessage(content=system_msg)] if system_msg else []) + [HumanMessage(content=prompt)]
+    with tracing.span(span_name, model=llm.model_name, rows=len(notes)) as sp:
+        response = llm.invoke(messages, site=span_name.replace("llm.", ""))
+        sp.update(tracing.llm_usage(response))
+
+    content = response.content.replace('```csv', '').replace('```', '').strip()
+    new_rows = parse_csv_rows(content)
+    by_day = {r[0].strip().lower(): r for r in new_rows if len(r) == len(header)}
+    replacements = {}
+    for n, i in enumerate(notes):
+        row = by_day.get(rows[i][0].strip().lower())
+        if row is None and n < len(new_rows) and len(new_rows[n]) == len(header):
+            row = new_rows[n]
+        if row is not None:
+            replacements[i] = row
+    return replacements
+
+def regenerate_rows(header, rows, hits):
+    """Replacements for rows whose topic repeats a past post."""
+    notes = {i: f'repeats past topic: "{match}"' for i, _, match, _ in hits}
+    instruction = ("These rows of a content calendar repeat topics we already published. Rewrite them "
+                   "with a genuinely different subject, keeping the same Framework.")
+    return rewrite_rows(header, rows, notes, instruction, "llm.topic_regen")
+
+WEEKDAYS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+WHOLE_PLAN = re.compile(r"\b(all|every|entire|whole|from scratch)\b", re.IGNORECASE)
+
+def targeted_rows(feedback, rows):
+    """Indexes of the rows a feedback message names by Day ("change Wednesday's topic"), or []
+    when it names none or asks for the whole week."""
+    if not feedback or WHOLE_PLAN.search(feedback):
+        return []
+    text = feedback.lower()
+    hits = []
+    for i, row in enumerate(rows):
+        day = row[0].strip().lower() if row else ""
+        names = [day] + ([day[:3]] if day in WEEKDAYS else [])
+        if day and any(re.search(rf"\b{re.escape(name)}\b", text) for name in names):
+            hits.append(i)
+    return hits
+
+def critique_plan(csv_text):
+    """Local anti-fluff critic + shape repair (was a second full-plan LLM call)."""
+    header, rows = plan_rows(csv_text)
+    if not rows:
+        return csv_text
+    with tracing.span("plan.critic", rows=len(rows)) as sp:
+        rows, fixes = critique_rows(header, rows)
+        sp["fixes"] = len(fixes)
+    for fix in fixes:
+        print(f"🧹 Critic: {fix}")
+    return rows_to_csv(header, rows)
+
+def screen_repeats(csv_text, previous=""):
+    """Flags plan rows whose topic is a near-duplicate of anything in topic_history.log and
+    regenerates just those rows. Rows whose Day and topic are unchanged from `previous` are not
+    screened: once generated, their own topic is in the history and would match itself.
+    Returns (csv, flags for repeats that survived the retries)."""
+    header, rows = plan_rows(csv_text)
+    if not rows:
+        return csv_text, []
+    memory = get_topic_memory()
+    col = topic_column(header)
+    old_header, old_rows = plan_rows(previous) if previous else ([], [])
+    old_col = topic_column(old_header) if old_header else col
+    kept = {(r[0].strip().lower(), r[old_col].strip().lower()) for r in old_rows if len(r) > old_col}
+    for attempt in range(TOPIC_RETRIES + 1):
+        topics = [r[col] if len(r) > col and (r[0].strip().lower(), r[col].strip().lower()) not in kept else ""
+                  for r in rows]
+        hits = [h for h in memory.check(topics) if h[1].strip()]
+        if not hits or attempt == TOPIC_RETRIES:
+            break
+        print(f"♻️ {len(hits)} topic(s) repeat past posts, regenerating only those rows...")
+        for i, row in regenerate_rows(header, rows, hits).items():
+            rows[i] = row
+    flags = [f"{rows[i][0]}: '{topic}' ≈ '{match}' ({score:.0%})" for i, topic, match, score in hits]
+    return rows_to_csv(header, rows), flags
 
 # --- 3. NODES ---
+TRENDS_TOPIC = "Logistics and Healthcare AI Agentic Workflows"
+COMPETITOR_TOPIC = "Nueralogic vs AI Competitors 2026"
+# Opt-in: also scout the competitor landscape for every new plan (two searches instead of one)
+SCOUT_COMPETITORS = os.getenv("SCOUT_COMPETITORS", "0") == "1"
 
 def scout_node(state: MarketingState):
     print("📍 Node: Scout starting...")
@@ -56,16 +209,17 @@ def scout_node(state: MarketingState):
     # Check if user specifically asked for competitor intel
     if "competitor" in feedback or "compare" in feedback:
         print("🕵️‍♂️ Force-Scouting Competitors based on feedback...")
-        intel = web_scout("Nueralogic vs AI Competitors 2026")
+        intel = web_scout_many([COMPETITOR_TOPIC, state["user_feedback"].strip()])
         return {"scout_report": intel}
 
     # If refining other things (dates, topics), bypass search to speed up
     if feedback:
         return {"scout_report": state.get("scout_report", "Refining previous plan.")}
     
-    # Default initial search
-    intel = web_scout("Logistics and Healthcare AI Agentic Workflows")
-    return {"scout_report": intel}
+    # Default initial search (plus the competitor landscape when SCOUT_COMPETITORS=1)
+    if SCOUT_COMPETITORS:
+        return {"scout_report": web_scout_many([TRENDS_TOPIC, COMPETITOR_TOPIC])}
+    return {"scout_report": web_scout(TRENDS_TOPIC)}
 
 def strategist_node(state: MarketingState):
     print("📍 Node: Strategist starting...")
@@ -84,49 +238,76 @@ def strategist_node(state: MarketingState):
     system_msg = system_msg.replace("{scout_report}", state.get("scout_report", ""))
     system_msg = system_msg.replace("{past_topics}", ", ".join(state.get("past_topics", [])))
 
-    # Handle Feedback Logic
+    # Feedback that names specific days: rewrite only those rows of the current plan (one small call)
     feedback = state.get("user_feedback", "")
-    user_instruction = "Generate the 5-day professional plan in CSV format."
-    if feedback:
-        user_instruction = f"REVISE the previous plan based on this feedback: {feedback}. Prioritize these changes while keeping the CSV structure identical."
+    previous = state.get("proposed_calendar", "")
+    header, rows = plan_rows(previous) if feedback and previous else ([], [])
+    targets = targeted_rows(feedback, rows)
+    notices = []
+    if targets:
+        print(f"✏️ Refining {len(targets)} row(s) of the current plan...")
+        instruction = f"Revise these rows of our content calendar based on this feedback: {feedback}."
+        replacements = rewrite_rows(header, rows, dict.fromkeys(targets, ""), instruction, "llm.strategist_rows", system_msg)
+        for i, row in replacements.items():
+            rows[i] = row
+        missed = [rows[i][0] for i in targets if i not in replacements]
+        if missed:
+            # The reply had no usable row for these days: say so instead of showing the old rows as "updated"
+            print(f"⚠️ Refine reply unusable for {missed}, keeping those rows")
+            notices.append(f"Your edit was not applied to {', '.join(missed)} (the model's reply could not be "
+                           f"parsed); those rows are unchanged. Try sending the change again.")
+        clean_csv = rows_to_csv(header, rows)
+    else:
+        user_instruction = "Generate the 5-day professional plan in CSV format."
+        if feedback:
+            user_instruction = f"REVISE the previous plan based on this feedback: {feedback}. Prioritize these changes while keeping the CSV structure identical."
+            if previous:
+                user_instruction += f"\n\nPrevious plan:\n{previous}"
 
-    # Phase 1: Generation
-    response = llm.invoke([
-        SystemMessage(content=system_msg), 
-        HumanMessage(content=user_instruction)
-    ])
-    
-    # Phase 2: Critique (The 'Rubbish' Filter)
-    # We explicitly tell it to preserve headers so the CSV parser doesn't break
-    critic_prompt = (
-        f"Review this plan. Remove any 'fluff' words like unleash/revolutionary. "
-        f"Return ONLY the updated CSV data starting with 'Day,'. \n\nPlan:\n{response.content}"
-    )
-    final_response = llm.invoke([HumanMessage(content=critic_prompt)])
-    
-    # Cleaning Logic
-    content = final_response.content.strip()
-    # This is the "Magic Clip": it cuts off any conversational chatter before the actual CSV
-    if "Day," in content:
-        content = content[content.find("Day,"):]
-    
-    clean_csv = content.replace('```csv', '').replace('```', '').strip()
+        # fresh: asking for a plan means wanting a new one; the response is still recorded for replay
+        with tracing.span("llm.strategist", model=llm.model_name) as sp:
+            response = llm.invoke([
+                SystemMessage(content=system_msg), 
+                HumanMessage(content=user_instruction)
+            ], site="strategist", fresh=True)
+            sp.update(tracing.llm_usage(response))
+
+        # Cleaning Logic
+        content = response.content.strip()
+        # This is the "Magic Clip": it cuts off any conversational chatter before the actual CSV
+        if "Day," in content:
+            content = content[content.find("Day,"):]
+        clean_csv = content.replace('```csv', '').replace('```', '').strip()
+
+    # The 'Rubbish' Filter: local rewrite of the prompt's forbidden words, no second LLM call
+    clean_csv = critique_plan(clean_csv)
+
+    # Repetition check against the whole topic history, not just the prompt's last 15 lines
+    clean_csv, topic_flags = screen_repeats(clean_csv, previous if feedback else "")
     
     print("✅ Strategy Finalized.")
     # Return the keys we want to update in the state
     return {
         "proposed_calendar": clean_csv, 
-        "kb_context": kb_facts
+        "kb_context": kb_facts,
+        "topic_flags": topic_flags,
+        "notices": notices
     }
 
 # --- 4. GRAPH CONSTRUCTION ---
-workflow = StateGraph(MarketingState)
+@lazy_resources.register("marketing_graph")
+def build_graph():
+    from langgraph.graph import StateGraph, START, END
+
+    workflow = StateGraph(MarketingState)
+
+    workflow.add_node("scout", scout_node)
+    workflow.add_node("strategist", strategist_node)
 
-workflow.add_node("scout", scout_node)
-workflow.add_node("strategist", strategist_node)
+    workflow.add_edge(START, "scout")
+    workflow.add_edge("scout", "strategist")
+    workflow.add_edge("strategist", END)
 
-workflow.add_edge(START, "scout")
-workflow.add_edge("scout", "strategist")
-workflow.add_edge("strategist", END)
+    return workflow.compile()
 
-orchestrator = workflow.compile()
\ No newline at end of file
+orchestrator = lazy_resources.Lazy("marketing_graph")
\ No newline at end of file
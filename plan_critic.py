@@ -0,0 +1,105 @@
+# Location: /nuvodata/User_data/shiva/Market_carousal/plan_critic.py
+# Local replacement for the strategist's second "Rubbish Filter" LLM call: rewrites the forbidden
+# fluff words from pro_strategist_v1.txt and repairs the calendar's shape (column count, empty
+# cells, framework names) deterministically, in microseconds.
+import os
+import re
+import functools
+
+BASE_PATH = "/nuvodata/User_data/shiva/Market_carousal"
+PROMPT_PATH = os.path.join(BASE_PATH, "prompts", "pro_strategist_v1.txt")
+PLACEHOLDER = "Nueralogic: Local-First AI"  # the prompt's filler for unused slides
+FRAMEWORKS = ("PAS", "AIDA", "BAB")
+DEFAULT_FORBIDDEN = ("Revolutionary", "Unleash", "Unlock", "Game-changer", "Seamless", "Empower")
+
+# Plain replacements per inflection; forms not listed here are dropped from the sentence
+REWRITES = {
+    "revolutionary": "new",
+    "unleash": "use", "unleashes": "uses", "unleashed": "used", "unleashing": "using",
+    "unlock": "enable", "unlocks": "enables", "unlocked": "enabled", "unlocking": "enabling",
+    "game-changer": "step change", "game-changers": "step changes", "game-changing": "significant",
+    "seamless": "integrated", "seamlessly": "directly",
+    "empower": "enable", "empowers": "enables", "empowered": "enabled", "empowering": "enabling",
+    "empowerment": "capability",
+}
+SUFFIXES = r"(?:s|es|d|ed|ing|ment|ly|ers?)?"
+
+
+@functools.lru_cache(maxsize=None)
+def forbidden_words(prompt_path=PROMPT_PATH):
+    """The 'Forbidden words:' list of the strategist prompt, so prompt and critic never drift."""
+    try:
+        with open(prompt_path, "r", encoding="utf-8") as f:
+            line = next((l for l in f if "forbidden words" in l.lower()), "")
+    except OSError:
+        line = ""
+    words = [w.strip(" ,.") for w in re.findall(r'"([^"]+)"', line)]
+    return tuple(w for w in words if w) or DEFAULT_FORBIDDEN
+
+
+@functools.lru_cache(maxsize=None)
+def fluff_pattern(words):
+    stems = sorted({re.escape(w.lower()) for w in words}, key=len, reverse=True)
+    # "game-changer" also covers "game-changing"
+    stems = [s.replace("changer", "chang(?:er|ing)") for s in stems]
+    return re.compile(r"\b(?:" + "|".join(stems) + r")" + SUFFIXES + r"\b", re.IGNORECASE)
+
+
+def _rewrite(match):
+    word = match.group(0)
+    new = REWRITES.get(word.lower(), "")
+    if new and word[0].isupper():
+        new = new[0].upper() + new[1:]
+    return new
+
+
+def clean_text(text, words=None):
+    """(text without fluff words, [words removed])."""
+    pattern = fluff_pattern(tuple(words or forbidden_words()))
+    found = pattern.findall(text)
+    if not found:
+        return text, []
+    capitalized = text[:1].isupper()
+    text = pattern.sub(_rewrite, text)
+    text = re.sub(r"\s{2,}", " ", text)
+    text = re.sub(r"\s+([,.;:!?])", r"\1", text).strip()
+    if capitalized and text[:1].islower():
+        text = text[0].upper() + text[1:]  # the dropped word started the sentence
+    return text, found
+
+
+def critique_rows(header, rows):
+    """Fixes the plan in place of an LLM critic. Returns (rows, [human-readable fixes])."""
+    fixes = []
+    names = [h.strip().lower() for h in header]
+    framework_col = names.index("framework") if "framework" in names else None
+    width = len(header)
+    cleaned = []
+    for row in rows:
+        day = row[0].strip() if row else "?"
+        row = [" ".join(cell.split()) for cell in row]
+        if len(row) > width:
+            # Usually an unquoted comma split the last field
+            row = row[:width - 1] + [", ".join(c for c in row[width - 1:] if c)]
+            fixes.append(f"{day}: merged extra columns")
+        elif len(row) < width:
+            fixes.append(f"{day}: padded {width - len(row)} missing column(s)")
+            row = row + [""] * (width - len(row))
+
+        for col, cell in enumerate(row):
+            cell, found = clean_text(cell)
+            if found:
+                fixes.append(f"{day}/{header[col]}: removed {', '.join(found)}")
+            if not cell:
+                cell = PLACEHOLDER
+                fixes.append(f"{day}/{header[col]}: empty, used placeholder")
+            row[col] = cell
+
+        if framework_col is not None:
+            framework = row[framework_col].upper()
+            if framework in FRAMEWORKS and row[framework_col] != framework:
+                row[framework_col] = framework
+            elif framework not in FRAMEWORKS:
+                fixes.append(f"{day}: unknown framework '{row[framework_col]}'")
+        cleaned.append(row)
+    return cleaned, fixes
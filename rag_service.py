@@ -0,0 +1,133 @@
+# Location: /nuvodata/User_data/shiva/Market_carousal/rag_service.py
+# Process-wide FAISS knowledge base: loaded once (memory-mapped when FAISS allows it),
+# reloaded only when the files in faiss_index change, with a TTL/LRU query cache.
+import os
+import time
+import pickle
+import threading
+from collections import OrderedDict
+
+import tracing
+
+BASE_PATH = "/nuvodata/User_data/shiva/Market_carousal"
+FAISS_PATH = os.path.join(BASE_PATH, "faiss_index")
+
+
+class RagService:
+    def __init__(self, index_dir, embeddings, ttl=600, max_entries=256):
+        self.index_dir = index_dir
+        self.embeddings = embeddings
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.db = None
+        self._signature = None
+        self._cache = OrderedDict()  # (query, k) -> (timestamp, docs)
+        self._lock = threading.Lock()
+        self.stats = {
+            "loads": 0, "load_s": 0.0, "mmap": False,
+            "queries": 0, "cache_hits": 0, "cold_query_s": 0.0, "warm_query_s": 0.0,
+        }
+
+    # --- index lifecycle ---
+    def signature(self):
+        """Index version (faiss_index is a symlink index_builder swaps) and (name, mtime, size) of
+        every file in it; a change triggers a reload."""
+        folder = os.path.realpath(self.index_dir)
+        entries = [folder]
+        for name in sorted(os.listdir(folder)):
+            st = os.stat(os.path.join(folder, name))
+            entries.append((name, st.st_mtime_ns, st.st_size))
+        return tuple(entries)
+
+    def _load(self):
+        with tracing.span("rag.load", index_dir=self.index_dir) as sp:
+            db = self._read_index()
+            sp["mmap"] = self.stats["mmap"]
+        return db
+
+    def _read_index(self):
+        from langchain_community.vectorstores import FAISS
+
+        start = time.perf_counter()
+        folder = os.path.realpath(self.index_dir)  # resolve once: both files from the same version
+        try:
+            # Memory-map the vectors instead of copying them onto the heap
+            import faiss
+            index = faiss.read_index(
+                os.path.join(folder, "index.faiss"),
+                faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+            )
+            with open(os.path.join(folder, "index.pkl"), "rb") as f:
+                docstore, index_to_docstore_id = pickle.load(f)
+            db = FAISS(self.embeddings, index, docstore, index_to_docstore_id)
+            mmap = True
+        except Exception as e:
+            print(f"⚠️ RAG mmap load unavailable ({e}), falling back to FAISS.load_local")
+            db = FAISS.load_local(folder, self.embeddings, allow_dangerous_deserialization=True)
+            mmap = False
+
+        elapsed = time.perf_counter() - start
+        self.stats.update(loads=self.stats["loads"] + 1, load_s=elapsed, mmap=mmap)
+        print(f"📚 RAG index loaded in {elapsed * 1000:.1f} ms ({'mmap' if mmap else 'heap'})")
+        return db
+
+    def ensure_loaded(self):
+        signature = self.signature()
+        with self._lock:
+            if self.db is None or signature != self._signature:
+                if self.db is not None:
+                    print("🔄 faiss_index changed on disk, reloading...")
+                self.db = self._load()
+                self._signature = signature
+                self._cache.clear()
+            return self.db
+
+    # --- queries ---
+    def search(self, query, k=3):
+        db = self.ensure_loaded()
+        key = (query, k)
+        now = time.time()
+        start = time.perf_counter()
+
+        with self._lock:
+            self.stats["queries"] += 1
+            hit = self._cache.get(key)
+            if hit and now - hit[0] < self.ttl:
+                self._cache.move_to_end(key)
+                self.stats["cache_hits"] += 1
+                self.stats["warm_query_s"] = time.perf_counter() - start
+                return hit[1]
+
+        with tracing.span("rag.query", k=k):
+            docs = db.similarity_search(query, k=k)
+
+        with self._lock:
+            self._cache[key] = (now, docs)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+            self.stats["cold_query_s"] = time.perf_counter() - start
+        return docs
+
+    def context(self, query, k=3):
+        return "\n".join([d.page_content for d in self.search(query, k=k)])
+
+    def report(self):
+        s = self.stats
+        print(
+            f"📚 RAG: {s['loads']} load(s), last {s['load_s'] * 1000:.1f} ms ({'mmap' if s['mmap'] else 'heap'}); "
+            f"{s['cache_hits']}/{s['queries']} cached queries; "
+            f"cold {s['cold_query_s'] * 1000:.2f} ms, warm {s['warm_query_s'] * 1000:.3f} ms"
+        )
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_rag_service(embeddings, index_dir=FAISS_PATH):
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = RagService(index_dir, embeddings)
+        return _service
@@ -1,17 +1,15 @@
-import sys
 import os
-import subprocess
 import time
-import pandas as pd
-import shutil
+
+from factory_worker import FactoryWorker, day_folder
+from stage_scheduler import StagedPipeline
+from image_creator import BACKENDS
+from build_manifest import BuildManifest
+import tracing
+from llm_cache import get_llm_cache
 
 # --- CONFIGURATION ---
 BASE_PATH = "/nuvodata/User_data/shiva/Market_carousal"
-SCRIPTS = {
-    "agent": f"{BASE_PATH}/content_for_slides.py",
-    "flux": f"{BASE_PATH}/image_creator.py",
-    "render": f"{BASE_PATH}/slides_creator.py"
-}
 
 # Directories
 FLUX_ASSETS = os.path.join(BASE_PATH, "flux_assets")
@@ -22,28 +20,12 @@ for folder in [FLUX_ASSETS, OUTPUT_DIR]:
     if not os.path.exists(folder):
         os.makedirs(folder, exist_ok=True)
 
-def run_step(name, script_path, args=None):
-    print(f"\n{'='*30}")
-    print(f"▶️  STARTING STEP: {name.upper()}")
-    print(f"{'='*30}")
-    
-    start_time = time.time()
-    cmd = [sys.executable, script_path]
-    if args:
-        cmd.extend(args)
-    
-    # Run the command and capture output for the bot logs
-    result = subprocess.run(cmd, capture_output=False)
-    
-    if result.returncode == 0:
-        elapsed = time.time() - start_time
-        print(f"✅ {name.upper()} COMPLETED in {elapsed:.2f}s")
-        return True
-    else:
-        print(f"❌ {name.upper()} FAILED with exit code {result.returncode}. Aborting batch.")
-        return False
+def main(day_filter=None, worker=None, backend="flux", render_workers=1, force=False):
+    """Submits every (or one) day of the plan to a single resident factory worker.
 
-def main(day_filter=None):
+    Artifacts already built from unchanged inputs are skipped (see build_manifest);
+    force=True forgets the targeted days' manifests and rebuilds everything.
+    """
     print("🚀 NUERALOGIC BATCH PIPELINE INITIALIZED")
     
     csv_file = os.path.join(BASE_PATH, "marketing_plan.csv")
@@ -51,6 +33,7 @@ def main(day_filter=None):
         print(f"❌ CSV not found at {csv_file}! Run the planner first.")
         return
 
+    import pandas as pd
     try:
         df = pd.read_csv(csv_file)
         df.columns = [c.strip() for c in df.columns]
@@ -72,46 +55,51 @@ def main(day_filter=None):
             print(f"❌ Day '{day_filter}' not found in marketing_plan.csv!")
             return
 
-    for day_name in days:
-        print(f"\n🌟 --- PROCESSING BATCH FOR: {day_name} ---")
-        
-        # 1. SETUP DAY DIRECTORY
-        clean_name = str(day_name).replace(" ", "_").strip()
-        day_out_dir = os.path.join(OUTPUT_DIR, clean_name)
-        
-        os.makedirs(day_out_dir, exist_ok=True)
-        print(f"📂 Output Directory: {day_out_dir}")
+    # One worker for the whole batch: FLUX + LoRA are loaded once, not once per day
+    owns_worker = worker is None
+    if owns_worker:
+        worker = FactoryWorker(backend=backend, output_dir=OUTPUT_DIR, render_workers=render_workers).start()
+
+    batch_start = time.time()
+    try:
+        # LLM, GPU and render stages of different days overlap; the GPU lane stays one job at a time
+        jobs = [(str(day_name).strip(), day_folder(day_name, OUTPUT_DIR)) for day_name in days]
+        if force:
+            print("🔁 Force mode: rebuilding every artifact")
+            for _, outdir in jobs:
+                BuildManifest.for_dir(outdir).reset()
+        with tracing.span("pipeline.run", days=len(jobs), backend=worker.backend.name):
+            results = StagedPipeline(worker).run(jobs)
 
-        # 2. RUN AGENT
-        if not run_step(f"Agent ({day_name})", SCRIPTS["agent"], args=[f"--day={day_name}", f"--outdir={day_out_dir}"]):
-            continue
-            
-        # 3. RUN FLUX
-        if not run_step(f"Vision ({day_name})", SCRIPTS["flux"], args=[f"--outdir={day_out_dir}"]):
-            continue
-            
-        # 4. RUN RENDER
-        if not run_step(f"Render ({day_name})", SCRIPTS["render"], args=[f"--outdir={day_out_dir}"]):
-            continue
-            
-        # 5. VERIFY PDF
-        pdf_path = os.path.join(day_out_dir, "Nueralogic_Carousel.pdf")
-        if os.path.exists(pdf_path):
-            generated_files.append(pdf_path)
-            print(f"📁 PDF SUCCESSFULLY GENERATED: {pdf_path}")
-        else:
-            print(f"⚠️ Warning: Pipeline finished but PDF missing for {day_name}")
+        for day_name, result in results.items():
+            if isinstance(result, Exception):
+                continue
+            pdf_path = result["pdf"]
+            if pdf_path and os.path.exists(pdf_path):
+                generated_files.append(pdf_path)
+                print(f"📁 PDF SUCCESSFULLY GENERATED: {pdf_path}")
+            else:
+                print(f"⚠️ Warning: Pipeline finished but PDF missing for {day_name}")
+    finally:
+        if owns_worker:
+            worker.stop()
 
     print("\n" + "💎" * 15)
-    print(f"✅ BATCH COMPLETED. Files Generated: {len(generated_files)}")
+    print(f"✅ BATCH COMPLETED in {time.time() - batch_start:.2f}s. Files Generated: {len(generated_files)}")
     for f in generated_files:
         print(f" 📄 {f}")
     print("💎" * 15)
+    get_llm_cache().report()
+    print(f"🔬 Trace: {tracing.trace_path()} (python tracing.py summary)")
 
 if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser()
     parser.add_argument("--day", type=str, help="Run pipeline for a specific day only")
+    parser.add_argument("--backend", type=str, default="flux", choices=list(BACKENDS), help="Image generator (stub = CPU dry run)")
+    parser.add_argument("--workers", "--render-workers", dest="workers", type=int, default=1,
+                        help="Processes used to render each day's slides (same flag as slides_creator.py)")
+    parser.add_argument("--force", action="store_true", help="Ignore build manifests and regenerate everything")
     args = parser.parse_args()
     
-    main(day_filter=args.day)
\ No newline at end of file
+    main(day_filter=args.day, backend=args.backend, render_workers=args.workers, force=args.force)
\ No newline at end of file
@@ -4,7 +4,9 @@ from langchain.chat_models import init_chat_model
 from langgraph.checkpoint.memory import MemorySaver
 from langchain_core.messages import HumanMessage
 from dotenv import load_dotenv
-from langchain_community.tools import DuckDuckGoSearchResults
+from langchain_core.tools import tool
+from search_service import get_search_service
+from llm_cache import langchain_cache
 
 # 1. Setup Environment and Memory
 load_dotenv()
@@ -12,11 +14,18 @@ memory = MemorySaver()
 config = {"configurable": {"thread_id": "scout_001"}}
 
 # 2. Initialize Model (Llama 3.3 via Groq)
-model = init_chat_model("llama-3.3-70b-versatile", model_provider="groq", max_tokens=4000)
+# Agent steps go through the shared LLM response cache (llm_cache.py)
+model = init_chat_model("llama-3.3-70b-versatile", model_provider="groq", max_tokens=4000, cache=langchain_cache("scoutman"))
 
 # 3. Define the Search Tool
-# We use DuckDuckGo to find latest competitor/product news
-web_search_tool = DuckDuckGoSearchResults(output_format="list")
+# We use DuckDuckGo to find latest competitor/product news (through the shared on-disk search cache)
+# Same name and list-of-results output as DuckDuckGoSearchResults(output_format="list")
+@tool("duckduckgo_results_json")
+def web_search_tool(query: str) -> list:
+    """A wrapper around Duck Duck Go Search. Useful for when you need to answer questions about
+    current events. Input should be a search query."""
+    return get_search_service(output_format="list").search(query)
+
 tools = [web_search_tool]
 
 # 4. Create the React Agent (The Scout)
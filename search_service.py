@@ -0,0 +1,185 @@
+# Location: /nuvodata/User_data/shiva/Market_carousal/search_service.py
+# Web search behind a disk cache: results are keyed by the normalized query and reused for
+# SEARCH_TTL_S (a day by default), across bot restarts. Several queries fan out concurrently.
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import tracing
+
+BASE_PATH = "/nuvodata/User_data/shiva/Market_carousal"
+SEARCH_CACHE_DIR = os.path.join(BASE_PATH, "search_cache")
+SEARCH_TTL_S = int(os.getenv("SEARCH_TTL_S", str(24 * 3600)))
+SEARCH_TIMEOUT_S = float(os.getenv("SEARCH_TIMEOUT_S", "10"))
+SEARCH_WORKERS = int(os.getenv("SEARCH_WORKERS", "4"))
+FALLBACK = "Network restricted. Rely on Knowledge Base."
+
+
+def normalize_query(query):
+    """Case, whitespace and trailing punctuation don't change what DuckDuckGo returns."""
+    return re.sub(r"\s+", " ", query).strip().strip("?!.,;:").strip().lower()
+
+
+# =======================
+# PROVIDERS
+# =======================
+class DuckDuckGoProvider:
+    name = "duckduckgo"
+
+    def __init__(self, output_format="string"):
+        self.output_format = output_format  # "string" (scout prompts) or "list" of result dicts (agent tools)
+        self._tool = None
+
+    def __call__(self, query):
+        if self._tool is None:
+            from langchain_community.tools import DuckDuckGoSearchResults
+            self._tool = DuckDuckGoSearchResults(output_format=self.output_format)
+        return self._tool.run(query)
+
+
+class FakeSearchProvider:
+    """Offline stand-in: deterministic text per query, optional latency, counts calls."""
+    name = "fake"
+
+    def __init__(self, delay=0.0, fail=()):
+        self.delay = delay
+        self.fail = {normalize_query(q) for q in fail}
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, query):
+        with self._lock:
+            self.calls.append(query)
+        if self.delay:
+            time.sleep(self.delay)
+        if normalize_query(query) in self.fail:
+            raise ConnectionError(f"fake outage for '{query}'")
+        digest = hashlib.sha256(normalize_query(query).encode("utf-8")).hexdigest()[:8]
+        return f"[snippet: result {digest} for {query}, title: Fake result, link: https://example.com/{digest}]"
+
+
+# =======================
+# CACHE + SERVICE
+# =======================
+class SearchCache:
+    """One JSON file per normalized query: {"query", "ts", "result"}."""
+
+    def __init__(self, root=SEARCH_CACHE_DIR, ttl=SEARCH_TTL_S):
+        self.root = root
+        self.ttl = ttl
+        os.makedirs(root, exist_ok=True)
+
+    def path_for(self, query):
+        key = hashlib.sha256(normalize_query(query).encode("utf-8")).hexdigest()
+        return os.path.join(self.root, f"{key}.json")
+
+    def get(self, query):
+        path = self.path_for(query)
+        try:
+            with open(path, "r") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - entry["ts"] > self.ttl:
+            return None
+        return entry["result"]
+
+    def put(self, query, result):
+        path = self.path_for(query)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"query": normalize_query(query), "ts": time.time(), "result": result}, f)
+        os.replace(tmp, path)
+
+    def purge_expired(self):
+        removed = 0
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if not name.endswith(".json"):
+                continue  # other result shapes keep their own cache in a subfolder
+            try:
+                with open(path, "r") as f:
+                    expired = time.time() - json.load(f)["ts"] > self.ttl
+            except (OSError, ValueError, KeyError):
+                expired = True
+            if expired:
+                os.remove(path)
+                removed += 1
+        return removed
+
+
+class SearchService:
+    def __init__(self, provider=None, cache=None, timeout=SEARCH_TIMEOUT_S, workers=SEARCH_WORKERS):
+        self.provider = provider or DuckDuckGoProvider()
+        self.cache = cache if cache is not None else SearchCache()
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="search")
+        self.stats = {"queries": 0, "cache_hits": 0, "timeouts": 0, "errors": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _fetch(self, query):
+        with tracing.span("scout.search", query=normalize_query(query), provider=self.provider.name):
+            result = self.provider(query)
+        self.cache.put(query, result)
+        return result
+
+    def search(self, query, timeout=None):
+        """Cached result, or a fresh provider call bounded by timeout. Raises on failure."""
+        return self.search_many([query], timeout=timeout, raise_errors=True)[query]
+
+    def search_many(self, queries, timeout=None, raise_errors=False):
+        """{query: result} with every cache miss fetched concurrently. Queries that fail or
+        miss the shared deadline map to FALLBACK (or raise with raise_errors=True)."""
+        timeout = self.timeout if timeout is None else timeout
+        results, pending = {}, {}
+        for query in dict.fromkeys(queries):
+            self._count("queries")
+            cached = self.cache.get(query)
+            if cached is not None:
+                self._count("cache_hits")
+                results[query] = cached
+            else:
+                pending[query] = self._pool.submit(self._fetch, query)
+
+        deadline = time.time() + timeout
+        for query, future in pending.items():
+            try:
+                results[query] = future.result(timeout=max(0.0, deadline - time.time()))
+            except FutureTimeout:
+                self._count("timeouts")
+                print(f"⚠️ Search Timeout after {timeout:.1f}s: {query}")
+                if raise_errors:
+                    raise TimeoutError(f"search for '{query}' timed out after {timeout}s")
+                results[query] = FALLBACK
+            except Exception as e:
+                self._count("errors")
+                print(f"⚠️ Search failed for '{query}': {e}")
+                if raise_errors:
+                    raise
+                results[query] = FALLBACK
+        return results
+
+    def report(self):
+        s = self.stats
+        print(f"🌐 Search: {s['cache_hits']}/{s['queries']} cached, {s['timeouts']} timeouts, {s['errors']} errors")
+
+
+_services = {}
+_service_lock = threading.Lock()
+
+
+def get_search_service(output_format="string"):
+    """Shared service per result shape; each shape has its own cache folder so they never mix."""
+    with _service_lock:
+        if output_format not in _services:
+            root = SEARCH_CACHE_DIR if output_format == "string" else os.path.join(SEARCH_CACHE_DIR, output_format)
+            _services[output_format] = SearchService(DuckDuckGoProvider(output_format), SearchCache(root))
+        return _services[output_format]
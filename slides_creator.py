@@ -1,9 +1,17 @@
 import cairo
 import os
+import sys
 import json
 import re
+import atexit
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from PIL import Image, ImageFilter
 
+from build_manifest import BuildManifest, hash_file, hash_text
+import tracing
+
 # =======================
 # BRAND THEME
 # =======================
@@ -14,6 +22,126 @@ THEME = {
     'overlay': (0, 0, 0, 0.78)
 }
 
+def argb32_bytes(pil_img):
+    """Raw pixels in Cairo FORMAT_ARGB32 layout (one native-endian 32-bit word per pixel). Opaque input, so no premultiply needed."""
+    rgba = pil_img.convert("RGBA")
+    if sys.byteorder == "little":
+        return rgba.tobytes("raw", "BGRa")
+    r, g, b, a = rgba.split()
+    return Image.merge("RGBA", (a, r, g, b)).tobytes()
+
+# =======================
+# TEXT LAYOUT ENGINE
+# =======================
+FONT_FAMILY = "Sans"
+LINE_SPACING = 1.45
+
+# (family, is_bold, size, word) -> x_advance, shared by every slide rendered in this process.
+# Days render on several threads (StagedPipeline), so each thread measures on its own context.
+_advance_cache = {}
+_advance_lock = threading.Lock()
+_measure = threading.local()
+
+def tokenize(text):
+    """Split '<b>'-tagged text into (word, is_bold) tokens."""
+    tokens = []
+    for part in re.split(r'(<b>.*?</b>)', text):
+        if not part:
+            continue
+        if part.startswith('<b>') and part.endswith('</b>'):
+            tokens.extend([(w, True) for w in part[3:-4].split(' ')])
+        else:
+            tokens.extend([(w, False) for w in part.split(' ')])
+    return tokens
+
+def set_font(ctx, is_bold, size):
+    ctx.select_font_face(
+        FONT_FAMILY,
+        cairo.FONT_SLANT_NORMAL,
+        cairo.FONT_WEIGHT_BOLD if is_bold else cairo.FONT_WEIGHT_NORMAL
+    )
+    ctx.set_font_size(size)
+
+def advance(segment, is_bold, size):
+    """x_advance of one segment, measured once per (font, weight, size, word) and cached."""
+    key = (FONT_FAMILY, is_bold, size, segment)
+    width = _advance_cache.get(key)
+    if width is None:
+        ctx = getattr(_measure, "ctx", None)
+        if ctx is None:
+            ctx = _measure.ctx = cairo.Context(cairo.ImageSurface(cairo.FORMAT_ARGB32, 1, 1))
+        set_font(ctx, is_bold, size)
+        measured = ctx.text_extents(segment).x_advance
+        with _advance_lock:
+            width = _advance_cache.setdefault(key, measured)
+    return width
+
+class TextLayout:
+    """Wrapped lines of (segment, is_bold, x_offset) with baselines; built without drawing."""
+
+    def __init__(self, lines, x, y, size):
+        self.lines = lines
+        self.x, self.y, self.size = x, y, size
+        self.line_height = size * LINE_SPACING
+
+    def baseline(self, i):
+        return self.y + i * self.line_height
+
+    @property
+    def bottom(self):
+        """y after the last line (what draw_text_engine returns when nothing is cut)."""
+        return self.baseline(len(self.lines))
+
+    def visible_lines(self, max_baseline):
+        return sum(1 for i in range(len(self.lines)) if self.baseline(i) <= max_baseline)
+
+    def overflows(self, max_baseline):
+        return self.visible_lines(max_baseline) < len(self.lines)
+
+def layout_text(text, x, y, size, max_width_px):
+    """Pixel-width line wrapping; every token is measured once (via the advance cache)."""
+    lines = []
+    current_line = []
+    current_width = 0
+
+    for word, is_bold in tokenize(text):
+        word_text = word + " "
+        word_width = advance(word_text, is_bold, size)
+
+        if current_line and current_width + word_width > max_width_px:
+            lines.append(current_line)
+            current_line, current_width = [], 0
+
+        current_line.append((word_text, is_bold, current_width))
+        current_width += word_width
+
+    if current_line:
+        lines.append(current_line)
+    return TextLayout(lines, x, y, size)
+
+def fit_text(text, x, y, size, max_width_px, max_baseline, min_size):
+    """Largest layout (stepping down from size to min_size) whose lines all fit above max_baseline."""
+    layout = layout_text(text, x, y, size, max_width_px)
+    while layout.overflows(max_baseline) and layout.size > min_size:
+        layout = layout_text(text, x, y, max(min_size, layout.size - 2), max_width_px)
+    if layout.overflows(max_baseline):
+        print(f"⚠️ Text still overflows at {layout.size}px, truncating: {text[:40]}...")
+    return layout
+
+def draw_layout(ctx, layout, color, bold_color, max_baseline):
+    """Draws the lines that fit above max_baseline; returns y after the last drawn line."""
+    current_bold = None
+    for i in range(layout.visible_lines(max_baseline)):
+        baseline = layout.baseline(i)
+        for segment, is_bold, x_offset in layout.lines[i]:
+            if is_bold != current_bold:
+                set_font(ctx, is_bold, layout.size)
+                ctx.set_source_rgb(*(bold_color if is_bold else color))
+                current_bold = is_bold
+            ctx.move_to(layout.x + x_offset, baseline)
+            ctx.show_text(segment)
+    return layout.baseline(layout.visible_lines(max_baseline))
+
 # =======================
 # RENDERER
 # =======================
@@ -22,106 +150,82 @@ class Renderer:
         self.w, self.h = w, h
         self.margin_x = 80
         self.safe_bottom = h - 120
+        self.min_font_size = 24
 
     # --------------------------------------------------
     # PIXEL-SAFE TEXT ENGINE (BOLD + WRAP)
     # --------------------------------------------------
-    def draw_text_engine(self, ctx, text, x, y, size, max_width_px, color, bold_color):
-        ctx.set_font_size(size)
-
-        # ---- 1. Tokenize into (word, is_bold)
-        tokens = []
-        parts = re.split(r'(<b>.*?</b>)', text)
-
-        for part in parts:
-            if not part:
-                continue
-            if part.startswith('<b>') and part.endswith('</b>'):
-                content = part[3:-4]
-                tokens.extend([(w, True) for w in content.split(' ')])
-            else:
-                tokens.extend([(w, False) for w in part.split(' ')])
-
-        # ---- 2. Line wrapping using pixel width
-        lines = []
-        current_line = []
-        current_width = 0
-
-        for word, is_bold in tokens:
-            word_text = word + " "
-            ctx.select_font_face(
-                "Sans",
-                cairo.FONT_SLANT_NORMAL,
-                cairo.FONT_WEIGHT_BOLD if is_bold else cairo.FONT_WEIGHT_NORMAL
-            )
-            word_width = ctx.text_extents(word_text).x_advance
-
-            if current_width + word_width > max_width_px:
-                lines.append(current_line)
-                current_line = [(word_text, is_bold)]
-                current_width = word_width
-            else:
-                current_line.append((word_text, is_bold))
-                current_width += word_width
-
-        if current_line:
-            lines.append(current_line)
+    def draw_text_engine(self, ctx, text, x, y, size, max_width_px, color, bold_color, fit=True):
+        """Lays out (auto-shrinking to stay above safe_bottom when fit=True) and draws. Returns y after the text."""
+        if fit:
+            layout = fit_text(text, x, y, size, max_width_px, self.safe_bottom, self.min_font_size)
+        else:
+            layout = layout_text(text, x, y, size, max_width_px)
+        return draw_layout(ctx, layout, color, bold_color, self.safe_bottom)
 
-        # ---- 3. Render lines
-        curr_y = y
-        for line in lines:
-            if curr_y > self.safe_bottom:
-                break
-
-            curr_x = x
-            for segment, is_bold in line:
-                ctx.select_font_face(
-                    "Sans",
-                    cairo.FONT_SLANT_NORMAL,
-                    cairo.FONT_WEIGHT_BOLD if is_bold else cairo.FONT_WEIGHT_NORMAL
-                )
-                ctx.set_source_rgb(*(bold_color if is_bold else color))
-                ctx.move_to(curr_x, curr_y)
-                ctx.show_text(segment)
-                curr_x += ctx.text_extents(segment).x_advance
+    # --------------------------------------------------
+    # BACKGROUND (IN-MEMORY PIL -> CAIRO)
+    # --------------------------------------------------
+    def background_pixels(self, bg_path):
+        """Blurred, pre-scaled background as stride-aligned ARGB32 bytes (picklable, so pool workers can build it)."""
+        pil_img = Image.open(bg_path).convert("RGB")
+        # light blur only to soften noise
+        pil_img = pil_img.filter(ImageFilter.GaussianBlur(radius=2))
+
+        # Pre-scale once to cover the canvas (anchored top-left, like the old ctx.scale paint)
+        scale = max(self.w / pil_img.width, self.h / pil_img.height)
+        if pil_img.size != (self.w, self.h):
+            size = (max(self.w, round(pil_img.width * scale)), max(self.h, round(pil_img.height * scale)))
+            pil_img = pil_img.resize(size, Image.BILINEAR).crop((0, 0, self.w, self.h))
 
-            curr_y += size * 1.45
+        stride = cairo.ImageSurface.format_stride_for_width(cairo.FORMAT_ARGB32, self.w)
+        data = argb32_bytes(pil_img)
+        if stride != self.w * 4:
+            row = self.w * 4
+            pad = b"\0" * (stride - row)
+            data = b"".join(data[y * row:(y + 1) * row] + pad for y in range(self.h))
+        return data
 
-        return curr_y
+    def surface_from_pixels(self, pixels):
+        stride = cairo.ImageSurface.format_stride_for_width(cairo.FORMAT_ARGB32, self.w)
+        return cairo.ImageSurface.create_for_data(bytearray(pixels), cairo.FORMAT_ARGB32, self.w, self.h, stride)
+
+    def load_background(self, bg_path):
+        """Blurred background as a w x h Cairo surface, built straight from the PIL buffer (no temp PNG)."""
+        return self.surface_from_pixels(self.background_pixels(bg_path))
 
     # --------------------------------------------------
     # CREATE SINGLE SLIDE
     # --------------------------------------------------
     def create_slide(self, data, out_path, bg_path):
-        surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, self.w, self.h)
-        ctx = cairo.Context(surface)
-
+        """Renders one slide straight to PNG (background buffer is the draw target)."""
         # ---- Background (Blurred & Dimmed)
         if os.path.exists(bg_path):
-            # Blur using PIL
-            pil_img = Image.open(bg_path).convert("RGB")
-            # light blur only to soften noise
-            pil_img = pil_img.filter(ImageFilter.GaussianBlur(radius=2)) 
-            
-            # Convert to Cairo-compatible format (BGRA is standard for Cairo ImageSurface)
-            # But easiest way is to save to a temp buffer or file
-            # Let's just overwrite a temp file or use a memory buffer
-            # Actually, let's keep it simple: Save to a temp png
-            temp_bg = out_path + ".temp_bg.png"
-            pil_img.save(temp_bg)
-            
-            img = cairo.ImageSurface.create_from_png(temp_bg)
-            scale = max(self.w / img.get_width(), self.h / img.get_height())
-            ctx.save()
-            ctx.scale(scale, scale)
-            ctx.set_source_surface(img, 0, 0)
+            surface = self.load_background(bg_path)
+        else:
+            surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, self.w, self.h)
+        self.draw_slide(cairo.Context(surface), data)
+        surface.write_to_png(out_path)
+
+    def record_slide(self, data, background=None):
+        """Draws one slide into a vector RecordingSurface that can be replayed onto a PDF page and/or a PNG."""
+        rec = cairo.RecordingSurface(cairo.CONTENT_COLOR_ALPHA, cairo.Rectangle(0, 0, self.w, self.h))
+        ctx = cairo.Context(rec)
+        if background is not None:
+            ctx.set_source_surface(background, 0, 0)
             ctx.paint()
-            ctx.restore()
-            
-            # remove temp file
-            if os.path.exists(temp_bg):
-                os.remove(temp_bg)
+        self.draw_slide(ctx, data)
+        return rec
+
+    def write_png(self, rec, out_path):
+        surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, self.w, self.h)
+        ctx = cairo.Context(surface)
+        ctx.set_source_surface(rec, 0, 0)
+        ctx.paint()
+        surface.write_to_png(out_path)
 
+    def draw_slide(self, ctx, data):
+        """Overlay, branding and text on top of whatever background ctx already holds."""
         # ---- Overlay (Darkened for readability)
         # Signficantly reduced opacity to make images visible
         ctx.set_source_rgba(0, 0, 0, 0.40) 
@@ -173,66 +277,198 @@ class Renderer:
             ctx.move_to(980, 1020)
             ctx.show_text(f"{data['slide_number']:02d}")
 
-        surface.write_to_png(out_path)
-
-# =======================
-# PIPELINE RUNNER
-# =======================
 # =======================
 # PIPELINE RUNNER
 # =======================
-def run_render():
-    import argparse
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--outdir", type=str, help="Output folder")
-    args = parser.parse_args()
+BASE = "/nuvodata/User_data/shiva/Market_carousal"
+PDF_NAME = "Nueralogic_Carousel.pdf"
+# Bump when draw_slide / the layout engine changes so every day re-renders once
+RENDER_VERSION = 1
 
-    BASE = "/nuvodata/User_data/shiva/Market_carousal"
-    
-    if args.outdir:
-        OUT_DIR = args.outdir
-        # Images are also in OUT_DIR
-        FLUX_DIR = args.outdir
-        JSON_FILE = os.path.join(OUT_DIR, "carousal.json")
-    else:
-        OUT_DIR = os.path.join(BASE, "output_slides")
-        FLUX_DIR = os.path.join(BASE, "flux_assets")
-        JSON_FILE = os.path.join(BASE, "carousal.json")
+def slide_png_path(out_dir, slide):
+    return os.path.join(out_dir, f"final_slide_{slide['slide_number']:02d}.png")
 
-    os.makedirs(OUT_DIR, exist_ok=True)
+def slide_pages(out_dir, flux_dir=None, json_file=None):
+    """(slide, background path) pairs in slide order; slides without a background are skipped."""
+    # Images are also in out_dir unless told otherwise
+    flux_dir = flux_dir or out_dir
+    json_file = json_file or os.path.join(out_dir, "carousal.json")
+    os.makedirs(out_dir, exist_ok=True)
 
-    with open(JSON_FILE, "r") as f:
+    with open(json_file, "r") as f:
         slides = json.load(f)
 
-    renderer = Renderer()
-    pngs = []
-    
-    print(f"🎨 Rendering {len(slides)} slides from {FLUX_DIR} to {OUT_DIR}")
-
-    for s in slides:
-        num = s["slide_number"]
-        out = os.path.join(OUT_DIR, f"final_slide_{num:02d}.png")
-        # Ensure filename match with flux output
-        # Flux outputs: slide_1.png (no leading zero) or slide_01.png?
-        # Image creator said: f"slide_{slide_num}.png"
-        bg = os.path.join(FLUX_DIR, f"slide_{num}.png")
-        
+    print(f"🎨 Rendering {len(slides)} slides from {flux_dir} to {out_dir}")
+
+    pages = []
+    for s in sorted(slides, key=lambda s: s["slide_number"]):
+        # Flux outputs slide_1.png (no leading zero), see image_creator.generate_images
+        bg = os.path.join(flux_dir, f"slide_{s['slide_number']}.png")
         if not os.path.exists(bg):
             print(f"⚠️ Warning: BG not found: {bg}")
             continue
-            
-        renderer.create_slide(s, out, bg)
-        pngs.append(out)
-
-    # ---- Export PDF
-    if pngs:
-        images = [Image.open(p).convert("RGB") for p in sorted(pngs)]
-        images[0].save(
-            os.path.join(OUT_DIR, "Nueralogic_Carousel.pdf"),
-            save_all=True,
-            append_images=images[1:]
+        pages.append((s, bg))
+    return pages
+
+def _slide_pixels(task):
+    """Process-pool task: one slide's background pixels, plus its final PNG when png_out is set."""
+    renderer, data, bg, png_out = task
+    with tracing.span("render.slide", slide=data["slide_number"], png=bool(png_out), pool=True):
+        pixels = renderer.background_pixels(bg)
+        if png_out:
+            renderer.write_png(renderer.record_slide(data, renderer.surface_from_pixels(pixels)), png_out)
+    return pixels
+
+class RenderPlan:
+    """Which of a day's outputs are stale, from the build manifest.
+
+    A slide's input hash covers its JSON, its background bytes, the theme and RENDER_VERSION;
+    the PDF's covers every slide hash in page order.
+    """
+
+    def __init__(self, renderer, out_dir, pages, png=True):
+        self.out_dir = out_dir
+        self.manifest = BuildManifest.for_dir(out_dir)
+        design = [RENDER_VERSION, renderer.w, renderer.h, THEME]
+        self.slide_hashes = [hash_text(design, s, hash_file(bg)) for s, bg in pages]
+        self.pdf_hash = hash_text(*self.slide_hashes)
+        self.stale_png = {
+            i for i, (s, _) in enumerate(pages)
+            if png and not self.manifest.fresh(os.path.basename(slide_png_path(out_dir, s)), self.slide_hashes[i])
+        }
+        self.fresh = not self.stale_png and self.manifest.fresh(PDF_NAME, self.pdf_hash)
+
+    def record(self, pages):
+        for i in self.stale_png:
+            self.manifest.record(os.path.basename(slide_png_path(self.out_dir, pages[i][0])), self.slide_hashes[i])
+        self.manifest.record(PDF_NAME, self.pdf_hash)
+
+def write_day(renderer, out_dir, pages, pixels=None, png=True, on_slide=None):
+    """Assembles one day's PDF in slide order.
+
+    Each slide is drawn once into a recording surface and replayed as a page of a single
+    streaming Cairo PDF (text stays vector) and, if png=True, as final_slide_XX.png.
+    png may also be a set of page indexes, to rewrite only those slides' PNGs.
+    pixels, when given, are backgrounds already built by pool workers (which also wrote the PNGs).
+    on_slide(slide_number, png_path) fires for every finished PNG as its page is written.
+    """
+    if not pages:
+        return None
+
+    # ---- Export PDF (one page per slide, written as we go)
+    pdf_path = os.path.join(out_dir, PDF_NAME)
+    with tracing.span("render.pdf", outdir=out_dir, pages=len(pages)):
+        pdf = cairo.PDFSurface(pdf_path, renderer.w, renderer.h)
+        pdf_ctx = cairo.Context(pdf)
+        for i, (s, bg) in enumerate(pages):
+            png_path = slide_png_path(out_dir, s)
+            write_png = pixels is None and (png is True or (png and i in png))
+            with tracing.span("render.slide", slide=s["slide_number"], png=write_png):
+                background = renderer.surface_from_pixels(pixels[i]) if pixels else renderer.load_background(bg)
+                rec = renderer.record_slide(s, background)
+                pdf_ctx.set_source_surface(rec, 0, 0)
+                pdf_ctx.paint()
+                pdf.show_page()
+                if write_png:
+                    renderer.write_png(rec, png_path)
+            if on_slide and os.path.exists(png_path):
+                on_slide(s["slide_number"], png_path)
+        pdf.finish()
+
+    print(f"💎 FINAL PDF GENERATED SUCCESSFULLY: {pdf_path}")
+    return pdf_path
+
+# One render pool per process, reused by every day. Spawned, not forked: render_pages runs on the
+# factory and StagedPipeline threads of a process that may hold CUDA, and a forked child can
+# inherit locks those threads held at fork time.
+_pools = {}  # workers -> ProcessPoolExecutor (a pool another thread uses is never shut down under it)
+_pool_lock = threading.Lock()
+
+def get_render_pool(workers):
+    with _pool_lock:
+        if workers not in _pools:
+            _pools[workers] = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        return _pools[workers]
+
+@atexit.register
+def shutdown_render_pools():
+    with _pool_lock:
+        for pool in _pools.values():
+            pool.shutdown(wait=True)
+        _pools.clear()
+
+def render_pages(days, renderer=None, png=True, workers=1, on_slide=None):
+    """days: list of (out_dir, pages). Returns one PDF path (or None) per day.
+
+    Days whose PDF and PNGs are already up to date in the build manifest are skipped,
+    and only stale slides get their PNG rewritten.
+    With workers > 1 every slide of every day is fanned out over a process pool (blur,
+    scale, PNG encode); PDFs are still assembled in slide order, so output matches serial.
+    """
+    renderer = renderer or Renderer()
+    results, todo = {}, []
+    for n, (out_dir, pages) in enumerate(days):
+        if not pages:
+            results[n] = None
+            continue
+        plan = RenderPlan(renderer, out_dir, pages, png)
+        if plan.fresh:
+            print(f"⏭️  {os.path.join(out_dir, PDF_NAME)} is up to date, skipping render.")
+            for s, _ in pages:
+                if on_slide and os.path.exists(slide_png_path(out_dir, s)):
+                    on_slide(s["slide_number"], slide_png_path(out_dir, s))
+            results[n] = os.path.join(out_dir, PDF_NAME)
+        else:
+            todo.append((n, out_dir, pages, plan))
+
+    if workers <= 1 or not todo:
+        for n, out_dir, pages, plan in todo:
+            results[n] = write_day(renderer, out_dir, pages, png=plan.stale_png, on_slide=on_slide)
+            plan.record(pages)
+        return [results[n] for n in range(len(days))]
+
+    pool = get_render_pool(workers)
+    submitted = []
+    for n, out_dir, pages, plan in todo:
+        futures = [
+            pool.submit(_slide_pixels, (renderer, s, bg, slide_png_path(out_dir, s) if i in plan.stale_png else None))
+            for i, (s, bg) in enumerate(pages)
+        ]
+        submitted.append((n, out_dir, pages, plan, futures))
+
+    for n, out_dir, pages, plan, futures in submitted:
+        results[n] = write_day(renderer, out_dir, pages, pixels=[f.result() for f in futures], on_slide=on_slide)
+        plan.record(pages)
+    return [results[n] for n in range(len(days))]
+
+def render_day(out_dir, flux_dir=None, json_file=None, renderer=None, png=True, workers=1, on_slide=None):
+    """Renders every slide of carousal.json over its background. Returns the PDF path."""
+    pages = slide_pages(out_dir, flux_dir, json_file)
+    return render_pages([(out_dir, pages)], renderer=renderer, png=png, workers=workers, on_slide=on_slide)[0]
+
+def render_days(out_dirs, renderer=None, png=True, workers=1):
+    """Renders several day folders, sharing one process pool across all of their slides."""
+    days = [(out_dir, slide_pages(out_dir)) for out_dir in out_dirs]
+    return render_pages(days, renderer=renderer, png=png, workers=workers)
+
+def run_render():
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--outdir", type=str, action="append", help="Output folder (repeat to render several days)")
+    parser.add_argument("--no-png", action="store_true", help="Only write the PDF, skip final_slide_XX.png")
+    parser.add_argument("--workers", type=int, default=1, help="Render slides over N processes")
+    args = parser.parse_args()
+
+    if args.outdir:
+        render_days(args.outdir, png=not args.no_png, workers=args.workers)
+    else:
+        render_day(
+            os.path.join(BASE, "output_slides"),
+            flux_dir=os.path.join(BASE, "flux_assets"),
+            json_file=os.path.join(BASE, "carousal.json"),
+            png=not args.no_png,
+            workers=args.workers
         )
-        print("💎 FINAL PDF GENERATED SUCCESSFULLY")
 
 # =======================
 # ENTRY
@@ -0,0 +1,120 @@
+# Location: /nuvodata/User_data/shiva/Market_carousal/stage_scheduler.py
+# Overlaps days across resource classes: while FLUX works on day N, day N+1's LLM
+# call and day N-1's Cairo render run alongside it.
+import os
+import time
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from factory_worker import DayJob
+import tracing
+
+LLM_SLOTS = int(os.getenv("AGENT_CONCURRENCY", "3"))
+RENDER_SLOTS = int(os.getenv("RENDER_SLOTS", "2"))
+
+
+class StagedPipeline:
+    """agent -> vision -> render per day, one queue per resource class.
+
+    - LLM/network: thread pool of llm_slots
+    - GPU: the FactoryWorker's own queue, so diffusion stays one job at a time
+    - CPU render: thread pool of render_slots
+    """
+
+    def __init__(self, worker, llm_slots=LLM_SLOTS, render_slots=RENDER_SLOTS):
+        self.worker = worker
+        self.llm_slots = llm_slots
+        self.render_slots = render_slots
+        self.spans = []  # (day, stage, start, end, ok)
+        self._lock = threading.Lock()
+
+    def _timed(self, day, stage, fn, *args):
+        start = time.time()
+        ok = False
+        try:
+            with tracing.span(f"stage.{stage}", day=day):
+                result = fn(*args)
+            ok = True
+            return result
+        finally:
+            with self._lock:
+                self.spans.append((day, stage, start, time.time(), ok))
+
+    def run(self, jobs):
+        """jobs: list of (day, outdir). Returns {day: result dict or exception}."""
+        from content_for_slides import load_plan, run_agent
+
+        self.spans = []
+        t0 = time.time()
+        df = load_plan()
+        finals = {}
+
+        llm_pool = ThreadPoolExecutor(self.llm_slots, thread_name_prefix="stage-llm")
+        render_pool = ThreadPoolExecutor(self.render_slots, thread_name_prefix="stage-render")
+
+        def chained(step):
+            """Done-callback wrapper: a failed stage (or a failing hand-off) resolves the day's final future."""
+            def callback(day, outdir, final, future):
+                try:
+                    if future.exception() is not None:
+                        final.set_exception(future.exception())
+                    else:
+                        step(day, outdir, final, future.result())
+                except Exception as e:
+                    if not final.done():
+                        final.set_exception(e)
+            return callback
+
+        @chained
+        def after_agent(day, outdir, final, _):
+            # GPU lane: the resident worker serves vision jobs strictly one at a time
+            gpu = self.worker.submit(day, outdir, stages=("vision",))
+            gpu.add_done_callback(lambda f: after_vision(day, outdir, final, f))
+
+        @chained
+        def after_vision(day, outdir, final, result):
+            start, end = result["spans"]["vision"]
+            with self._lock:
+                self.spans.append((day, "vision", start, end, True))
+            job = DayJob(day, outdir, ("render",))
+            render = render_pool.submit(self._timed, day, "render", self.worker.run_stage, job, "render")
+            render.add_done_callback(lambda f: after_render(day, outdir, final, f))
+
+        @chained
+        def after_render(day, outdir, final, pdf_path):
+            final.set_result({"day": day, "outdir": outdir, "pdf": pdf_path})
+
+        try:
+            for day, outdir in jobs:
+                final = finals[day] = Future()
+                agent = llm_pool.submit(self._timed, day, "agent", run_agent, day, outdir, self.worker.llm, df)
+                agent.add_done_callback(lambda f, d=day, o=outdir, fin=final: after_agent(d, o, fin, f))
+
+            results = {}
+            for day, final in finals.items():
+                try:
+                    results[day] = final.result()
+                except Exception as e:
+                    print(f"❌ {day} FAILED: {e}")
+                    results[day] = e
+        finally:
+            llm_pool.shutdown()
+            render_pool.shutdown()
+
+        self.print_timeline(t0, time.time())
+        return results
+
+    def print_timeline(self, t0, t_end, width=48):
+        wall = t_end - t0
+        busy = sum(end - start for _, _, start, end, _ in self.spans)
+        scale = width / wall if wall else 0
+        marks = {"agent": "L", "vision": "G", "render": "R"}
+
+        print("\n🗓️  STAGE TIMELINE (L = LLM, G = GPU, R = render)")
+        print(f"{'day':<12} {'stage':<7} {'start':>7} {'end':>7} {'dur':>7}  timeline")
+        for day, stage, start, end, ok in sorted(self.spans, key=lambda s: s[2]):
+            offset = int((start - t0) * scale)
+            bar = " " * offset + marks.get(stage, "#") * max(1, int((end - start) * scale))
+            status = "" if ok else "  ❌"
+            print(f"{day:<12} {stage:<7} {start - t0:>7.2f} {end - t0:>7.2f} {end - start:>7.2f}  |{bar:<{width}}|{status}")
+        print(f"⏱️  Wall clock {wall:.2f}s | stage time {busy:.2f}s | overlap {busy / wall if wall else 0:.2f}x")
@@ -0,0 +1,135 @@
+# Location: /nuvodata/User_data/shiva/Market_carousal/test_bot_brain.py
+# Bot concurrency with a fake LLM, a fake graph and fake Telegram updates: one user's slow request
+# must not hold up another's, and each user's replies arrive in order. Run: python -m pytest -q test_bot_brain.py
+import os
+import time
+import asyncio
+from types import SimpleNamespace
+from collections import defaultdict
+
+import pytest
+
+os.environ.setdefault("MY_CHAT_ID", "1")
+os.environ.setdefault("TRACE", "0")
+pytest.importorskip("telegram")
+
+import bot_brain
+import orchestrator
+
+RAG_S = 0.4  # blocking (thread) work per chat request
+LLM_S = 0.3  # async LLM latency per chat request
+PLAN_CSV = "Day,Framework,Topic,Angle\nMonday,PAS,Local RAG,Privacy first\nTuesday,AIDA,Edge AI,Latency\n"
+
+
+class FakeMessage:
+    def __init__(self, log, user_id, text=""):
+        self.log, self.user_id, self.text = log, user_id, text
+
+    async def reply_text(self, text, **kwargs):
+        self.log.append((self.user_id, text, time.perf_counter()))
+        return FakeMessage(self.log, self.user_id, text)
+
+    async def edit_text(self, text, **kwargs):
+        self.log.append((self.user_id, text, time.perf_counter()))
+        return self
+
+
+def fake_update(log, user_id, text):
+    return SimpleNamespace(
+        effective_user=SimpleNamespace(id=user_id),
+        message=FakeMessage(log, user_id, text),
+        callback_query=None,
+    )
+
+
+class FakeLLM:
+    model_name = "fake-llm"
+
+    async def ainvoke(self, prompt, **kwargs):
+        await asyncio.sleep(LLM_S)
+        return SimpleNamespace(content="answer: " + prompt.rsplit("User Question: ", 1)[-1], response_metadata={})
+
+
+class FakeGraph:
+    async def astream(self, state, stream_mode="updates"):
+        await asyncio.sleep(0.1)
+        yield {"scout": {"scout_report": "fake report"}}
+        await asyncio.sleep(0.1)
+        yield {"strategist": {"proposed_calendar": PLAN_CSV}}
+
+
+def blocking_rag(query):
+    time.sleep(RAG_S)  # would stall every user if it ran on the event loop
+    return "fake company context"
+
+
+@pytest.fixture
+def bot(monkeypatch, tmp_path):
+    monkeypatch.setattr(orchestrator, "llm", FakeLLM())
+    monkeypatch.setattr(orchestrator, "get_rag_context", blocking_rag)
+    monkeypatch.setattr(orchestrator, "web_scout", lambda q: "")
+    monkeypatch.setattr(bot_brain, "orchestrator", FakeGraph())
+    monkeypatch.setattr(bot_brain, "CSV_PATH", str(tmp_path / "marketing_plan.csv"))
+    monkeypatch.setattr(bot_brain, "HISTORY_PATH", str(tmp_path / "topic_history.log"))
+    monkeypatch.setattr(bot_brain, "USER_CONCURRENCY", 1)
+    monkeypatch.setattr(bot_brain, "_user_slots", defaultdict(lambda: asyncio.Semaphore(bot_brain.USER_CONCURRENCY)))
+    return bot_brain
+
+
+def replies(log, user_id):
+    return [text for uid, text, _ in log if uid == user_id]
+
+
+def test_users_do_not_block_each_other(bot):
+    log = []
+    chat = bot.per_user_limit(bot.handle_chat)
+
+    async def run():
+        start = time.perf_counter()
+        await asyncio.gather(*(chat(fake_update(log, uid, f"question {uid}"), None) for uid in (1, 2, 3)))
+        return time.perf_counter() - start
+
+    elapsed = asyncio.run(run())
+    # Serially this would take 3 * (RAG_S + LLM_S); concurrently about one request's worth
+    assert elapsed < 2 * (RAG_S + LLM_S), f"users were served one after another ({elapsed:.2f}s)"
+    for uid in (1, 2, 3):
+        assert replies(log, uid)[-1] == f"answer: question {uid}"
+
+
+def test_planning_does_not_block_chat(bot):
+    log = []
+
+    async def run():
+        plan = asyncio.create_task(bot.per_user_limit(bot.handle_chat)(fake_update(log, 1, "plan next week"), None))
+        await bot.per_user_limit(bot.handle_chat)(fake_update(log, 2, "question 2"), None)
+        await plan
+
+    asyncio.run(run())
+    assert replies(log, 1)[-1].startswith("📋 **Updated Strategy:**")
+    assert "Monday" in replies(log, 1)[-1]
+    assert replies(log, 2)[-1] == "answer: question 2"
+
+
+def test_per_user_ordering(bot):
+    log = []
+    chat = bot.per_user_limit(bot.handle_chat)
+
+    async def run():
+        first = asyncio.create_task(chat(fake_update(log, 1, "first"), None))
+        await asyncio.sleep(0.05)  # first holds user 1's only slot now
+        await chat(fake_update(log, 1, "second"), None)
+        await chat(fake_update(log, 2, "other user"), None)
+        await first
+        await chat(fake_update(log, 1, "third"), None)
+
+    asyncio.run(run())
+    user1 = replies(log, 1)
+    # The overlapping request is turned away instead of overtaking the first one
+    assert user1 == [
+        "🤔 **Analyzing...**",
+        "⏳ Still working on your previous request...",
+        "answer: first",
+        "🤔 **Analyzing...**",
+        "answer: third",
+    ]
+    assert replies(log, 2) == ["🤔 **Analyzing...**", "answer: other user"]
@@ -0,0 +1,29 @@
+# Location: /nuvodata/User_data/shiva/Market_carousal/test_build_manifest.py
+# Shared per-day manifests must pick up writes from other processes. Run: python -m pytest -q test_build_manifest.py
+import os
+
+from build_manifest import BuildManifest
+
+
+def test_external_write_is_not_clobbered(tmp_path):
+    outdir = str(tmp_path)
+    open(os.path.join(outdir, "slide_1.png"), "w").close()
+    bot = BuildManifest.for_dir(outdir)  # long-lived copy, as in the bot process
+    bot.record("slide_1.png", "old")
+
+    cli = BuildManifest(outdir)  # e.g. run_pipeline.py --force in another process
+    cli.record("slide_1.png", "new")
+    cli.record("slide_2.png", "new")
+
+    assert bot.fresh("slide_1.png", "new")
+    bot.record("final_slide_01.png", "x")
+    assert BuildManifest(outdir).entries == {"slide_1.png": "new", "slide_2.png": "new", "final_slide_01.png": "x"}
+
+
+def test_reset_elsewhere_is_seen(tmp_path):
+    outdir = str(tmp_path)
+    open(os.path.join(outdir, "slide_1.png"), "w").close()
+    bot = BuildManifest.for_dir(outdir)
+    bot.record("slide_1.png", "h")
+    BuildManifest(outdir).reset()
+    assert not bot.fresh("slide_1.png", "h")
@@ -0,0 +1,46 @@
+# Location: /nuvodata/User_data/shiva/Market_carousal/test_carousel_schema.py
+# Salvage/merge/problems on hand-made responses: soft <b> warnings vs hard schema errors.
+# Run: python -m pytest -q test_carousel_schema.py
+import json
+
+from carousel_schema import SLIDE_COUNT, extract_carousel, merge, problems, salvage
+
+
+def slide(n, bold=True, **fields):
+    s = {"slide_number": n, "title": f"Slide {n}", "content": "<b>Key</b> point" if bold else "Key point",
+         "image_prompt": "premium cinematic tech background"}
+    s.update(fields)
+    return s
+
+
+def response(slides):
+    return json.dumps({"linkedin_post": "post", "instagram_caption": "caption", "slides": slides})
+
+
+def test_slide_without_bold_is_kept_but_reprompted():
+    slides = [slide(n) for n in range(1, SLIDE_COUNT + 1)]
+    slides[1] = slide(2, bold=False)
+    package, issues, _ = extract_carousel(response(slides))
+    assert [s["slide_number"] for s in package["slides"]] == list(range(1, SLIDE_COUNT + 1))
+    assert issues == {2: "content has no <b> highlighted terms"}
+
+    # A clean replacement wins over the kept one; another unbolded one does not
+    merge(package, salvage(response([slide(2, bold=False, title="Still plain")])), wanted={2})
+    assert package["slides"][1]["title"] == "Slide 2"
+    merge(package, salvage(response([slide(2, title="Fixed")])), wanted={2})
+    assert package["slides"][1]["title"] == "Fixed"
+    assert problems(package) == {}
+
+
+def test_structural_errors_and_missing_slides_are_reported():
+    package, issues, _ = extract_carousel(response([slide(1), slide(2, image_prompt="")]))
+    assert [s["slide_number"] for s in package["slides"]] == [1]
+    assert issues[2] == "image_prompt is missing or empty"
+    assert all(issues[n] == "missing" for n in range(3, SLIDE_COUNT + 1))
+
+
+def test_slide_numbers_past_the_carousel_are_ignored():
+    extra = [slide(SLIDE_COUNT + 1), slide(SLIDE_COUNT + 2, title="")]
+    package, issues, _ = extract_carousel(response([slide(n) for n in range(1, SLIDE_COUNT + 1)] + extra))
+    assert [s["slide_number"] for s in package["slides"]] == list(range(1, SLIDE_COUNT + 1))
+    assert issues == {}
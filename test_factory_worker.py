@@ -0,0 +1,53 @@
+# Location: /nuvodata/User_data/shiva/Market_carousal/test_factory_worker.py
+# The factory end-to-end on CPU: StubBackend backgrounds for a temp day folder, build manifest included.
+# Run: python -m pytest -q test_factory_worker.py
+import os
+import json
+
+import pytest
+
+os.environ.setdefault("TRACE", "0")
+pytest.importorskip("PIL")
+
+from build_manifest import BuildManifest, MANIFEST_NAME
+from factory_worker import FactoryWorker, day_folder
+
+SLIDES = [
+    {"slide_number": n, "title": f"Slide {n}", "content": f"<b>Point</b> {n}",
+     "image_prompt": "premium cinematic tech background"}
+    for n in range(1, 4)
+]
+
+
+def write_day(output_dir, day="Monday"):
+    outdir = day_folder(day, output_dir)
+    os.makedirs(outdir)
+    with open(os.path.join(outdir, "carousal.json"), "w") as f:
+        json.dump(SLIDES, f)
+    return outdir
+
+
+def test_stub_backend_writes_backgrounds_and_manifest(tmp_path):
+    outdir = write_day(str(tmp_path))
+    events = []
+    with FactoryWorker(backend="stub", output_dir=str(tmp_path), cache=False) as worker:
+        result = worker.submit("Monday", stages=("vision",), on_event=events.append).result(timeout=60)
+
+    assert result["outdir"] == outdir
+    for n in range(1, 4):
+        assert os.path.getsize(os.path.join(outdir, f"slide_{n}.png")) > 0
+    with open(os.path.join(outdir, MANIFEST_NAME)) as f:
+        entries = json.load(f)
+    assert sorted(entries) == [f"slide_{n}.png" for n in range(1, 4)]
+    assert sorted(e["slide"] for e in events if e["event"] == "image_ready") == [1, 2, 3]
+
+
+def test_second_run_skips_fresh_backgrounds(tmp_path):
+    outdir = write_day(str(tmp_path))
+    with FactoryWorker(backend="stub", output_dir=str(tmp_path), cache=False) as worker:
+        worker.submit("Monday", stages=("vision",)).result(timeout=60)
+        mtimes = {n: os.stat(os.path.join(outdir, n)).st_mtime_ns for n in os.listdir(outdir) if n.endswith(".png")}
+        worker.submit("Monday", stages=("vision",)).result(timeout=60)
+
+    assert {n: os.stat(os.path.join(outdir, n)).st_mtime_ns for n in mtimes} == mtimes
+    assert all(BuildManifest.for_dir(outdir).entries.get(n) for n in mtimes)
@@ -0,0 +1,188 @@
+# Location: /nuvodata/User_data/shiva/Market_carousal/test_intel_crawler.py
+# Competitor crawler against a local stand-in server: conditional GETs, content-hash duplicates
+# and the per-host concurrency cap. Run: python -m pytest -q test_intel_crawler.py
+import os
+import time
+import asyncio
+import threading
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+os.environ.setdefault("TRACE", "0")
+pytest.importorskip("aiohttp")
+pytest.importorskip("bs4")
+
+from intel_crawler import HostGate, IntelCrawler, page_filename
+
+MODIFIED = formatdate(time.time() - 3600, usegmt=True)
+
+
+def article(text):
+    return f"<html><body><nav>menu</nav><article><h1>Post</h1><p>{text}</p></article></body></html>"
+
+
+class StandIn:
+    """pages: {path: (html, validator)} where validator is "etag", "last_modified" or None.
+    Records each request's conditional headers and the peak number of requests in flight."""
+
+    def __init__(self, pages, latency=0.0):
+        self.pages = pages
+        self.latency = latency
+        self.requests = []
+        self.active = self.peak = 0
+        lock = threading.Lock()
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with lock:
+                    stand_in.active += 1
+                    stand_in.peak = max(stand_in.peak, stand_in.active)
+                    stand_in.requests.append((self.path, self.headers.get("If-None-Match"),
+                                              self.headers.get("If-Modified-Since")))
+                try:
+                    time.sleep(stand_in.latency)
+                    self.respond()
+                finally:
+                    with lock:
+                        stand_in.active -= 1
+
+            def respond(self):
+                html, validator = stand_in.pages[self.path]
+                body = html.encode("utf-8")
+                etag = f'"{abs(hash(html))}"'
+                if (validator == "etag" and self.headers.get("If-None-Match") == etag) or \
+                        (validator == "last_modified" and self.headers.get("If-Modified-Since") == MODIFIED):
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html")
+                self.send_header("Content-Length", str(len(body)))
+                if validator == "etag":
+                    self.send_header("ETag", etag)
+                elif validator == "last_modified":
+                    self.send_header("Last-Modified", MODIFIED)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def url(self, path):
+        return f"http://127.0.0.1:{self.server.server_address[1]}{path}"
+
+
+@pytest.fixture
+def stand_in():
+    servers = []
+
+    def start(pages, latency=0.0):
+        servers.append(StandIn(pages, latency))
+        return servers[-1]
+
+    yield start
+    for s in servers:
+        s.server.shutdown()
+
+
+def crawl(intel_dir, urls, **kwargs):
+    crawler = IntelCrawler(str(intel_dir), rate=0, **kwargs)
+    return asyncio.run(crawler.crawl(urls)), crawler
+
+
+def test_recrawl_sends_validators_and_honours_304(tmp_path, stand_in):
+    site = stand_in({"/etag": (article("etag post"), "etag"),
+                     "/modified": (article("dated post"), "last_modified")})
+    urls = [site.url("/etag"), site.url("/modified")]
+
+    statuses, _ = crawl(tmp_path, urls)
+    assert set(statuses.values()) == {"written"}
+    site.requests.clear()
+
+    statuses, crawler = crawl(tmp_path, urls)
+    assert statuses == {u: "not_modified" for u in urls}
+    assert crawler.metrics["bytes_saved"] > 0
+    sent = {path: (etag, since) for path, etag, since in site.requests}
+    assert sent["/etag"][0] and sent["/etag"][1] is None
+    assert sent["/modified"] == (None, MODIFIED)
+
+
+def test_unchanged_text_without_validators_is_not_rewritten(tmp_path, stand_in):
+    site = stand_in({"/plain": (article("no validators here"), None)})
+    crawl(tmp_path, [site.url("/plain")])
+    path = tmp_path / page_filename(site.url("/plain"))
+    before = path.stat().st_mtime_ns
+
+    statuses, _ = crawl(tmp_path, [site.url("/plain")])
+    assert statuses == {site.url("/plain"): "unchanged"}
+    assert path.stat().st_mtime_ns == before
+
+
+def test_duplicate_is_skipped_and_its_stale_file_removed(tmp_path, stand_in):
+    site = stand_in({"/news/a": (article("original story"), None),
+                     "/mirror/a": (article("older mirror text"), None)})
+    urls = [site.url("/news/a"), site.url("/mirror/a")]
+    crawl(tmp_path, urls)
+    mirror_file = tmp_path / page_filename(site.url("/mirror/a"))
+    assert mirror_file.exists()
+
+    # The mirror now serves the same article: it is skipped and its old text must not linger
+    site.pages["/mirror/a"] = site.pages["/news/a"]
+    statuses, crawler = crawl(tmp_path, urls)
+    assert statuses[site.url("/mirror/a")] == "duplicate"
+    assert crawler.state[site.url("/mirror/a")]["duplicate_of"] == site.url("/news/a")
+    assert not mirror_file.exists()
+    assert sorted(f for f in os.listdir(tmp_path) if f.endswith(".txt")) == [page_filename(site.url("/news/a"))]
+
+    # Once it diverges again it gets its own file back
+    site.pages["/mirror/a"] = (article("mirror has its own take now"), None)
+    statuses, _ = crawl(tmp_path, urls)
+    assert statuses[site.url("/mirror/a")] == "written"
+    assert "own take" in mirror_file.read_text()
+
+
+def test_per_host_concurrency_is_capped(tmp_path, stand_in):
+    site = stand_in({f"/page_{i}": (article(f"post number {i}"), None) for i in range(8)}, latency=0.1)
+    statuses, _ = crawl(tmp_path, [site.url(f"/page_{i}") for i in range(8)], per_host=2)
+    assert set(statuses.values()) == {"written"}
+    assert site.peak == 2
+
+
+def test_host_gate_limits_each_host_separately():
+    active, peak = {}, {}
+
+    async def hit(gate, host):
+        async with gate.slot(host):
+            active[host] = active.get(host, 0) + 1
+            peak[host] = max(peak.get(host, 0), active[host])
+            await asyncio.sleep(0.02)
+            active[host] -= 1
+
+    async def run():
+        gate = HostGate(per_host=2, rate=0)
+        await asyncio.gather(*(hit(gate, host) for host in ("a", "b") for _ in range(6)))
+
+    asyncio.run(run())
+    assert peak == {"a": 2, "b": 2}
+
+
+def test_host_gate_spaces_request_starts():
+    starts = []
+
+    async def hit(gate):
+        async with gate.slot("a"):
+            starts.append(asyncio.get_running_loop().time())
+
+    async def run():
+        gate = HostGate(per_host=4, rate=20)  # one start every 50 ms
+        await asyncio.gather(*(hit(gate) for _ in range(4)))
+
+    asyncio.run(run())
+    gaps = [b - a for a, b in zip(starts, starts[1:])]
+    assert min(gaps) >= 0.045
@@ -0,0 +1,72 @@
+# Location: /nuvodata/User_data/shiva/Market_carousal/test_json_stream.py
+# SlideStream on awkward chunking: splits inside strings and escapes, slide order, bare lists.
+# Run: python -m pytest -q test_json_stream.py
+import json
+
+from json_stream import SlideStream, iter_slides
+
+TRICKY = [
+    {"slide_number": 1, "title": "Braces {inside} [strings]", "content": "<b>Local</b> \"RAG\" } ] {"},
+    {"slide_number": 2, "title": "Escapes", "content": "back\\slash \\\" quote\nnew line, café →"},
+    {"slide_number": 3, "title": "Nested", "content": "<b>Edge</b>", "meta": {"tags": ["a", "b"], "n": [1, [2]]}},
+]
+
+
+def response(slides=TRICKY, fence=True):
+    body = json.dumps({"linkedin_caption": 'Say "slides": [ {not a slide} ]', "slides": slides}, indent=2)
+    return f"Here is the carousel:\n```json\n{body}\n```\nHope this helps!" if fence else body
+
+
+def feed_all(chunks):
+    stream = SlideStream()
+    out = []
+    for chunk in chunks:
+        out.extend(stream.feed(chunk))
+    return stream, out
+
+
+def test_char_by_char_keeps_order_and_content():
+    text = response()
+    stream, out = feed_all(text)
+    assert out == TRICKY
+    assert stream.slides == TRICKY
+    assert stream.text == text
+
+
+def test_every_two_chunk_split_gives_same_slides():
+    # Covers a split right after a backslash, in the middle of \uXXXX, between escaped quotes...
+    text = json.dumps({"slides": TRICKY[:2]}, ensure_ascii=True)
+    assert "\\u00e9" in text
+    for cut in range(1, len(text)):
+        _, out = feed_all([text[:cut], text[cut:]])
+        assert out == TRICKY[:2], f"split at {cut}: {text[cut - 5:cut]!r}|{text[cut:cut + 5]!r}"
+
+
+def test_slide_is_handed_out_when_its_brace_closes():
+    text = json.dumps({"slides": TRICKY})
+    stream = SlideStream()
+    released = []
+    for i, ch in enumerate(text):
+        released.extend((slide["slide_number"], i) for slide in stream.feed(ch))
+    assert [n for n, _ in released] == [1, 2, 3]
+    # Each one came out on its own closing brace, not at the end of the response
+    for n, i in released:
+        assert text[i] == "}"
+        assert text[:i + 1].endswith(json.dumps(TRICKY[n - 1]))
+
+
+def test_broken_slide_is_skipped_others_keep_order():
+    text = '{"slides": [{"slide_number": 1, "title": "ok"}, {"slide_number": 2, "title": oops}, {"slide_number": 3}]}'
+    assert [s["slide_number"] for s in iter_slides(text[i:i + 7] for i in range(0, len(text), 7))] == [1, 3]
+
+
+def test_bare_list_streams_slides():
+    text = "Sure! [1] draft below.\n```json\n" + json.dumps(TRICKY, indent=2) + "\n```"
+    _, out = feed_all(text)
+    assert out == TRICKY
+
+
+def test_other_keys_and_stray_lists_are_ignored():
+    text = '["a", {"slide_number": 9}]\n{"notes": [{"slide_number": 8}], "slides": [{"slide_number": 1}]}'
+    _, out = feed_all(text)
+    assert out == [{"slide_number": 1}]
@@ -0,0 +1,79 @@
+# Location: /nuvodata/User_data/shiva/Market_carousal/test_search_service.py
+# Search cache and deadlines offline: FakeSearchProvider in place of DuckDuckGo, a temp cache folder.
+# Run: python -m pytest -q test_search_service.py
+import os
+import json
+import time
+
+import pytest
+
+os.environ.setdefault("TRACE", "0")
+
+from search_service import FALLBACK, FakeSearchProvider, SearchCache, SearchService
+
+
+def service(tmp_path, provider=None, ttl=3600, timeout=5.0):
+    provider = provider or FakeSearchProvider()
+    return SearchService(provider, SearchCache(str(tmp_path), ttl=ttl), timeout=timeout), provider
+
+
+def test_normalized_query_hits_cache(tmp_path):
+    svc, provider = service(tmp_path)
+    first = svc.search("Local RAG  trends 2026?")
+    # Case, spacing and trailing punctuation map to the same cache entry
+    assert svc.search("local rag trends 2026") == first
+    assert len(provider.calls) == 1
+    assert svc.stats["cache_hits"] == 1
+
+    # A fresh service on the same folder reuses the disk cache (bot restart)
+    again, provider2 = service(tmp_path)
+    assert again.search("LOCAL RAG TRENDS 2026") == first
+    assert provider2.calls == []
+
+
+def test_expired_entry_is_fetched_again(tmp_path):
+    svc, provider = service(tmp_path, ttl=60)
+    svc.search("edge ai")
+    path = svc.cache.path_for("edge ai")
+    with open(path) as f:
+        entry = json.load(f)
+    entry["ts"] -= 120  # written two minutes ago, TTL is one
+    with open(path, "w") as f:
+        json.dump(entry, f)
+
+    svc.search("edge ai")
+    assert len(provider.calls) == 2
+    assert svc.stats["cache_hits"] == 0
+    assert svc.cache.purge_expired() == 0  # the refetch rewrote it with a fresh timestamp
+
+
+def test_failure_returns_fallback_and_is_not_cached(tmp_path):
+    svc, provider = service(tmp_path, provider=FakeSearchProvider(fail=["ai competitors"]))
+    results = svc.search_many(["AI competitors", "edge ai"])
+    assert results["AI competitors"] == FALLBACK
+    assert results["edge ai"] != FALLBACK
+    assert svc.cache.get("ai competitors") is None
+    assert svc.stats["errors"] == 1
+
+    # Next time the outage is over: the provider is asked again rather than serving FALLBACK
+    provider.fail.clear()
+    assert svc.search("AI competitors") != FALLBACK
+    assert provider.calls.count("AI competitors") == 2
+
+    with pytest.raises(ConnectionError):
+        service(tmp_path / "other", provider=FakeSearchProvider(fail=["down"]))[0].search("down")
+
+
+def test_slow_provider_is_cut_off_at_deadline(tmp_path):
+    svc, provider = service(tmp_path, provider=FakeSearchProvider(delay=1.0), timeout=0.2)
+    start = time.perf_counter()
+    results = svc.search_many(["slow one", "slow two"])
+    elapsed = time.perf_counter() - start
+
+    # Both misses share one deadline instead of waiting 0.2s each, let alone the full second
+    assert elapsed < 0.6, f"search waited {elapsed:.2f}s past a 0.2s deadline"
+    assert results == {"slow one": FALLBACK, "slow two": FALLBACK}
+    assert svc.stats["timeouts"] == 2
+
+    with pytest.raises(TimeoutError):
+        svc.search("slow three")
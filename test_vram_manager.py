@@ -0,0 +1,102 @@
+# Location: /nuvodata/User_data/shiva/Market_carousal/test_vram_manager.py
+# Residency policy without a GPU: fake models with a fixed footprint and explicit budgets.
+# Run: python -m pytest -q test_vram_manager.py
+from vram_manager import ResidencyManager
+
+
+class FakeModel:
+    def __init__(self):
+        self.moves = []
+
+    def to(self, device):
+        self.moves.append(str(device))
+        return self
+
+
+class FakeEmbeddings:
+    """Like HuggingFaceEmbeddings: no .to() of its own, the torch module is .client."""
+
+    def __init__(self):
+        self.client = FakeModel()
+
+
+def manager(gpu=0.0, cpu=1000.0):
+    # gpu=0 means no CUDA pool at all (budget checks are skipped for it)
+    return ResidencyManager(gpu_budget_mb=gpu, host_budget_mb=cpu)
+
+
+def test_lru_eviction_on_host_pool():
+    m = manager(cpu=1000)
+    evicted = []
+    for name in ("a", "b", "c"):
+        m.register(name, FakeModel(), device="cpu", mb=400, on_evict=lambda n=name: evicted.append(n))
+    # c did not fit next to a and b: the least recently used (a) went
+    assert evicted == ["a"]
+    assert list(m.models) == ["b", "c"]
+
+    m.use("b")  # b is now the most recent, so c goes next
+    m.register("d", FakeModel(), device="cpu", mb=400)
+    assert evicted == ["a", "c"]
+    assert list(m.models) == ["b", "d"]
+    assert m.stats["evictions"] == 2
+
+
+def test_pinned_model_is_never_evicted():
+    m = manager(cpu=1000)
+    m.register("minilm", FakeModel(), device="cpu", mb=400, pinned=True)
+    m.register("b", FakeModel(), device="cpu", mb=400)
+    m.register("c", FakeModel(), device="cpu", mb=400)
+    assert "minilm" in m.models
+    assert list(m.models) == ["minilm", "c"]
+
+
+def test_group_is_evicted_together_and_kept_together():
+    m = manager(cpu=1000)
+    calls = []
+    drop = lambda: calls.append("flux")
+    m.register("transformer", FakeModel(), device="cpu", mb=300, group="flux", on_evict=drop)
+    m.register("vae", FakeModel(), device="cpu", mb=100, group="flux", on_evict=drop)
+    m.register("other", FakeModel(), device="cpu", mb=300)
+
+    # Room for the new model must not come from the group it belongs to
+    m.register("text_encoder", FakeModel(), device="cpu", mb=400, group="flux", on_evict=drop)
+    assert "other" not in m.models
+    assert {"transformer", "vae", "text_encoder"} <= set(m.models)
+
+    m.register("big", FakeModel(), device="cpu", mb=500)
+    # Evicting one member dropped the whole group, and the owner was told once
+    assert list(m.models) == ["big"]
+    assert calls == ["flux"]
+
+
+def test_gpu_pressure_offloads_to_host_and_use_reloads():
+    m = manager(gpu=1000, cpu=1000)
+    flux = m.register("flux", FakeModel(), device="cuda:0", mb=600)
+    m.register("minilm", FakeEmbeddings(), device="cuda:0", mb=300, pinned=True)
+    m.register("llm", FakeModel(), device="cuda:0", mb=400)
+
+    assert m.models["flux"].device == "cpu" and flux.moves == ["cpu"]
+    assert m.stats["offloads"] == 1
+
+    m.use("flux")  # comes back to cuda:0, pushing out the LRU models that do not fit
+    assert m.models["flux"].device == "cuda"
+    assert flux.moves == ["cpu", "cuda:0"]
+    assert m.used_mb("cuda") <= 1000
+    assert m.stats["reloads"] == 1
+
+
+def test_wrapper_moves_its_client_module():
+    m = manager(gpu=1000, cpu=1000)
+    embeddings = m.register("minilm", FakeEmbeddings(), device="cuda:0", mb=100)
+    m.offload("minilm")
+    assert embeddings.client.moves == ["cpu"]
+    assert m.models["minilm"].device == "cpu"
+
+
+def test_unmovable_model_keeps_its_device():
+    m = manager(gpu=1000, cpu=1000)
+    m.register("opaque", object(), device="cuda:0", mb=100)
+    m.offload("opaque")
+    # Nothing moved, so the accounting must still say cuda
+    assert m.models["opaque"].device == "cuda"
+    assert m.stats["offloads"] == 0
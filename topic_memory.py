@@ -0,0 +1,185 @@
+# Location: /nuvodata/User_data/shiva/Market_carousal/topic_memory.py
+# Near-duplicate memory over the whole of topic_history.log: MinHash signatures of each past
+# topic, banded into an LSH table, so "have we posted this already?" is a sub-millisecond lookup.
+# The signatures live in topic_index.npz and only new log lines are hashed.
+import os
+import re
+import hashlib
+import threading
+from collections import defaultdict
+
+import numpy as np
+
+BASE_PATH = "/nuvodata/User_data/shiva/Market_carousal"
+HISTORY_PATH = os.path.join(BASE_PATH, "topic_history.log")
+INDEX_PATH = os.path.join(BASE_PATH, "topic_index.npz")
+
+NUM_PERM = 64
+BANDS = 16                     # 16 bands x 4 rows: pairs around Jaccard 0.5 collide with high probability
+ROWS = NUM_PERM // BANDS
+SHINGLE = 4                    # character n-grams: robust to plurals and small rewordings
+SIMILARITY_THRESHOLD = float(os.getenv("TOPIC_SIMILARITY", "0.5"))
+_PRIME = (1 << 31) - 1
+_rng = np.random.RandomState(127)
+_A = _rng.randint(1, _PRIME, size=NUM_PERM).astype(np.uint64)
+_B = _rng.randint(0, _PRIME, size=NUM_PERM).astype(np.uint64)
+
+# Series labels the strategist reuses on every post; they say nothing about the subject
+LABEL_PREFIX = re.compile(r"^[^:]{0,40}:\s+")
+STOPWORDS = {"a", "an", "and", "the", "for", "of", "in", "on", "to", "with", "by", "nueralogic", "nueralogic's"}
+
+
+def normalize_topic(text):
+    text = LABEL_PREFIX.sub("", str(text).strip())
+    words = re.findall(r"[a-z0-9']+", text.lower())
+    return " ".join(w for w in words if w not in STOPWORDS)
+
+
+def shingles(text):
+    text = normalize_topic(text)
+    if len(text) <= SHINGLE:
+        return {text}
+    return {text[i:i + SHINGLE] for i in range(len(text) - SHINGLE + 1)}
+
+
+def signature(text):
+    """MinHash signature (NUM_PERM uint32) of the topic's character shingles."""
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little") & _PRIME for s in shingles(text)],
+        dtype=np.uint64
+    )
+    return ((np.outer(hashes, _A) + _B) % _PRIME).min(axis=0).astype(np.uint32)
+
+
+def band_keys(sig):
+    return [hash(sig[b * ROWS:(b + 1) * ROWS].tobytes()) ^ b for b in range(BANDS)]
+
+
+class TopicMemory:
+    """All past topics from topic_history.log, queryable for near-duplicates."""
+
+    def __init__(self, history_path=HISTORY_PATH, index_path=INDEX_PATH, threshold=SIMILARITY_THRESHOLD):
+        self.history_path = history_path
+        self.index_path = index_path
+        self.threshold = threshold
+        self.topics = []
+        self.sigs = np.zeros((0, NUM_PERM), dtype=np.uint32)
+        self.buckets = defaultdict(list)
+        self._lock = threading.Lock()
+        self._load()
+        self.sync()
+
+    # --- persistence ---
+    def _load(self):
+        if not os.path.exists(self.index_path):
+            return
+        try:
+            data = np.load(self.index_path, allow_pickle=False)
+            topics, sigs = list(data["topics"]), data["sigs"]
+        except (OSError, ValueError, KeyError):
+            print(f"⚠️ Unreadable {self.index_path}, re-hashing topic history")
+            return
+        if sigs.shape[1:] != (NUM_PERM,):
+            return  # written with other MinHash settings
+        self.topics, self.sigs = [str(t) for t in topics], sigs
+        for i, sig in enumerate(sigs):
+            self._bucket(i, sig)
+
+    def _save(self):
+        tmp = f"{self.index_path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp, topics=np.array(self.topics, dtype=str), sigs=self.sigs)
+        os.replace(tmp, self.index_path)
+
+    def _read_history(self):
+        if not os.path.exists(self.history_path):
+            return []
+        with open(self.history_path, "r", encoding="utf-8") as f:
+            return [line.strip() for line in f if line.strip()]
+
+    def _ends_with_newline(self):
+        if not os.path.exists(self.history_path) or os.path.getsize(self.history_path) == 0:
+            return True
+        with open(self.history_path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def _bucket(self, i, sig):
+        for key in band_keys(sig):
+            self.buckets[key].append(i)
+
+    def _append(self, topics):
+        start = len(self.topics)
+        new_sigs = np.array([signature(t) for t in topics], dtype=np.uint32).reshape(-1, NUM_PERM)
+        self.topics.extend(topics)
+        self.sigs = np.vstack([self.sigs, new_sigs])
+        for offset, sig in enumerate(new_sigs):
+            self._bucket(start + offset, sig)
+
+    def sync(self):
+        """Hashes log lines added since the index was saved (rebuilds if the log was edited)."""
+        with self._lock:
+            history = self._read_history()
+            if history[:len(self.topics)] != self.topics:
+                self.topics, self.sigs, self.buckets = [], np.zeros((0, NUM_PERM), dtype=np.uint32), defaultdict(list)
+            new = history[len(self.topics):]
+            if new:
+                self._append(new)
+                self._save()
+            return len(new)
+
+    # --- queries ---
+    def nearest(self, topic):
+        """(score, past topic) of the most similar past topic among LSH candidates, or (0.0, None)."""
+        sig = signature(topic)
+        candidates = {i for key in band_keys(sig) for i in self.buckets.get(key, ())}
+        if not candidates:
+            return 0.0, None
+        ids = np.fromiter(candidates, dtype=np.int64)
+        scores = (self.sigs[ids] == sig).mean(axis=1)
+        best = int(scores.argmax())
+        return float(scores[best]), self.topics[ids[best]]
+
+    def check(self, topics, threshold=None):
+        """[(index, topic, past topic, score)] for every topic at or above the similarity threshold."""
+        threshold = self.threshold if threshold is None else threshold
+        hits = []
+        for i, topic in enumerate(topics):
+            score, match = self.nearest(topic)
+            if match is not None and score >= threshold:
+                hits.append((i, topic, match, score))
+        return hits
+
+    def add(self, topics):
+        """Records approved topics: appends them to topic_history.log and the index. Returns how many were new."""
+        with self._lock:
+            known = {normalize_topic(t) for t in self.topics}
+            fresh = []
+            for topic in topics:
+                topic = " ".join(str(topic).split())
+                if topic and normalize_topic(topic) not in known:
+                    known.add(normalize_topic(topic))
+                    fresh.append(topic)
+            if not fresh:
+                return 0
+            with open(self.history_path, "a", encoding="utf-8") as f:
+                if not self._ends_with_newline():
+                    f.write("\n")
+                for topic in fresh:
+                    f.write(topic + "\n")
+            self._append(fresh)
+            self._save()
+            return len(fresh)
+
+
+_memory = None
+_memory_lock = threading.Lock()
+
+
+def get_topic_memory():
+    global _memory
+    with _memory_lock:
+        if _memory is None:
+            _memory = TopicMemory()
+        else:
+            _memory.sync()
+        return _memory
@@ -0,0 +1,199 @@
+# Location: /nuvodata/User_data/shiva/Market_carousal/tracing.py
+# Span tracing for the factory: every instrumented step appends one JSON line to
+# traces/<run_id>.jsonl with wall time, CPU time, how much it raised the process RSS high-water mark
+# and (if torch is on a GPU) the peak CUDA memory allocated while it ran.
+# Summary of the slowest stages: python tracing.py summary --runs 5
+import os
+import sys
+import json
+import time
+import resource
+import threading
+import contextvars
+from contextlib import contextmanager
+from collections import defaultdict
+
+BASE_PATH = "/nuvodata/User_data/shiva/Market_carousal"
+TRACE_DIR = os.getenv("TRACE_DIR", os.path.join(BASE_PATH, "traces"))
+ENABLED = os.getenv("TRACE", "1") != "0"
+RUN_ID = os.getenv("TRACE_RUN_ID") or f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+
+_write_lock = threading.Lock()
+_parent = contextvars.ContextVar("trace_parent", default=None)
+_ids = iter(range(1, sys.maxsize))
+
+# The CUDA allocator keeps one process-wide high-water mark. At every span boundary it is folded
+# into each open span and reset, so a span's peak covers only its own lifetime (nested and
+# concurrent spans included, since they share the device).
+_cuda_lock = threading.Lock()
+_cuda_open = {}  # span id -> peak MB so far
+
+
+def trace_path(run_id=RUN_ID):
+    return os.path.join(TRACE_DIR, f"{run_id}.jsonl")
+
+
+def process_peak_rss_mb():
+    """High-water RSS of the whole process so far (ru_maxrss is KB on Linux); never goes down."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _cuda():
+    torch = sys.modules.get("torch")
+    return torch if torch is not None and torch.cuda.is_available() else None
+
+
+def _cuda_boundary(enter=None, leave=None):
+    """Folds the allocator peak into the open spans, resets it, and opens/closes one span.
+    Returns the closed span's peak MB (None without torch on a GPU)."""
+    torch = _cuda()
+    if torch is None:
+        return None
+    with _cuda_lock:
+        peak = torch.cuda.max_memory_allocated() / 1024 / 1024
+        for span_id in _cuda_open:
+            _cuda_open[span_id] = max(_cuda_open[span_id], peak)
+        torch.cuda.reset_peak_memory_stats()
+        if enter:
+            _cuda_open[enter] = torch.cuda.memory_allocated() / 1024 / 1024
+        if leave:
+            # torch may have been loaded inside the span: then the peak since the last reset is all we have
+            return _cuda_open.pop(leave, peak)
+
+
+def write(record):
+    if not ENABLED:
+        return
+    os.makedirs(TRACE_DIR, exist_ok=True)
+    line = json.dumps(record, default=str) + "\n"
+    with _write_lock, open(trace_path(), "a") as f:
+        f.write(line)
+
+
+def record(name, wall_s, cpu_s=None, **attrs):
+    """Writes an already-measured span (e.g. one diffusion step timed in a pipeline callback).
+    Memory was not watched while it ran, so only the process-wide RSS high-water mark is saved."""
+    write({
+        "run": RUN_ID, "name": name, "id": f"{os.getpid()}-{next(_ids)}", "parent": _parent.get(),
+        "start": time.time() - wall_s, "wall_s": wall_s, "cpu_s": cpu_s,
+        "process_peak_rss_mb": process_peak_rss_mb(),
+        "pid": os.getpid(), "thread": threading.current_thread().name, **attrs,
+    })
+
+
+@contextmanager
+def span(name, **attrs):
+    """Times the block. Yields a dict; anything put in it (token counts, sizes) is saved with the span.
+
+    Parents follow contextvars, so nesting works across threads started inside the span's
+    context and across asyncio tasks. cpu_s is CPU time of the calling thread only. rss_growth_mb
+    is how far the span pushed the process RSS high-water mark (0 when it stayed below an earlier
+    peak); peak_cuda_mb is the most CUDA memory allocated while the span was open.
+    """
+    span_id = f"{os.getpid()}-{next(_ids)}"
+    token = _parent.set(span_id)
+    extra = dict(attrs)
+    rss0 = process_peak_rss_mb()
+    _cuda_boundary(enter=span_id)
+    start, wall0, cpu0 = time.time(), time.perf_counter(), time.thread_time()
+    error = None
+    try:
+        yield extra
+    except BaseException as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        wall, cpu = time.perf_counter() - wall0, time.thread_time() - cpu0
+        _parent.reset(token)
+        write({
+            "run": RUN_ID, "name": name, "id": span_id, "parent": _parent.get(),
+            "start": start, "wall_s": wall, "cpu_s": cpu,
+            "rss_growth_mb": process_peak_rss_mb() - rss0, "process_peak_rss_mb": process_peak_rss_mb(),
+            "peak_cuda_mb": _cuda_boundary(leave=span_id),
+            "pid": os.getpid(), "thread": threading.current_thread().name,
+            "error": error, **extra,
+        })
+
+
+def llm_usage(response):
+    """Token counts from a LangChain chat response (empty when the provider didn't report them)."""
+    usage = getattr(response, "usage_metadata", None) or {}
+    out = {k: usage[k] for k in ("input_tokens", "output_tokens", "total_tokens") if k in usage}
+    meta = getattr(response, "response_metadata", None) or {}
+    if meta.get("cache") == "hit":
+        out.update(cache="hit", saved_s=meta.get("saved_s"))  # served by llm_cache, no tokens spent
+    return out
+
+
+# =======================
+# SUMMARY
+# =======================
+def load_runs(last=5, trace_dir=TRACE_DIR):
+    """Spans of the most recent `last` runs, newest file last."""
+    if not os.path.isdir(trace_dir):
+        return []
+    files = sorted(
+        (os.path.join(trace_dir, name) for name in os.listdir(trace_dir) if name.endswith(".jsonl")),
+        key=os.path.getmtime
+    )[-last:]
+    spans = []
+    for path in files:
+        with open(path, "r") as f:
+            for line in f:
+                try:
+                    spans.append(json.loads(line))
+                except ValueError:
+                    continue  # torn line from a crashed run
+    return spans
+
+
+def summarize(spans):
+    """{name: stats} aggregated over spans, sorted by total wall time (slowest first)."""
+    groups = defaultdict(list)
+    for s in spans:
+        groups[s["name"]].append(s)
+
+    rows = {}
+    for name, items in groups.items():
+        walls = sorted(s["wall_s"] for s in items)
+        cuda = [s["peak_cuda_mb"] for s in items if s.get("peak_cuda_mb") is not None]
+        tokens = sum(s.get("total_tokens", 0) for s in items)
+        rows[name] = {
+            "count": len(items),
+            "total_s": sum(walls),
+            "mean_s": sum(walls) / len(walls),
+            "p95_s": walls[min(len(walls) - 1, int(len(walls) * 0.95))],
+            "cpu_s": sum(s.get("cpu_s") or 0 for s in items),
+            "rss_growth_mb": max(s.get("rss_growth_mb") or 0 for s in items),
+            "peak_cuda_mb": max(cuda) if cuda else None,
+            "tokens": tokens,
+            "errors": sum(1 for s in items if s.get("error")),
+        }
+    return dict(sorted(rows.items(), key=lambda kv: kv[1]["total_s"], reverse=True))
+
+
+def print_summary(last=5, top=20):
+    spans = load_runs(last)
+    runs = sorted({s["run"] for s in spans})
+    if not spans:
+        print(f"📭 No traces in {TRACE_DIR}")
+        return
+    print(f"🔬 Slowest stages over the last {len(runs)} run(s) ({len(spans)} spans)")
+    print(f"{'span':<24} {'n':>5} {'total s':>9} {'mean s':>8} {'p95 s':>8} {'cpu s':>8} {'rss +MB':>8} {'cuda MB':>8} {'tokens':>8} {'err':>4}")
+    for name, r in list(summarize(spans).items())[:top]:
+        cuda = f"{r['peak_cuda_mb']:.0f}" if r["peak_cuda_mb"] is not None else "-"
+        print(f"{name:<24} {r['count']:>5} {r['total_s']:>9.2f} {r['mean_s']:>8.3f} {r['p95_s']:>8.3f} "
+              f"{r['cpu_s']:>8.2f} {r['rss_growth_mb']:>8.0f} {cuda:>8} {r['tokens'] or '-':>8} {r['errors'] or '':>4}")
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Factory trace tools")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("summary", help="Slowest stages across the last N runs")
+    p.add_argument("--runs", type=int, default=5)
+    p.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.cmd == "summary":
+        print_summary(args.runs, args.top)
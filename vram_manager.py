@@ -1,13 +1,280 @@
 # Location: /nuvodata/User_data/shiva/Market_carousal/vram_manager.py
-import torch
+# Model residency: tracks which models are loaded (FLUX parts, MiniLM embedder), where they
+# live and how big they are, and offloads / evicts least-recently-used ones to stay under a
+# per-device memory budget. Works on CPU-only boxes by budgeting host memory instead.
+import os
 import gc
+import time
+import threading
+from collections import OrderedDict
+
+GPU_BUDGET_MB = float(os.getenv("VRAM_BUDGET_MB", "0"))  # 0 -> 90% of the card
+HOST_BUDGET_MB = float(os.getenv("HOST_BUDGET_MB", "0"))  # 0 -> 60% of physical RAM
+
+
+def _torch():
+    """torch if it is importable, else None (the manager still works for host memory)."""
+    try:
+        import torch
+        return torch
+    except ImportError:
+        return None
+
+
+def cuda_available():
+    torch = _torch()
+    return bool(torch and torch.cuda.is_available())
+
 
 def purge():
     gc.collect()
-    if torch.cuda.is_available():
+    if cuda_available():
+        import torch
         torch.cuda.empty_cache()
         torch.cuda.reset_peak_memory_stats()
         print("🧹 VRAM Purged: Ready for FLUX.")
 
+def host_total_mb():
+    return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / 1024 / 1024
+
+
+def host_available_mb():
+    """MemAvailable from /proc/meminfo (falls back to total RAM off Linux)."""
+    try:
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return host_total_mb()
+
+
+def footprint_mb(obj):
+    """Parameter + buffer size of a torch module, a diffusers pipeline (sum of its components)
+    or a wrapper exposing .client (LangChain's HuggingFaceEmbeddings). 0 for anything else."""
+    if hasattr(obj, "parameters") and hasattr(obj, "buffers"):
+        tensors = list(obj.parameters()) + list(obj.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors) / 1024 / 1024
+    if isinstance(getattr(obj, "components", None), dict):
+        return sum(footprint_mb(c) for c in obj.components.values() if c is not None)
+    if getattr(obj, "client", None) is not None:
+        return footprint_mb(obj.client)
+    return 0.0
+
+
+def device_of(obj):
+    """'cuda' or 'cpu' for the memory pool the object's weights live in."""
+    if getattr(obj, "client", None) is not None and not hasattr(obj, "parameters"):
+        obj = obj.client
+    try:
+        return "cuda" if next(obj.parameters()).device.type == "cuda" else "cpu"
+    except (AttributeError, StopIteration, TypeError):
+        return "cpu"
+
+
+def movable(obj):
+    """The object whose .to() moves the weights: obj itself, or the module behind a wrapper's
+    .client (HuggingFaceEmbeddings -> SentenceTransformer). None if it cannot be moved."""
+    if hasattr(obj, "to"):
+        return obj
+    client = getattr(obj, "client", None)
+    return client if client is not None and hasattr(client, "to") else None
+
+
+def pool_of(device):
+    return "cuda" if str(device).startswith("cuda") else "cpu"
+
+
+class Resident:
+    def __init__(self, name, model, target, mb, group=None, pinned=False, on_evict=None):
+        self.name = name
+        self.model = model
+        self.target = target    # exact device it runs on, e.g. cuda:0
+        home = pool_of(target)
+        self.home = home        # memory pool it should live in
+        self.device = home      # device it is on right now
+        self.mb = mb
+        self.group = group      # evicting one member evicts the group (e.g. all FLUX parts)
+        self.pinned = pinned    # never evicted, only offloaded to CPU
+        self.on_evict = on_evict
+        self.last_used = time.time()
+
+    def describe(self):
+        state = "resident" if self.device == self.home else "offloaded"
+        return {"device": self.device, "home": self.home, "mb": round(self.mb, 1), "state": state,
+                "group": self.group, "pinned": self.pinned, "idle_s": round(time.time() - self.last_used, 1)}
+
+
+class ResidencyManager:
+    """LRU residency over two memory pools ('cuda' and 'cpu').
+
+    register() records a loaded model and its footprint; use() marks it recently used and
+    brings it back to its home device, making room first. Under pressure on the GPU the
+    least-recently-used models move to CPU (if host budget allows), otherwise they are evicted;
+    on the host they are evicted. Evicting calls on_evict so the owner drops its reference.
+    """
+
+    def __init__(self, gpu_budget_mb=GPU_BUDGET_MB, host_budget_mb=HOST_BUDGET_MB):
+        self.budgets = {
+            "cuda": gpu_budget_mb or self._default_gpu_budget(),
+            "cpu": host_budget_mb or host_total_mb() * 0.6,
+        }
+        self.models = OrderedDict()  # name -> Resident, least recently used first
+        self._lock = threading.RLock()
+        self.stats = {"offloads": 0, "evictions": 0, "reloads": 0}
+
+    @staticmethod
+    def _default_gpu_budget():
+        if not cuda_available():
+            return 0.0
+        import torch
+        return torch.cuda.get_device_properties(0).total_memory / 1024 / 1024 * 0.9
+
+    # --- bookkeeping ---
+    def register(self, name, model, device=None, mb=None, group=None, pinned=False, on_evict=None):
+        """Starts tracking a loaded model. device/mb are measured when not given."""
+        with self._lock:
+            res = Resident(name, model, device or device_of(model), footprint_mb(model) if mb is None else mb,
+                           group, pinned, on_evict)
+            home = res.home
+            self.models.pop(name, None)
+            self.models[name] = res
+            print(f"📦 Resident: {name} ({res.mb:.0f} MB on {home})")
+            self.ensure_budget(home, 0, keep={name})
+            return model
+
+    def unregister(self, name):
+        with self._lock:
+            self.models.pop(name, None)
+
+    def used_mb(self, device):
+        return sum(r.mb for r in self.models.values() if r.device == device)
+
+    def usage(self):
+        """Current residency: per-model state plus used / budget per pool."""
+        with self._lock:
+            pools = {
+                device: {"used_mb": round(self.used_mb(device), 1), "budget_mb": round(budget, 1)}
+                for device, budget in self.budgets.items()
+            }
+            pools["cpu"]["available_mb"] = round(host_available_mb(), 1)
+            if cuda_available():
+                import torch
+                free, total = torch.cuda.mem_get_info()
+                pools["cuda"].update(free_mb=round(free / 1024 / 1024, 1), total_mb=round(total / 1024 / 1024, 1))
+            return {"models": {name: r.describe() for name, r in self.models.items()},
+                    "pools": pools, "stats": dict(self.stats)}
+
+    def report(self):
+        u = self.usage()
+        pools = " | ".join(f"{d}: {p['used_mb']:.0f}/{p['budget_mb']:.0f} MB" for d, p in u["pools"].items())
+        print(f"📦 Residency: {len(u['models'])} model(s) | {pools}")
+        for name, m in u["models"].items():
+            print(f"   - {name:<22} {m['mb']:>8.0f} MB  {m['device']:<4} ({m['state']}, idle {m['idle_s']:.0f}s)")
+
+    # --- policy ---
+    def use(self, name):
+        """Marks name as most recently used and returns it on its home device. None if evicted."""
+        with self._lock:
+            res = self.models.get(name)
+            if res is None:
+                return None
+            res.last_used = time.time()
+            self.models.move_to_end(name)
+            if res.device != res.home:
+                self.ensure_budget(res.home, res.mb, keep={name})
+                if self._move(res, res.home):
+                    self.stats["reloads"] += 1
+            return res.model
+
+    def ensure_budget(self, device, need_mb, keep=()):
+        """Frees `device` until need_mb more fits in its budget, LRU first. Returns MB freed."""
+        with self._lock:
+            budget = self.budgets.get(device, 0)
+            if not budget:
+                return 0.0
+            before = self.used_mb(device)
+            kept_groups = {self.models[n].group for n in keep if n in self.models and self.models[n].group}
+            for res in list(self.models.values()):
+                if self.used_mb(device) + need_mb <= budget:
+                    break
+                if res.name not in self.models or res.device != device or res.name in keep or res.group in kept_groups - {None}:
+                    continue
+                if device == "cuda" and self.used_mb("cpu") + res.mb <= self.budgets["cpu"] and self._move(res, "cpu"):
+                    self.stats["offloads"] += 1
+                elif not res.pinned:
+                    self.evict(res.name)
+            freed = before - self.used_mb(device)
+            if freed:
+                self._release_memory()
+            return freed
+
+    def offload(self, name):
+        """Moves a GPU model to host memory; its next use() brings it back."""
+        with self._lock:
+            res = self.models.get(name)
+            if res is None or res.device == "cpu":
+                return
+            self.ensure_budget("cpu", res.mb, keep={name})
+            if self._move(res, "cpu"):
+                self.stats["offloads"] += 1
+                self._release_memory()
+
+    def evict(self, name):
+        """Forgets a model (and the rest of its group); owners rebuild it on next load."""
+        with self._lock:
+            res = self.models.get(name)
+            if res is None:
+                return
+            victims = [r for r in self.models.values() if res.group and r.group == res.group] or [res]
+            for victim in victims:
+                self.models.pop(victim.name, None)
+                print(f"🗑️  Evicted {victim.name} ({victim.mb:.0f} MB from {victim.device})")
+                self.stats["evictions"] += 1
+            callbacks = {id(v.on_evict): v.on_evict for v in victims if v.on_evict}
+            for callback in callbacks.values():
+                callback()
+            self._release_memory()
+
+    def _move(self, res, device):
+        """Moves the weights and updates the accounting; False (nothing changed) if it can't."""
+        target = movable(res.model)
+        if target is None:
+            print(f"⚠️ {res.name}: has no .to(), stays on {res.device}")
+            return False
+        target.to(res.target if device == res.home else device)
+        print(f"🔀 {res.name}: {res.device} -> {device}")
+        res.device = device
+        return True
+
+    @staticmethod
+    def _release_memory():
+        gc.collect()
+        if cuda_available():
+            import torch
+            torch.cuda.empty_cache()
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_manager():
+    """Process-wide residency manager shared by the factory backend and the RAG embedder."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = ResidencyManager()
+        return _manager
+
+
 if __name__ == "__main__":
-    purge()
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--usage", action="store_true", help="Print residency for this process instead of purging")
+    args = parser.parse_args()
+    if args.usage:
+        get_manager().report()
+    else:
+        purge()